@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'document_processing.middleware.StageTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'document_processing.profiling.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -79,6 +82,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Concurrent ingests write the registry at the same time; take the write lock up
+        # front and wait for it instead of failing with "database is locked"
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -125,3 +134,144 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Logging
+# https://docs.djangoproject.com/en/3.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'loggers': {
+        'document_processing': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+# Admin only endpoints and request headers are unlocked with this token (`X-Admin-Token`)
+
+ADMIN_API_TOKEN = os.environ.get('ADMIN_API_TOKEN', '')
+
+# On-demand request profiling, off by default. Send `X-Profile: 1` with the admin token
+# to profile a single request, or set PROFILING_SAMPLE_RATE to profile a random fraction.
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'sample')  # "sample" or "cprofile"
+PROFILING_DIR = os.environ.get('PROFILING_DIR', 'profiles')
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', 0.005))
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.0))
+PROFILING_MAX_PER_MINUTE = int(os.environ.get('PROFILING_MAX_PER_MINUTE', 2))
+
+# Batch Q&A: maximum questions per request and concurrent LLM calls per batch
+
+BATCH_QNA_MAX_QUESTIONS = int(os.environ.get('BATCH_QNA_MAX_QUESTIONS', 100))
+BATCH_QNA_CONCURRENCY = int(os.environ.get('BATCH_QNA_CONCURRENCY', 4))
+
+# Precompute title-wise section summaries in a low priority background thread after ingest.
+# Background LLM calls are capped by LLM_BACKGROUND_MAX_CONCURRENCY and yield to interactive ones.
+
+PRECOMPUTE_SECTION_SUMMARIES = os.environ.get('PRECOMPUTE_SECTION_SUMMARIES', 'false').lower() == 'true'
+
+# Document lifecycle: documents older than DOCUMENT_RETENTION_DAYS (0 keeps them forever) and
+# extraction zips older than ARTIFACT_RETENTION_HOURS are removed by the storage compactor,
+# which runs every COMPACTION_INTERVAL seconds (0 disables the background thread).
+
+DOCUMENT_RETENTION_DAYS = float(os.environ.get('DOCUMENT_RETENTION_DAYS', 0))
+ARTIFACT_RETENTION_HOURS = float(os.environ.get('ARTIFACT_RETENTION_HOURS', 24))
+COMPACTION_INTERVAL = float(os.environ.get('COMPACTION_INTERVAL', 0))
+
+# Background threads (the storage compactor) only start in processes run with
+# BACKGROUND_JOBS_ENABLED=true, which the Docker entrypoint sets for the web server alone.
+
+BACKGROUND_JOBS_ENABLED = os.environ.get('BACKGROUND_JOBS_ENABLED', 'false').lower() == 'true'
+
+# LLM calls: concurrent requests to Groq, of which background work (section summary
+# precompute) may take at most LLM_BACKGROUND_MAX_CONCURRENCY.
+
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 4))
+LLM_BACKGROUND_MAX_CONCURRENCY = int(os.environ.get('LLM_BACKGROUND_MAX_CONCURRENCY', 1))
+
+# Embeddings: the sentence-transformers model of new index versions and the in-memory cache
+# of per-document embedding matrices used by Q&A (MB kept, seconds before re-reading the store).
+
+EMBEDDING_MODEL_NAME = os.environ.get('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+MATRIX_CACHE_MAX_MB = float(os.environ.get('MATRIX_CACHE_MAX_MB', 256))
+MATRIX_CACHE_TTL = float(os.environ.get('MATRIX_CACHE_TTL', 300))
+
+# Optional reduction of the stored embeddings: "none", "pca" (projection fitted on
+# REDUCTION_FIT_SAMPLE stored chunks) or "truncate" (keep the leading dimensions) down to
+# EMBEDDING_DIMENSIONS. Takes effect through `manage.py migrate_index`.
+
+EMBEDDING_REDUCTION = os.environ.get('EMBEDDING_REDUCTION', 'none')
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', 128))
+REDUCTION_FIT_SAMPLE = int(os.environ.get('REDUCTION_FIT_SAMPLE', 20000))
+
+# Q&A context selection: "top_k" or "mmr" (maximal marginal relevance, trading relevance for
+# novelty by MMR_LAMBDA among the MMR_CANDIDATES most relevant chunks and never adding one at
+# least MMR_DUPLICATE_THRESHOLD similar to a picked one). CONTEXT_TOKEN_BUDGET caps the
+# estimated context tokens (0: no limit).
+
+CONTEXT_SELECTION = os.environ.get('CONTEXT_SELECTION', 'top_k')
+MMR_LAMBDA = float(os.environ.get('MMR_LAMBDA', 0.7))
+MMR_CANDIDATES = int(os.environ.get('MMR_CANDIDATES', 20))
+MMR_DUPLICATE_THRESHOLD = float(os.environ.get('MMR_DUPLICATE_THRESHOLD', 0.95))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', 0))
+
+# Vector store: "chroma" or "local" (memory-mapped matrices with an IVF index once a
+# collection has IVF_MIN_ROWS chunks, searching IVF_NPROBE lists per query unless tuned
+# parameters are found in ANN_PARAMS_FILE).
+
+VECTOR_STORE = os.environ.get('VECTOR_STORE', 'chroma')
+VECTOR_STORE_PATH = os.environ.get('VECTOR_STORE_PATH', 'database')
+ANN_PARAMS_FILE = os.environ.get('ANN_PARAMS_FILE', 'ann_params.json')
+IVF_NPROBE = int(os.environ.get('IVF_NPROBE', 8))
+IVF_MIN_ROWS = int(os.environ.get('IVF_MIN_ROWS', 20000))
+
+# Near-duplicate chunks: chunks at least DEDUPE_THRESHOLD similar to a stored chunk of another
+# document reuse its vector (0: off); a document sharing at least DEDUPE_VERSION_SHARE of its
+# chunks with one stored document is recorded as a version of it (0: never).
+
+DEDUPE_THRESHOLD = float(os.environ.get('DEDUPE_THRESHOLD', 0.9))
+DEDUPE_VERSION_SHARE = float(os.environ.get('DEDUPE_VERSION_SHARE', 0.5))
+
+# Extraction: "adobe" (PDF Services) or "local" (PyMuPDF). Documents of at least
+# SPLIT_MIN_PAGES pages (0: never) are extracted in ranges of SPLIT_PAGES_PER_RANGE pages,
+# SPLIT_MAX_WORKERS at a time. Adobe jobs are capped at ADOBE_MAX_CONCURRENCY and polled every
+# ADOBE_POLL_INTERVAL seconds for at most ADOBE_POLL_DEADLINE seconds; ADOBE_CLIENT_CONFIG is
+# an optional JSON file of SDK client settings.
+
+EXTRACTION_BACKEND = os.environ.get('EXTRACTION_BACKEND', 'adobe')
+SPLIT_MIN_PAGES = int(os.environ.get('SPLIT_MIN_PAGES', 0))
+SPLIT_PAGES_PER_RANGE = int(os.environ.get('SPLIT_PAGES_PER_RANGE', 50))
+SPLIT_MAX_WORKERS = int(os.environ.get('SPLIT_MAX_WORKERS', 4))
+ADOBE_MAX_CONCURRENCY = int(os.environ.get('ADOBE_MAX_CONCURRENCY', 4))
+ADOBE_POLL_INTERVAL = float(os.environ.get('ADOBE_POLL_INTERVAL', 1.0))
+ADOBE_POLL_DEADLINE = float(os.environ.get('ADOBE_POLL_DEADLINE', 600))
+ADOBE_CLIENT_CONFIG = os.environ.get('ADOBE_CLIENT_CONFIG')
+
+# Streaming ingestion: extraction threads, bounded queue size between stages, chunks per
+# embedding and upsert batch, and seconds an upload may take before it fails.
+
+INGEST_EXTRACT_WORKERS = int(os.environ.get('INGEST_EXTRACT_WORKERS', 4))
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 8))
+INGEST_EMBED_BATCH = int(os.environ.get('INGEST_EMBED_BATCH', 64))
+INGEST_UPSERT_BATCH = int(os.environ.get('INGEST_UPSERT_BATCH', 256))
+INGEST_TIMEOUT = float(os.environ.get('INGEST_TIMEOUT', 900))
+
+# Hierarchical document summaries: characters of document text per leaf and children
+# combined per parent node.
+
+SUMMARY_CHUNK_CHARS = int(os.environ.get('SUMMARY_CHUNK_CHARS', 15000))
+SUMMARY_TREE_FANOUT = int(os.environ.get('SUMMARY_TREE_FANOUT', 8))
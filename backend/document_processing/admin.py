@@ -1,3 +1,19 @@
 from django.contrib import admin
 
+from .models import Document, SummaryNode
+
 # Register your models here.
+
+
+@admin.register(SummaryNode)
+class SummaryNodeAdmin(admin.ModelAdmin):
+    list_display = ("document_uid", "level", "key", "created_at")
+    list_filter = ("level",)
+    search_fields = ("document_uid", "key")
+
+
+@admin.register(Document)
+class DocumentAdmin(admin.ModelAdmin):
+    list_display = ("file_hash", "title", "status", "chunk_count", "page_count", "created_at")
+    list_filter = ("status", "extractor_version", "embedding_model")
+    search_fields = ("file_hash", "title")
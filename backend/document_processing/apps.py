@@ -1,6 +1,30 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def background_jobs_enabled():
+    """
+    Whether this process runs background threads: only when BACKGROUND_JOBS_ENABLED is set,
+    which the Docker entrypoint does for the web server alone, and never in the `runserver`
+    autoreloader that merely watches the serving process.
+    """
+    if not getattr(settings, "BACKGROUND_JOBS_ENABLED", False):
+        return False
+    autoreloading = "runserver" in sys.argv and "--noreload" not in sys.argv
+    return not autoreloading or os.environ.get("RUN_MAIN") == "true"
 
 
 class DocumentProcessingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'document_processing'
+
+    def ready(self):
+        # Serve whichever index version is active in the database
+        from . import embeddings, index_versions, lifecycle
+        embeddings.set_index_resolver(index_versions.active_index)
+        # Expire documents even in processes that never ingest
+        if background_jobs_enabled():
+            lifecycle.start_compactor()
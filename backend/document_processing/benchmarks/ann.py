@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import platform
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from .. import embeddings
+from ..vector_store import ann_params
+from .runner import QUESTIONS
+
+
+DEFAULT_HNSW_GRID = {"M": [8, 16, 32], "ef_construction": [100, 200], "ef_search": [10, 20, 50, 100, 200]}
+DEFAULT_NPROBES = [1, 2, 4, 8, 16, 32]
+DEFAULT_TARGET_RECALL = 0.95
+# Cosine similarity between a synthetic query and the chunk it was derived from, about what
+# real questions reach with their best passage
+SYNTHETIC_QUERY_SIMILARITY = 0.7
+
+
+def normalize(matrix):
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+
+
+def collection_matrix(collection, max_vectors=None, batch_size=1000):
+    """Normalized float32 matrix of the embeddings stored in `collection` (the first `max_vectors`)."""
+    blocks, offset = [], 0
+    while max_vectors is None or offset < max_vectors:
+        limit = batch_size if max_vectors is None else min(batch_size, max_vectors - offset)
+        results = collection.get(include=["embeddings"], limit=limit, offset=offset)
+        if not len(results["ids"]):
+            break
+        blocks.append(np.asarray(results["embeddings"], dtype=np.float32))
+        offset += len(results["ids"])
+    return normalize(np.vstack(blocks)) if blocks else np.zeros((0, 0), dtype=np.float32)
+
+
+def query_vectors(encode, questions, matrix, sample, seed=0):
+    """
+    Normalized query vectors: the `questions` encoded with `encode`, topped up to `sample` queries with
+    synthetic ones, each a random stored chunk vector rotated away from the chunk until
+    their cosine similarity is SYNTHETIC_QUERY_SIMILARITY.
+    """
+    queries = [normalize(np.asarray(encode(list(questions)), dtype=np.float32))] \
+        if questions else []
+    missing = sample - (len(questions) if questions else 0)
+    if missing > 0:
+        rng = np.random.default_rng(seed)
+        anchors = matrix[rng.integers(0, len(matrix), missing)]
+        noise = rng.standard_normal(anchors.shape).astype(np.float32)
+        noise = normalize(noise - (noise * anchors).sum(axis=1, keepdims=True) * anchors)
+        similarity = SYNTHETIC_QUERY_SIMILARITY
+        queries.append(similarity * anchors + np.sqrt(1 - similarity ** 2) * noise)
+    return np.vstack(queries).astype(np.float32)
+
+
+def exact_top_k(matrix, queries, k, block=64):
+    """Brute force top `k` row indices of `matrix` per query, best first."""
+    top_k = []
+    for start in range(0, len(queries), block):
+        scores = queries[start:start + block] @ matrix.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        top_k.append(np.take_along_axis(top, order, axis=1))
+    return np.vstack(top_k)
+
+
+def recall_at_k(found, exact):
+    """Mean fraction of the exact top k that was found."""
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact)]))
+
+
+def measure(search, queries):
+    """Run `search` on every query; returns the results and the latencies (seconds)."""
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found.append(list(search(query)))
+        latencies.append(time.perf_counter() - start)
+    return found, latencies
+
+
+def latency_stats(latencies):
+    latencies = np.asarray(latencies)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        "mean_ms": round(float(latencies.mean()) * 1000, 3),
+    }
+
+
+def tune_exact(matrix, queries, k):
+    """The brute force baseline every index is compared with."""
+    found, latencies = measure(lambda query: exact_top_k(matrix, query[None, :], k)[0], queries)
+    return {"index": "exact", "params": {}, "recall_at_k": 1.0, **latency_stats(latencies),
+            "build_s": 0.0, "index_bytes": int(matrix.nbytes)}
+
+
+def tune_hnsw(matrix, queries, exact, k, grid=None, log=print):
+    """
+    Build an HNSW index (hnswlib, which Chroma uses) for every M and ef_construction of
+    `grid` and measure single threaded queries for every ef_search.
+    """
+    import hnswlib
+
+    grid = {**DEFAULT_HNSW_GRID, **(grid or {})}
+    results = []
+    for M in grid["M"]:
+        for ef_construction in grid["ef_construction"]:
+            # Vectors are normalized, so inner product ranks like cosine (and like Chroma's l2)
+            index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+            start = time.perf_counter()
+            index.init_index(max_elements=len(matrix), M=M, ef_construction=ef_construction, random_seed=0)
+            index.add_items(matrix, np.arange(len(matrix)))
+            build_s = time.perf_counter() - start
+            with tempfile.TemporaryDirectory(prefix="researchiq-ann-") as workspace:
+                path = os.path.join(workspace, "index.bin")
+                index.save_index(path)
+                index_bytes = os.path.getsize(path)
+
+            for ef_search in grid["ef_search"]:
+                index.set_ef(max(ef_search, k))
+                found, latencies = measure(lambda query: index.knn_query(query, k=k, num_threads=1)[0][0], queries)
+                result = {"index": "hnsw", "params": {"M": M, "ef_construction": ef_construction,
+                                                      "ef_search": ef_search},
+                          "recall_at_k": round(recall_at_k(found, exact), 4), **latency_stats(latencies),
+                          "build_s": round(build_s, 3), "index_bytes": index_bytes}
+                log(json.dumps(result))
+                results.append(result)
+    return results
+
+
+def tune_ivf(matrix, queries, exact, k, nlists=None, nprobes=None, log=print):
+    """
+    Load the vectors into a scratch local collection, train it with every `nlist` and
+    measure queries (through the collection, SQLite lookups included) for every `nprobe`.
+    """
+    from ..local_index import LocalCollection
+
+    nlists = nlists or sorted({max(1, int(factor * np.sqrt(len(matrix)))) for factor in (1, 2, 4)})
+    nprobes = nprobes or DEFAULT_NPROBES
+    results = []
+    with tempfile.TemporaryDirectory(prefix="researchiq-ann-") as workspace:
+        collection = LocalCollection(workspace, "ann-tuning")
+        for start in range(0, len(matrix), 10000):
+            collection.upsert([str(row) for row in range(start, min(start + 10000, len(matrix)))],
+                              matrix[start:start + 10000])
+        for nlist in nlists:
+            start = time.perf_counter()
+            nlist = collection.train(nlist)
+            build_s = time.perf_counter() - start
+            index_bytes = collection.stats()["vector_bytes"] + nlist * matrix.shape[1] * 4
+            for nprobe in nprobes:
+                if nprobe > nlist:
+                    continue
+                found, latencies = measure(
+                    lambda query: [int(content_uid) for content_uid in
+                                   collection.query([query], n_results=k, include=[], nprobe=nprobe)["ids"][0]],
+                    queries)
+                result = {"index": "ivf", "params": {"nlist": nlist, "nprobe": nprobe},
+                          "recall_at_k": round(recall_at_k(found, exact), 4), **latency_stats(latencies),
+                          "build_s": round(build_s, 3), "index_bytes": index_bytes}
+                log(json.dumps(result))
+                results.append(result)
+    return results
+
+
+def choose_params(results, target_recall=DEFAULT_TARGET_RECALL):
+    """
+    The fastest (p95) configuration reaching `target_recall`, the smaller index on ties;
+    the most accurate one if none does.
+    """
+    candidates = [result for result in results if result["index"] != "exact"]
+    if not candidates:
+        return None
+    good = [result for result in candidates if result["recall_at_k"] >= target_recall]
+    if good:
+        return min(good, key=lambda result: (result["p95_ms"], result["index_bytes"]))
+    return max(candidates, key=lambda result: (result["recall_at_k"], -result["p95_ms"]))
+
+
+def run_ann_tuning(collection_name=None, index=None, k=10, questions=None, sample=200, max_vectors=None,
+                   hnsw_grid=None, nlists=None, nprobes=None, target_recall=DEFAULT_TARGET_RECALL, log=print):
+    """
+    Compare ANN index parameters on the vectors of a collection (the active index by
+    default) against exact search, and pick the fastest configuration reaching
+    `target_recall`.
+
+    Args:
+        index (str): "hnsw" or "ivf"; defaults to the index type of the configured vector store.
+        questions (list): Real questions to use as queries (QUESTIONS by default), topped up
+            with synthetic queries to `sample` queries.
+    """
+    helper = embeddings.VectorEmbeddings()
+    collection_name = collection_name or helper.index.collection_name
+    index = index or ("ivf" if helper.store.backend == "local" else "hnsw")
+    matrix = collection_matrix(helper.get_collection(collection_name), max_vectors)
+    if len(matrix) <= k:
+        raise ValueError(f"Collection {collection_name} has {len(matrix)} vectors, need more than k={k}")
+
+    questions = list(questions) if questions is not None else QUESTIONS
+    queries = query_vectors(helper.encode_documents, questions, matrix, sample)
+    exact = exact_top_k(matrix, queries, k)
+    log(f"{collection_name}: {len(matrix)} vectors of dimension {matrix.shape[1]}, {len(queries)} queries "
+        f"({len(questions)} questions)")
+
+    results = [tune_exact(matrix, queries, k)]
+    if index == "hnsw":
+        results += tune_hnsw(matrix, queries, exact, k, hnsw_grid, log)
+    elif index == "ivf":
+        results += tune_ivf(matrix, queries, exact, k, nlists, nprobes, log)
+    else:
+        raise ValueError(f"Unknown index type {index!r}")
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "collection": collection_name,
+            "index": index,
+            "vectors": len(matrix),
+            "dimension": int(matrix.shape[1]),
+            "queries": len(queries),
+            "questions": len(questions),
+            "k": k,
+            "target_recall": target_recall,
+            "current_params": ann_params(collection_name),
+        },
+        "results": results,
+        "chosen": choose_params(results, target_recall),
+    }
@@ -0,0 +1,73 @@
+import io
+import json
+import random
+import zipfile
+
+
+WORDS = (
+    "model data training results method approach network learning performance "
+    "analysis evaluation dataset baseline proposed experiment accuracy feature "
+    "layer attention retrieval document embedding query summary section paper "
+    "https://example.org <b>bold</b> btw asap approx 🙂"
+).split()
+
+
+def random_sentence(rng, min_words=8, max_words=40):
+    """
+    Build a pseudo-academic sentence, sprinkled with the noise the preprocessing
+    pipeline has to deal with (urls, html, slang, emoji).
+    """
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def generate_structured_data(num_elements, seed=0):
+    """
+    Generate a synthetic Adobe `structuredData.json` payload.
+
+    Args:
+        num_elements (int): Number of entries in the `elements` list.
+        seed (int): Seed for the random generator so fixtures are repeatable.
+
+    Returns:
+        dict: A payload with the same shape as the Adobe Extract API output.
+    """
+    rng = random.Random(seed)
+    elements = [{"Path": "//Document/Title", "Text": "Synthetic Benchmark Paper", "Page": 0}]
+    page = 0
+
+    while len(elements) < num_elements:
+        roll = rng.random()
+        if roll < 0.06:
+            path = "//Document/H1"
+            text = f"Section {len(elements)} {rng.choice(WORDS)}"
+        elif roll < 0.12:
+            path = "//Document/H2"
+            text = f"Subsection {len(elements)} {rng.choice(WORDS)}"
+        elif roll < 0.15:
+            path = "//Document/Footnote"
+            text = random_sentence(rng, 4, 12)
+        else:
+            path = "//Document/P"
+            text = random_sentence(rng)
+
+        if rng.random() < 0.05:
+            page += 1
+        elements.append({"Path": path, "Text": text, "Page": page})
+
+    return {
+        "elements": elements[:num_elements],
+        "pages": [{"page_number": i} for i in range(page + 1)],
+    }
+
+
+def structured_data_zip(json_data):
+    """
+    Pack a `structuredData.json` payload into an in-memory ZIP, the way Adobe returns it.
+
+    Returns:
+        bytes: The ZIP archive content.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("structuredData.json", json.dumps(json_data))
+    return buffer.getvalue()
@@ -0,0 +1,103 @@
+import json
+import time
+import platform
+from datetime import datetime
+
+import numpy as np
+
+from .. import embeddings
+from ..index_versions import configured_dimensions
+from ..reduction import EmbeddingReducer, normalize, top_k, top_k_overlap
+from .ann import collection_matrix, query_vectors
+from .runner import QUESTIONS
+
+
+def collection_texts(collection, max_vectors=None, batch_size=1000):
+    """Chunk texts stored in `collection` (the first `max_vectors`)."""
+    texts = []
+    while max_vectors is None or len(texts) < max_vectors:
+        limit = batch_size if max_vectors is None else min(batch_size, max_vectors - len(texts))
+        results = collection.get(include=["documents"], limit=limit, offset=len(texts))
+        if not len(results["ids"]):
+            break
+        texts += results["documents"]
+    return texts
+
+
+def search_ms(matrix, queries, k):
+    """Mean single query exact search latency (ms) over `matrix`."""
+    start = time.perf_counter()
+    for query in queries:
+        top_k(matrix, query[None, :], k)
+    return round((time.perf_counter() - start) / len(queries) * 1000, 3)
+
+
+def run_reduction_check(method=None, dimensions=None, k=10, questions=None, sample=200, max_vectors=None,
+                        batch_size=64, log=print):
+    """
+    Measure how well reduced vectors preserve full dimension search on the active index:
+    the full dimension vectors of its chunks (re-encoded if the index is reduced) and of
+    the queries are searched exactly before and after reduction, and the top-k overlap,
+    latency and bytes per vector are reported.
+
+    Args:
+        method (str): "pca" or "truncate" to try candidate reductions (PCA fitted on the same
+            chunks, as `migrate_index` would); by default the active index's reducer is checked.
+        dimensions (list): Candidate dimensions (default: EMBEDDING_DIMENSIONS).
+        questions (list): Real questions to use as queries (QUESTIONS by default), topped up
+            with synthetic queries to `sample` queries.
+    """
+    helper = embeddings.VectorEmbeddings()
+    spec = helper.index
+    if method is None and spec.reducer is None:
+        raise ValueError(f"The active index {spec.collection_name} is not reduced; pass a method to try one")
+
+    full = embeddings.VectorEmbeddings(index=embeddings.IndexSpec(spec.collection_name, spec.embedding_model))
+    collection = helper.get_collection()
+    if spec.reducer is None:
+        matrix = collection_matrix(collection, max_vectors)
+    else:
+        matrix = normalize(np.asarray(full.encode_documents(collection_texts(collection, max_vectors),
+                                                            batch_size=batch_size, reduce=False), dtype=np.float32))
+    if len(matrix) <= k:
+        raise ValueError(f"Collection {spec.collection_name} has {len(matrix)} vectors, need more than k={k}")
+
+    questions = list(questions) if questions is not None else QUESTIONS
+    queries = query_vectors(lambda texts: full.encode_documents(texts, reduce=False), questions, matrix, sample)
+    log(f"{spec.collection_name}: {len(matrix)} vectors of dimension {matrix.shape[1]}, {len(queries)} queries "
+        f"({len(questions)} questions)")
+
+    if method is None:
+        reducers = [spec.reducer]
+    else:
+        reducers = [EmbeddingReducer.fit(method, dims, matrix) for dims in dimensions or [configured_dimensions()]]
+
+    results = [{"method": "full", "dimensions": int(matrix.shape[1]), "overlap_at_1": 1.0, "overlap_at_k": 1.0,
+                "search_ms": search_ms(matrix, queries, k), "bytes_per_vector": int(matrix.shape[1]) * 4}]
+    for reducer in reducers:
+        result = {
+            "method": reducer.method,
+            "dimensions": reducer.dimensions,
+            "overlap_at_1": round(top_k_overlap(matrix, queries, reducer, 1), 4),
+            "overlap_at_k": round(top_k_overlap(matrix, queries, reducer, k), 4),
+            "search_ms": search_ms(reducer.apply(matrix), reducer.apply(queries), k),
+            "bytes_per_vector": reducer.dimensions * 4,
+        }
+        log(json.dumps(result))
+        results.append(result)
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "collection": spec.collection_name,
+            "embedding_model": spec.embedding_model,
+            "active_reducer": repr(spec.reducer) if spec.reducer is not None else None,
+            "vectors": len(matrix),
+            "queries": len(queries),
+            "questions": len(questions),
+            "k": k,
+        },
+        "results": results,
+    }
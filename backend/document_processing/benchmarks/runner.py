@@ -0,0 +1,299 @@
+import io
+import os
+import json
+import time
+import platform
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from .. import embeddings, pipeline
+from ..preprocessing import preprocess_pipeline
+from .fixtures import generate_structured_data
+from .stubs import OfflineAdobe, OfflineEncoder, OfflineGroq
+
+
+DEFAULT_SIZES = [10, 100, 500, 2000]
+DEFAULT_COLLECTION_SIZES = [100, 1000, 10000]
+QUESTIONS = [
+    "What is the proposed method?",
+    "Which dataset was used for evaluation?",
+    "How does the model compare to the baseline?",
+]
+
+
+@contextmanager
+def offline_services(encoder="offline", llm_latency=0.0, adobe_latency=0.0):
+    """
+    Swap the external services used by `embeddings` and `pipeline` for offline stand-ins.
+
+    Args:
+        encoder (str): "offline" for the hashing encoder, "model" to load the real SentenceTransformer.
+        llm_latency (float): Artificial latency (seconds) of every Groq call.
+        adobe_latency (float): Artificial latency (seconds) of every Adobe extraction job.
+    """
+    original = (embeddings.Groq, embeddings.SentenceTransformer, pipeline.AdobeFunc)
+    offline_encoder = OfflineEncoder()
+    os.environ.setdefault("GROQ_API_KEY", "offline")
+
+    embeddings.load_embedding_model.cache_clear()
+    embeddings.Groq = lambda *args, **kwargs: OfflineGroq(latency=llm_latency)
+    if encoder == "offline":
+        embeddings.SentenceTransformer = lambda *args, **kwargs: offline_encoder
+    pipeline.AdobeFunc = lambda: OfflineAdobe(latency=adobe_latency)
+    try:
+        yield
+    finally:
+        embeddings.Groq, embeddings.SentenceTransformer, pipeline.AdobeFunc = original
+        embeddings.load_embedding_model.cache_clear()
+
+
+@contextmanager
+def temporary_database(workspace):
+    """
+    Point the default database at a freshly migrated SQLite file in `workspace`, so the
+    registry, summary and signature rows written by the benchmarks never reach the real one.
+    """
+    from django.core.management import call_command
+    from django.db import connections
+
+    original = connections["default"].settings_dict["NAME"]
+    connections.close_all()
+    connections["default"].settings_dict["NAME"] = os.path.join(workspace, "db.sqlite3")
+    call_command("migrate", verbosity=0)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connections["default"].settings_dict["NAME"] = original
+
+
+def summarize(case, size, items, latencies, peak_bytes):
+    """
+    Reduce raw latencies (seconds) to the statistics written in the report.
+    """
+    latencies = np.asarray(latencies)
+    p50 = float(np.percentile(latencies, 50))
+    return {
+        "case": case,
+        "size": size,
+        "items": items,
+        "runs": len(latencies),
+        "p50_ms": round(p50 * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        "mean_ms": round(float(latencies.mean()) * 1000, 3),
+        "throughput_per_s": round(items / p50, 3) if p50 else None,
+        "peak_mem_kb": round(peak_bytes / 1024, 1),
+    }
+
+
+class BenchmarkRunner:
+    """
+    Runs the ingestion, preprocessing, retrieval and summarization benchmarks against
+    synthetic fixtures and offline stand-ins for Adobe and Groq.
+
+    Every case is executed `warmup` times untimed, `repeat` times timed, and once more
+    under tracemalloc to capture peak memory without skewing the latencies.
+    """
+
+    def __init__(self, sizes=None, collection_sizes=None, repeat=5, warmup=1, log=print):
+        self.sizes = sizes or DEFAULT_SIZES
+        self.collection_sizes = collection_sizes or DEFAULT_COLLECTION_SIZES
+        self.repeat = repeat
+        self.warmup = warmup
+        self.log = log
+        self.results = []
+
+    def measure(self, case, size, items, func):
+        try:
+            for _ in range(self.warmup):
+                func()
+
+            latencies = []
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                func()
+                latencies.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            result = summarize(case, size, items, latencies, peak)
+        except Exception as e:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            result = {"case": case, "size": size, "error": f"{type(e).__name__}: {e}"}
+
+        self.log(json.dumps(result))
+        self.results.append(result)
+        return result
+
+    def bench_preprocessing(self):
+        for size in self.sizes:
+            texts = [e["Text"] for e in generate_structured_data(size)["elements"]]
+            self.measure("preprocess_pipeline", size, len(texts),
+                         lambda: [preprocess_pipeline(text) for text in texts])
+
+    def bench_extraction(self):
+        for size in self.sizes:
+            json_data = generate_structured_data(size)
+            adobe = OfflineAdobe(size)
+            self.measure("extract_information_from_json", size, size,
+                         lambda: adobe.extract_information_from_json(json_data))
+
+    def bench_embedding(self):
+        helper = embeddings.VectorEmbeddings()
+        for size in self.sizes:
+            contents = OfflineAdobe(size).extract_information_from_json(
+                generate_structured_data(size))
+            self.measure("embedding_creation", size, len(contents),
+                         lambda: helper.embedding_creation(contents, f"bench-embed-{size}"))
+
+    def bench_ingestion(self):
+        for size in self.sizes:
+            def ingest():
+                pipeline.AdobeFunc = lambda: OfflineAdobe(size)
+                file = io.BytesIO(f"synthetic pdf {size} {time.perf_counter()}".encode())
+                return pipeline.data_pipeline().text_extraction_pipeline(file)
+            self.measure("text_extraction_pipeline", size, size, ingest)
+
+    def fill_collection(self, helper, total, chunks_per_document=100, batch_size=1000):
+        """
+        Top up the benchmark collection with random unit vectors until it holds `total` entries.
+        """
+        collection = helper.get_collection()
+        dimension = helper.encode_documents(["dimension probe"]).shape[-1]
+        rng = np.random.default_rng(0)
+
+        start = collection.count()
+        for offset in range(start, total, batch_size):
+            count = min(batch_size, total - offset)
+            vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            ids = [f"filler_content{offset + i}" for i in range(count)]
+            collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                documents=[f"filler chunk {i}" for i in ids],
+                metadatas=[{"document_uid": f"filler-{(offset + i) // chunks_per_document}",
+                            "key": "filler", "value": "filler"} for i in range(count)],
+            )
+
+    def bench_retrieval(self, document_size=500):
+        helper = embeddings.QnaHelper()
+        contents = OfflineAdobe(document_size).extract_information_from_json(
+            generate_structured_data(document_size))
+        helper.embedding_creation(contents, "bench-retrieval")
+
+        for total in sorted(self.collection_sizes):
+            self.fill_collection(helper, total)
+            self.measure("QnaHelper.retrieve_data", total, len(QUESTIONS),
+                         lambda: [helper.retrieve_data(q, "bench-retrieval") for q in QUESTIONS])
+            self.measure("QnaHelper.retrieve_data[cold]", total, len(QUESTIONS),
+                         lambda: [(embeddings.MATRIX_CACHE.clear(), helper.retrieve_data(q, "bench-retrieval"))
+                                  for q in QUESTIONS])
+            self.measure("QnaHelper.retrieve_batch", total, len(QUESTIONS),
+                         lambda: helper.retrieve_batch(QUESTIONS, "bench-retrieval"))
+
+    def bench_summary(self):
+        from ..models import SummaryNode
+        from ..summary_tree import SummaryTree
+
+        helper = embeddings.VectorEmbeddings()
+        for size in self.sizes:
+            document_uid = f"bench-summary-{size}"
+            contents = OfflineAdobe(size).extract_information_from_json(
+                generate_structured_data(size))
+            helper.embedding_creation(contents, document_uid)
+
+            def cold():
+                # Fixtures of different sizes share sections, so drop every stored node
+                SummaryNode.objects.all().delete()
+                return SummaryTree(document_uid).document_summary()
+
+            self.measure("SummaryTree.document_summary[cold]", size, len(contents), cold)
+            self.measure("SummaryTree.document_summary", size, len(contents),
+                         lambda: SummaryTree(document_uid).document_summary())
+
+    def run(self, cases):
+        for case in cases:
+            try:
+                getattr(self, f"bench_{case}")()
+            except Exception as e:
+                # Fixture setup failed (e.g. missing NLTK data); record it and keep going
+                result = {"case": case, "size": None, "error": f"{type(e).__name__}: {e}"}
+                self.log(json.dumps(result))
+                self.results.append(result)
+        return self.results
+
+
+def compare_with_baseline(results, baseline, tolerance=0.2):
+    """
+    Compare a run against a stored baseline report.
+
+    A case regresses when its p50 latency grows, or its throughput drops, by more than `tolerance`.
+
+    Returns:
+        list: One entry per case present in both reports.
+    """
+    previous = {(r["case"], r["size"]): r for r in baseline.get("results", []) if "error" not in r}
+    comparison = []
+    for result in results:
+        before = previous.get((result["case"], result["size"]))
+        if not before or "error" in result:
+            continue
+        p50_change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] if before["p50_ms"] else 0.0
+        throughput, baseline_throughput = result.get("throughput_per_s"), before.get("throughput_per_s")
+        throughput_change = ((throughput - baseline_throughput) / baseline_throughput
+                             if throughput is not None and baseline_throughput else 0.0)
+        comparison.append({
+            "case": result["case"],
+            "size": result["size"],
+            "baseline_p50_ms": before["p50_ms"],
+            "p50_ms": result["p50_ms"],
+            "p50_change": round(p50_change, 4),
+            "baseline_throughput_per_s": baseline_throughput,
+            "throughput_per_s": throughput,
+            "throughput_change": round(throughput_change, 4),
+            "regression": p50_change > tolerance or throughput_change < -tolerance,
+        })
+    return comparison
+
+
+def run_benchmarks(cases, sizes=None, collection_sizes=None, repeat=5, warmup=1,
+                   encoder="offline", llm_latency=0.0, baseline=None, tolerance=0.2, log=print):
+    """
+    Run the benchmark cases inside a throwaway working directory and build the report.
+
+    The working directory is switched to a temporary folder so the Chroma `database/`
+    and `output/` folders created by the pipeline never touch the real ones, and the
+    Django database is a temporary SQLite file in the same folder.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="researchiq-bench-") as workspace, \
+            temporary_database(workspace), offline_services(encoder=encoder, llm_latency=llm_latency):
+        os.chdir(workspace)
+        try:
+            runner = BenchmarkRunner(sizes, collection_sizes, repeat, warmup, log)
+            results = runner.run(cases)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "encoder": encoder,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    if baseline:
+        report["comparison"] = compare_with_baseline(results, baseline, tolerance)
+    return report
@@ -0,0 +1,84 @@
+import re
+import time
+import hashlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from ..utils import AdobeFunc
+from .fixtures import generate_structured_data, structured_data_zip
+
+
+class OfflineAdobe(AdobeFunc):
+    """
+    Stand-in for AdobeFunc that never talks to Adobe PDF Services.
+    `adobe_process` writes a canned `structuredData.json` ZIP and returns its path.
+    """
+
+    def __init__(self, num_elements=100, seed=0, latency=0.0):
+        self.json_data = generate_structured_data(num_elements, seed)
+        self.latency = latency
+
+    def adobe_process(self, file):
+        file.read()
+        time.sleep(self.latency)
+        output_file_path = self.create_output_file_path()
+        with open(output_file_path, "wb") as output_file:
+            output_file.write(structured_data_zip(self.json_data))
+        return output_file_path
+
+
+class OfflineGroq:
+    """
+    Stand-in for the Groq client exposing `chat.completions.create`.
+    Returns a short canned completion after an optional artificial latency.
+    """
+
+    def __init__(self, latency=0.0, reply_words=120):
+        self.latency = latency
+        self.reply_words = reply_words
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, model=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        words = prompt.split()[:self.reply_words]
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=" ".join(words)))],
+            usage=SimpleNamespace(
+                prompt_tokens=len(prompt) // 4,
+                completion_tokens=len(words),
+                total_tokens=len(prompt) // 4 + len(words),
+            ),
+        )
+
+
+class OfflineEncoder:
+    """
+    Deterministic feature-hashing encoder with the SentenceTransformer `encode` signature.
+    Used when the real model cannot be downloaded; it keeps the vector shape (384) so
+    storage and similarity costs stay representative.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _encode_one(self, sentence):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in re.findall(r"\w+", sentence.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, convert_to_tensor=False, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.stack([self._encode_one(s) for s in sentences]) if sentences else \
+            np.zeros((0, self.dimension), dtype=np.float32)
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import dedupe, index_versions, registry
+from .embeddings import VectorEmbeddings
+from .pipeline import data_pipeline, page_count
+
+logger = logging.getLogger(__name__)
+
+# Per worker process state, created once by `init_worker`
+_worker = {}
+
+
+def init_worker(torch_threads=1, index=None):
+    """
+    Process pool initializer: cap intra-op threads so workers do not oversubscribe the CPU
+    and keep one VectorEmbeddings per process so the model is loaded only once. `index` pins
+    the workers to the parent's index version.
+    """
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    _worker["embeddings"] = VectorEmbeddings(index=index)
+
+
+def hash_file(path):
+    """Stage 1: SHA-256 of a PDF on disk, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return path, digest.hexdigest()
+
+
+def extract_chunks(path, file_hash):
+    """
+    Stages 2-3 for one document inside a worker: extraction, preprocessing, chunking and the
+    MinHash signatures of the chunks. Near-duplicate lookup and storage stay in the parent
+    process so ChromaDB has a single writer.
+    """
+    embeddings = _worker["embeddings"]
+    with open(path, "rb") as f:
+        contents, json_data, extractor_version = data_pipeline().extract_document(f)
+    chunks = embeddings.build_chunks(contents, file_hash)
+    return (path, file_hash, chunks, dedupe.signatures(chunks), json_data, extractor_version,
+            registry.document_title(contents))
+
+
+def encode_texts(path, texts):
+    """Stage 4 inside a worker: embed the chunks that are not near-duplicates of stored ones."""
+    return path, _worker["embeddings"].encode_documents(texts)
+
+
+def discover(source):
+    """
+    List the PDFs to ingest from a directory (searched recursively) or a manifest file
+    holding one path per line, or a JSON list of paths.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        return sorted(paths)
+
+    with open(source) as f:
+        content = f.read()
+    base = os.path.dirname(os.path.abspath(source))
+    if content.lstrip().startswith("["):
+        entries = json.loads(content)
+    else:
+        entries = [line.strip() for line in content.splitlines() if line.strip() and not line.startswith("#")]
+    return [entry if os.path.isabs(entry) else os.path.join(base, entry) for entry in entries]
+
+
+class Checkpoint:
+    """
+    Append-only JSONL log of finished files so an interrupted run can resume.
+    Files recorded as `done` or `skipped` are not processed again; failures are retried.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.finished = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry["status"] in ("done", "skipped"):
+                            self.finished[entry["path"]] = entry
+
+    def record(self, path, status, **extra):
+        entry = {"path": path, "status": status, **extra}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        if status in ("done", "skipped"):
+            self.finished[path] = entry
+
+
+class BulkIngestor:
+    """
+    Ingest a corpus of PDFs through `data_pipeline` with a process pool.
+
+    Hashing, extraction/preprocessing and embedding run in parallel workers, already indexed
+    hashes are skipped, and the parent process looks up near-duplicate chunks (whose stored
+    vectors are reused instead of embedded), upserts the results and checkpoints every
+    finished file.
+    """
+
+    def __init__(self, workers=None, checkpoint_path="ingest_checkpoint.jsonl", torch_threads=1,
+                 log=logger.info):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.torch_threads = torch_threads
+        self.embeddings = VectorEmbeddings()
+        self.log = log
+
+    def run(self, paths):
+        start = time.monotonic()
+        report = {"total": len(paths), "done": 0, "skipped": 0, "failed": 0, "chunks": 0, "duplicate_chunks": 0,
+                  "failures": []}
+        pending = [p for p in paths if p not in self.checkpoint.finished]
+        report["resumed"] = len(paths) - len(pending)
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                 initargs=(self.torch_threads, self.embeddings.index)) as pool:
+            # Hashes are submitted first; each finished hash immediately queues the
+            # extraction/preprocessing stage for its document in the same pool, and each
+            # extracted document its embedding stage
+            running = {pool.submit(hash_file, p): ("hash", p) for p in pending}
+            seen = set()
+            # Documents marked processing, by path, so a failed stage can mark them failed
+            processing = {}
+            encoding = {}
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, path = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        encoding.pop(path, None)
+                        if path in processing:
+                            registry.mark_failed(processing[path], e)
+                        self.fail(report, path, e)
+                        continue
+
+                    if stage == "hash":
+                        _, file_hash = result
+                        if file_hash in seen or registry.lookup(file_hash) is not None:
+                            self.checkpoint.record(path, "skipped", file_hash=file_hash)
+                            report["skipped"] += 1
+                        else:
+                            seen.add(file_hash)
+                            registry.mark_processing(file_hash)
+                            processing[path] = file_hash
+                            running[pool.submit(extract_chunks, path, file_hash)] = ("extract", path)
+                        continue
+
+                    if stage == "extract":
+                        _, file_hash, chunks, chunk_signatures, json_data, extractor_version, title = result
+                        try:
+                            vectors, sources = dedupe.reuse_vectors(self.embeddings, chunks, chunk_signatures)
+                        except Exception as e:
+                            registry.mark_failed(file_hash, e)
+                            self.fail(report, path, e)
+                            continue
+                        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+                        encoding[path] = (file_hash, chunks, chunk_signatures, vectors, sources, json_data,
+                                          extractor_version, title, missing)
+                        if missing:
+                            running[pool.submit(encode_texts, path, [chunks[idx][1] for idx in missing])] = \
+                                ("encode", path)
+                            continue
+
+                    # Storage stays in this process, as results arrive
+                    file_hash, chunks, chunk_signatures, vectors, sources, json_data, extractor_version, title, \
+                        missing = encoding.pop(path)
+                    for idx, vector in zip(missing, result[1] if stage == "encode" else ()):
+                        vectors[idx] = vector
+                    try:
+                        self.embeddings.store_chunks(chunks, vectors)
+                        dedupe.record(chunks, chunk_signatures)
+                        # The pool stays pinned to the version the run started with
+                        index = index_versions.follow_active_version(self.embeddings, file_hash)
+                    except Exception as e:
+                        registry.mark_failed(file_hash, e)
+                        self.fail(report, path, e)
+                        continue
+                    outcome = dedupe.report(file_hash, sources)
+                    registry.mark_ready(file_hash, len(chunks), page_count(json_data), title,
+                                        index.embedding_model, structured_data=json_data,
+                                        extractor_version=extractor_version, **outcome)
+                    self.checkpoint.record(path, "done", file_hash=file_hash, chunks=len(chunks),
+                                           duplicate_chunks=outcome["duplicate_chunks"])
+                    report["done"] += 1
+                    report["chunks"] += len(chunks)
+                    report["duplicate_chunks"] += outcome["duplicate_chunks"]
+                    self.log(f"[{report['done'] + report['skipped'] + report['failed']}/{len(pending)}] "
+                             f"{path}: {len(chunks)} chunks, {outcome['duplicate_chunks']} near-duplicates")
+
+        elapsed = time.monotonic() - start
+        report["elapsed_s"] = round(elapsed, 1)
+        report["docs_per_minute"] = round(report["done"] / elapsed * 60, 2) if elapsed else 0.0
+        report["dedupe_ratio"] = round(report["duplicate_chunks"] / report["chunks"], 4) if report["chunks"] else 0.0
+        return report
+
+    def fail(self, report, path, error):
+        logger.error("Failed to ingest %s: %s", path, error)
+        self.checkpoint.record(path, "failed", error=f"{type(error).__name__}: {error}")
+        report["failed"] += 1
+        report["failures"].append({"path": path, "error": str(error)})
@@ -0,0 +1,58 @@
+import threading
+from contextlib import contextmanager
+
+
+class LLMBudget:
+    """
+    Process wide budget of concurrent LLM calls shared by interactive requests and
+    background jobs.
+
+    Interactive calls may use every slot. Background calls use at most `background_limit`
+    slots and only start while no interactive call is waiting, so precomputation never
+    starves Q&A.
+    """
+
+    def __init__(self, limit, background_limit=1):
+        self.limit = limit
+        self.background_limit = min(background_limit, limit)
+        self.condition = threading.Condition()
+        self.in_use = 0
+        self.background_in_use = 0
+        self.interactive_waiting = 0
+
+    def _can_start(self, background):
+        if self.in_use >= self.limit:
+            return False
+        if background:
+            return self.interactive_waiting == 0 and self.background_in_use < self.background_limit
+        return True
+
+    def acquire(self, background=False):
+        with self.condition:
+            if not background:
+                self.interactive_waiting += 1
+            try:
+                self.condition.wait_for(lambda: self._can_start(background))
+            finally:
+                if not background:
+                    self.interactive_waiting -= 1
+                    # Background waiters may start now that no interactive call is waiting
+                    self.condition.notify_all()
+            self.in_use += 1
+            if background:
+                self.background_in_use += 1
+
+    def release(self, background=False):
+        with self.condition:
+            self.in_use -= 1
+            if background:
+                self.background_in_use -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, background=False):
+        self.acquire(background)
+        try:
+            yield
+        finally:
+            self.release(background)
@@ -0,0 +1,103 @@
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+
+# Rough token estimate for English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def top_k_select(scores, k, costs=None, budget=0):
+    """
+    Indices of the `k` highest `scores`, best first. With a `budget`, chunks that no longer
+    fit are skipped in favour of the next most relevant ones.
+    """
+    if not budget:
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    selected, remaining = [], budget
+    for idx in np.argsort(-scores):
+        if len(selected) == k:
+            break
+        # The best chunk is always taken, so the context is never empty
+        if costs[idx] <= remaining or not selected:
+            selected.append(idx)
+            remaining -= costs[idx]
+    return np.asarray(selected, dtype=np.int64)
+
+
+def mmr_select(scores, matrix, k, lambda_=None, candidates=None, costs=None, budget=0, duplicate_threshold=None):
+    """
+    Greedy maximal marginal relevance: repeatedly pick the chunk maximizing
+    `lambda_ * relevance - (1 - lambda_) * max similarity to the chunks already picked`.
+
+    The pairwise similarities of the candidate pool (the `candidates` most relevant chunks)
+    come from one matrix product over the normalized `matrix`; every step then only updates
+    the running maximum similarity with one row of it. `lambda_`, `candidates` and
+    `duplicate_threshold` default to MMR_LAMBDA, MMR_CANDIDATES and MMR_DUPLICATE_THRESHOLD.
+
+    Args:
+        scores (ndarray): Cosine similarity of the question to every chunk.
+        matrix (ndarray): Normalized chunk embeddings, one row per chunk.
+        costs (ndarray): Token cost of every chunk, needed with a `budget`.
+
+    Returns:
+        ndarray: Chunk indices in selection order.
+    """
+    lambda_ = getattr(settings, "MMR_LAMBDA", 0.7) if lambda_ is None else lambda_
+    candidates = candidates or getattr(settings, "MMR_CANDIDATES", 20)
+    if duplicate_threshold is None:
+        duplicate_threshold = getattr(settings, "MMR_DUPLICATE_THRESHOLD", 0.95)
+    pool_size = min(max(candidates, k), len(scores))
+    if not pool_size:
+        return np.zeros(0, dtype=np.int64)
+    pool = np.argpartition(-scores, pool_size - 1)[:pool_size]
+    relevance = scores[pool]
+    similarity = matrix[pool] @ matrix[pool].T
+    redundancy = np.zeros(pool_size, dtype=similarity.dtype)
+    available = np.ones(pool_size, dtype=bool)
+    pool_costs = costs[pool] if budget else None
+    remaining = budget
+
+    selected = []
+    while len(selected) < k:
+        if budget and selected:
+            available &= pool_costs <= remaining
+        if not available.any():
+            break
+        marginal = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= redundancy < duplicate_threshold
+        if budget:
+            remaining -= pool_costs[best]
+    return pool[selected]
+
+
+def select_context(scores, matrix, costs, k, mode=None, budget=None):
+    """
+    Pick the context chunks for one question with the configured (or given) selection
+    `mode` and token `budget`. `costs` holds the estimated tokens of every chunk.
+    Returns chunk indices in prompt order.
+    """
+    mode = mode or getattr(settings, "CONTEXT_SELECTION", "top_k")
+    budget = getattr(settings, "CONTEXT_TOKEN_BUDGET", 0) if budget is None else budget
+    if mode == "mmr":
+        selected = mmr_select(scores, matrix, k, costs=costs, budget=budget)
+    elif mode == "top_k":
+        selected = top_k_select(scores, k, costs, budget)
+    else:
+        raise ValueError(f"Unknown context selection {mode!r}")
+    metrics.increment("researchiq_context_tokens_total", int(costs[selected].sum()), selection=mode)
+    return selected
+
+
+metrics.REGISTRY.describe("researchiq_context_tokens_total", "Estimated tokens of the Q&A context, by selection mode.")
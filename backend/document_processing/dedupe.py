@@ -0,0 +1,177 @@
+import re
+import zlib
+import hashlib
+import logging
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics
+from .models import ChunkSignature, SignatureBand, content_hash
+
+logger = logging.getLogger(__name__)
+
+# Shorter chunks (headings, captions) are cheap to embed and too short to compare reliably
+MIN_WORDS = 20
+SHINGLE_WORDS = 3
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a bucket. Changing
+# these invalidates the stored signatures.
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240601)
+# a * x + b stays below 2**64 for 32 bit shingle hashes x
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+
+def minhash(text, block=4096):
+    """
+    MinHash signature (NUM_PERM uint32) of the word SHINGLE_WORDS-grams of `text`, or None
+    if it has fewer than MIN_WORDS words.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = np.fromiter(
+        {zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+         for i in range(len(words) - SHINGLE_WORDS + 1)}, dtype=np.uint64)
+    signature = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    for start in range(0, len(shingles), block):
+        hashed = (np.outer(shingles[start:start + block], _A) + _B) % _PRIME
+        np.minimum(signature, hashed.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+
+def buckets(signature):
+    """LSH bucket of every band of `signature`, as signed 64 bit integers."""
+    return [int.from_bytes(hashlib.blake2b(bytes([band]) + signature[band * ROWS:(band + 1) * ROWS].tobytes(),
+                                           digest_size=8).digest(), "little", signed=True)
+            for band in range(BANDS)]
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(first == second))
+
+
+def signatures(chunks):
+    """MinHash signature of every (content_uid, content, metadata) chunk (None for short ones)."""
+    if not getattr(settings, "DEDUPE_THRESHOLD", 0.9):
+        return [None] * len(chunks)
+    return [minhash(content) for _, content, _ in chunks]
+
+
+def find_duplicates(chunks, chunk_signatures, batch_size=500):
+    """
+    The most similar stored chunk of another document for every chunk, when their estimated
+    Jaccard similarity (of their word shingles) reaches DEDUPE_THRESHOLD.
+
+    Returns:
+        list: (content_uid, document_uid, content_hash) of the match, or None, per chunk.
+    """
+    matches = [None] * len(chunks)
+    threshold = getattr(settings, "DEDUPE_THRESHOLD", 0.9)
+    wanted = {idx: buckets(signature) for idx, signature in enumerate(chunk_signatures) if signature is not None}
+    if not wanted:
+        return matches
+
+    by_bucket = {}
+    for idx, chunk_buckets in wanted.items():
+        for bucket in chunk_buckets:
+            by_bucket.setdefault(bucket, set()).add(idx)
+    candidates = {}
+    all_buckets = list(by_bucket)
+    for start in range(0, len(all_buckets), batch_size):
+        for chunk_id, bucket in SignatureBand.objects.filter(bucket__in=all_buckets[start:start + batch_size]) \
+                .values_list("chunk_id", "bucket"):
+            for idx in by_bucket[bucket]:
+                candidates.setdefault(idx, set()).add(chunk_id)
+    if not candidates:
+        return matches
+
+    candidate_ids = list(set().union(*candidates.values()))
+    stored = {}
+    for start in range(0, len(candidate_ids), batch_size):
+        for row in ChunkSignature.objects.filter(pk__in=candidate_ids[start:start + batch_size]) \
+                .values_list("pk", "content_uid", "document_uid", "content_hash", "signature"):
+            stored[row[0]] = (row[1], row[2], row[3], np.frombuffer(bytes(row[4]), dtype=np.uint32))
+
+    for idx, chunk_ids in candidates.items():
+        document_uid = chunks[idx][2]["document_uid"]
+        scored = [(similarity(chunk_signatures[idx], stored[chunk_id][3]), stored[chunk_id])
+                  for chunk_id in chunk_ids if chunk_id in stored and stored[chunk_id][1] != document_uid]
+        if scored:
+            score, best = max(scored, key=lambda item: item[0])
+            if score >= threshold:
+                matches[idx] = best[:3]
+    return matches
+
+
+def reuse_vectors(embeddings, chunks, chunk_signatures, collection_name=None):
+    """
+    Vectors of near-duplicate chunks already stored in the index of `embeddings` (or in
+    `collection_name`). A match is skipped if its chunk is missing from the index or no
+    longer has the text its signature was computed from.
+
+    Returns:
+        tuple: (vector or None per chunk, document_uid of the reused chunk or None per chunk)
+    """
+    vectors, sources = [None] * len(chunks), [None] * len(chunks)
+    matches = find_duplicates(chunks, chunk_signatures)
+    wanted = {match[0]: match for match in matches if match is not None}
+    if not wanted:
+        return vectors, sources
+
+    results = embeddings.get_collection(collection_name).get(ids=list(wanted), include=["documents", "embeddings"])
+    found = {content_uid: embedding
+             for content_uid, document, embedding in zip(results["ids"], results["documents"], results["embeddings"])
+             if content_hash(document) == wanted[content_uid][2]}
+    for idx, match in enumerate(matches):
+        if match is not None and match[0] in found:
+            vectors[idx], sources[idx] = found[match[0]], match[1]
+    return vectors, sources
+
+
+@transaction.atomic
+def record(chunks, chunk_signatures):
+    """Store the signatures of freshly stored chunks so later documents can match them."""
+    rows = [(chunk, signature) for chunk, signature in zip(chunks, chunk_signatures) if signature is not None]
+    if not rows:
+        return
+    ChunkSignature.objects.filter(content_uid__in=[chunk[0] for chunk, _ in rows]).delete()
+    created = ChunkSignature.objects.bulk_create([
+        ChunkSignature(content_uid=content_uid, document_uid=metadata["document_uid"],
+                       content_hash=content_hash(content), signature=signature.tobytes())
+        for (content_uid, content, metadata), signature in rows], batch_size=500)
+    SignatureBand.objects.bulk_create([
+        SignatureBand(chunk=chunk, bucket=bucket)
+        for chunk, (_, signature) in zip(created, rows) for bucket in buckets(signature)], batch_size=2000)
+
+
+def version_source(sources):
+    """
+    The stored document a new one is a version of: the one its reused chunks came from
+    most, if they make up at least DEDUPE_VERSION_SHARE of its chunks. "" otherwise.
+    """
+    share = getattr(settings, "DEDUPE_VERSION_SHARE", 0.5)
+    counts = Counter(source for source in sources if source is not None)
+    if not share or not counts:
+        return ""
+    document_uid, count = counts.most_common(1)[0]
+    return document_uid if count / len(sources) >= share else ""
+
+
+def report(file_hash, sources):
+    """Count, log and return the dedupe outcome of one ingested document."""
+    duplicates = sum(source is not None for source in sources)
+    version_of = version_source(sources)
+    metrics.increment("researchiq_chunks_total", duplicates, operation="deduplicated")
+    if sources:
+        logger.info("Document %s: %d of %d chunks reused near-duplicate vectors (dedupe ratio %.2f)%s",
+                    file_hash, duplicates, len(sources), duplicates / len(sources),
+                    f", version of {version_of}" if version_of else "")
+    return {"duplicate_chunks": duplicates, "version_of": version_of}
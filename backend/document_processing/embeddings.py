@@ -1,20 +1,101 @@
 import time
 import hashlib
 import os
-import chromadb
+import logging
+import contextvars
+from functools import lru_cache
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from groq import Groq
-from chromadb.config import Settings
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from django.conf import settings
 from sentence_transformers import SentenceTransformer
 
+from . import dedupe, metrics
+from .concurrency import LLMBudget
+from .context_selection import select_context
+from .matrix_cache import DocumentMatrix, DocumentMatrixCache
+from .projections import chunk_index
+from .vector_store import open_store
+
+logger = logging.getLogger(__name__)
+
+# Process wide cap on in-flight LLM calls; time spent waiting for a slot is the LLM queue wait.
+# Background jobs get at most LLM_BACKGROUND_MAX_CONCURRENCY of those slots.
+LLM_BUDGET = LLMBudget(getattr(settings, "LLM_MAX_CONCURRENCY", 4),
+                       getattr(settings, "LLM_BACKGROUND_MAX_CONCURRENCY", 1))
+
+# Bump whenever `build_chunks` changes how documents are split into chunks
+CHUNKING_VERSION = 1
+DEFAULT_COLLECTION = "researchIQ"
+
+# The vector index being served: vector store collection, the model its vectors were built with
+# and the EmbeddingReducer applied to them (None for full dimension vectors)
+IndexSpec = namedtuple("IndexSpec", ["collection_name", "embedding_model", "reducer"], defaults=[None])
+_index_resolver = None
+
+
+def embedding_model_name():
+    """The sentence-transformers model new index versions are built with."""
+    return getattr(settings, "EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+
+
+def default_index():
+    """The index served before any index version is recorded."""
+    return IndexSpec(DEFAULT_COLLECTION, embedding_model_name())
+
+
+def set_index_resolver(resolver):
+    """Install the callable returning the active IndexSpec (see `index_versions`)."""
+    global _index_resolver
+    _index_resolver = resolver
+
+
+def active_index():
+    return _index_resolver() if _index_resolver is not None else default_index()
+
+# Normalized embedding matrices of recently queried documents, kept per process
+MATRIX_CACHE = DocumentMatrixCache(int(getattr(settings, "MATRIX_CACHE_MAX_MB", 256) * 1024 * 1024),
+                                   getattr(settings, "MATRIX_CACHE_TTL", 300) or None)
+
+
+@lru_cache(maxsize=None)
+def load_embedding_model(name):
+    """Load a SentenceTransformer once per process and share it between requests."""
+    return SentenceTransformer(name)
+
 
 class VectorEmbeddings:
 
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path="database")
-        # Load Embedding Model i.e SentenceTransformer
-        self.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(self, index=None):
+        self._store = None
+        self._embedding_model = None
+        # Pinned on first use so one request never mixes two index versions
+        self._index = index
+
+    @property
+    def store(self):
+        # Open the vector store lazily so processes that only encode never touch the database
+        if self._store is None:
+            self._store = open_store()
+        return self._store
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = active_index()
+        return self._index
+
+    @property
+    def embedding_model(self):
+        # Load Embedding Model i.e SentenceTransformer, only once something needs to be encoded
+        if self._embedding_model is None:
+            self._embedding_model = load_embedding_model(self.index.embedding_model)
+        return self._embedding_model
+
+    def get_collection(self, collection_name=None):
+        """The named collection, or the collection of this instance's index version."""
+        return self.store.get_collection(collection_name or self.index.collection_name)
 
     def flatten_values_to_string(self, data):
         """
@@ -50,73 +131,181 @@ class VectorEmbeddings:
         """
         return hashlib.sha256(str(content).encode('utf-8')).hexdigest()
 
-    def embedding_creation(self, contents, file_hash, collection_name="researchIQ"):
-        """
-        Process JSON data to generate embeddings and store in ChromaDB.
-        If the document UID exists, return the existing data; otherwise, create embeddings and store.
+    def build_chunks(self, contents, file_hash):
         """
-        # # Generate a unique UID for the entire document
-        # document_uid = self.generate_uid_for_document(contents)
-        # print(f"Processing document with UID: {document_uid}")
-
-        # Load or create collection
-        collection = self.client.get_or_create_collection(name=collection_name)
-
-        # Flatten the JSON structure
-        flat_data = self.flatten_values_to_string(contents)
-        output_data = {}
-        output_data['document_uid'] = file_hash
+        Flatten the extracted sections of a document into the chunks that get stored.
 
-        for idx, (key, value) in enumerate(flat_data.items()):
+        Returns:
+        - list: (content_uid, content, metadata) tuples, one per key-value pair.
+        """
+        chunks = []
+        ingested_at = time.time()
+        for idx, (key, value) in enumerate(self.flatten_values_to_string(contents).items()):
             # Generate unique ID for each key-value pair within the document
             content_uid = f"{file_hash}_content{idx + 1}"
-
             # Combine key and value as input for embedding
             content = f"{key}: {value}"
+            metadata = {
+                "document_uid": file_hash,  # Link key-value pair to document UID
+                "key": key,
+                "value": value,
+                "ingested_at": ingested_at  # Backfills the registry for unregistered documents
+            }
+            chunks.append((content_uid, content, metadata))
+        return chunks
+
+    @staticmethod
+    def normalize(vectors):
+        """L2-normalize the rows of a float32 matrix in place; returns it."""
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        return vectors
+
+    def reduce(self, vectors):
+        """Full dimension model output -> the vectors stored in (and queried against) the index."""
+        reducer = self.index.reducer
+        return reducer.apply(vectors) if reducer is not None else vectors
+
+    @metrics.timed("embedding")
+    def encode_documents(self, documents, batch_size=32, reduce=True):
+        """
+        Encode a list of texts in batches; returns a contiguous (len(documents), dim) float32
+        array of L2-normalized rows, reduced like the index's vectors unless `reduce` is False.
+        Vectors are normalized here, once, so stores and scorers can use them as they are.
+        """
+        if not documents:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = self.normalize(np.ascontiguousarray(self.embedding_model.encode(
+            documents, batch_size=batch_size, convert_to_tensor=False), dtype=np.float32))
+        return self.reduce(vectors) if reduce else vectors
 
-            # Generate embedding
-            embedding = self.embedding_model.encode(
-                content, convert_to_tensor=False).tolist()
+    def encode_chunks(self, chunks, collection_name=None):
+        """
+        Vectors of `chunks`: near-duplicates of stored chunks of other documents reuse their
+        vectors (see `dedupe`), the others are encoded.
 
-            # Store in ChromaDB
+        Returns:
+            tuple: (float32 matrix, MinHash signature per chunk, document_uid each reused
+            vector came from or None per chunk)
+        """
+        chunk_signatures = dedupe.signatures(chunks)
+        vectors, sources = dedupe.reuse_vectors(self, chunks, chunk_signatures, collection_name)
+        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+        if len(missing) == len(chunks):
+            return self.encode_documents([content for _, content, _ in chunks]), chunk_signatures, sources
+        for idx, vector in zip(missing, self.encode_documents([chunks[idx][1] for idx in missing])):
+            vectors[idx] = vector
+        return np.asarray(vectors, dtype=np.float32), chunk_signatures, sources
+
+    @metrics.timed("vector_upsert")
+    def store_chunks(self, chunks, embeddings, collection_name=None, batch_size=500):
+        """
+        Upsert chunks and their embeddings into the vector store in batches. Embeddings are
+        passed on as float32 array slices; both backends take them without a list copy.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        collection = self.get_collection(collection_name)
+        for document_uid in {metadata["document_uid"] for _, _, metadata in chunks}:
+            MATRIX_CACHE.invalidate(document_uid, collection.name)
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
             collection.upsert(
-                documents=[content],  # Document text (key-value pair)
-                metadatas=[{
-                    "document_uid": file_hash,  # Link key-value pair to document UID
-                    "key": key,
-                    "value": value
-                }],  # Metadata for the pair
-                ids=[content_uid],  # Unique ID for key-value pair
-                embeddings=[embedding]  # Vector embedding
+                ids=[content_uid for content_uid, _, _ in batch],
+                documents=[content for _, content, _ in batch],
+                metadatas=[metadata for _, _, metadata in batch],
+                embeddings=embeddings[start:start + batch_size]
             )
 
+    def embedding_creation(self, contents, file_hash, collection_name=None):
+        """
+        Process JSON data to generate embeddings and store them in the vector store.
+        If the document UID exists, return the existing data; otherwise, create embeddings and store.
+        Each chunk's `embedding` is a row view of the float32 matrix, not a copy.
+        Near-duplicates of other documents' chunks reuse their vectors (see `encode_chunks`).
+        """
+        chunks = self.build_chunks(contents, file_hash)
+        embeddings, chunk_signatures, sources = self.encode_chunks(chunks, collection_name)
+        self.store_chunks(chunks, embeddings, collection_name)
+        dedupe.record(chunks, chunk_signatures)
+
+        output_data = {}
+        output_data['document_uid'] = file_hash
+        for (content_uid, _, metadata), embedding in zip(chunks, embeddings):
             output_data[content_uid] = [
-                {"key": key, "value": value, "embedding": embedding}
+                {"key": metadata["key"], "value": metadata["value"], "embedding": embedding}
             ]
 
+        duplicates = dedupe.report(file_hash, sources)["duplicate_chunks"]
+        metrics.increment("researchiq_chunks_total", len(chunks) - duplicates, operation="embedded")
+        logger.info("Stored %d chunks for document %s", len(chunks), file_hash)
         return output_data
 
-    def retrieve_data(self, file_hash, collection_name="researchIQ"):
+    def document_exists(self, file_hash, collection_name=None):
+        """Cheap existence check that fetches a single id and nothing else."""
+        collection = self.get_collection(collection_name)
+        return bool(collection.get(where={"document_uid": file_hash}, limit=1, include=[])["ids"])
+
+    @metrics.timed("retrieval")
+    def retrieve_data(self, file_hash, collection_name=None, include=None):
+        """
+        Fetch every stored chunk of a document, or False if it is unknown. `include` limits
+        what the vector store returns (default: documents, metadatas and embeddings).
+        """
         # Load or create collection
-        collection = self.client.get_or_create_collection(name=collection_name)
+        collection = self.get_collection(collection_name)
 
         # Check if entries with the same document UID already exist
         results = collection.get(
             where={"document_uid": file_hash},
-            include=["documents", "metadatas", "embeddings"]
+            include=include if include is not None else ["documents", "metadatas", "embeddings"]
         )
 
         if results and results["ids"]:  # If data exists, return it
-            for idx, doc_id in enumerate(results["ids"]):
-                print(f"UID: {doc_id}")
-                # print(f"Content: {results['documents'][idx]}")
-                # print(f"Metadata: {results['metadatas'][idx]}")
-                # print("-" * 40)
+            logger.debug("Found %d chunks for document %s", len(results["ids"]), file_hash)
             results["document_uid"] = file_hash
             return results  # Return all associated entries
         else:
             return False
 
+    def document_matrix(self, file_hash, collection_name=None):
+        """
+        Return the document's chunk texts and normalized float32 embedding matrix, from the
+        in-process cache when possible. Returns None if the document is unknown.
+        """
+        collection_name = collection_name or self.index.collection_name
+        entry = MATRIX_CACHE.get(collection_name, file_hash)
+        if entry is not None:
+            return entry
+
+        collection = self.get_collection(collection_name)
+        results = collection.get(
+            where={"document_uid": file_hash},
+            include=["documents", "embeddings"]
+        )
+        if not results["ids"]:
+            return None
+        return MATRIX_CACHE.put(collection_name, file_hash,
+                                DocumentMatrix(results["ids"], results["documents"], results["embeddings"]))
+
+    @metrics.timed("retrieval")
+    def document_overview(self, file_hash, collection_name=None):
+        """
+        Compact description of a stored document (chunk count and section keys), fetched
+        without embeddings or texts. Returns None if the document is unknown.
+        """
+        collection = self.get_collection(collection_name)
+        results = collection.get(
+            where={"document_uid": file_hash},
+            include=["metadatas"]
+        )
+        if not results["ids"]:
+            return None
+        return {
+            "document_uid": file_hash,
+            "chunk_count": len(results["ids"]),
+            "keys": [metadata["key"] for metadata in results["metadatas"]],
+            "ingested_at": min((metadata.get("ingested_at", 0) for metadata in results["metadatas"]), default=0),
+        }
+
 
 class QnaHelper(VectorEmbeddings):
     def __init__(self):
@@ -127,6 +316,8 @@ class QnaHelper(VectorEmbeddings):
         self.LLAMA3_8B_INSTRUCT = "llama3.1-8b-instant"
         self.DEFAULT_MODEL = self.LLAMA3_70B_INSTRUCT
         self.max_token = 5000
+        # Background jobs yield LLM slots to interactive requests
+        self.background = False
 
     def truncate_to_fit(self, content):
         """
@@ -138,47 +329,112 @@ class QnaHelper(VectorEmbeddings):
         return content
 
     def question_embedding(self, question):
-        """Generate embedding for the given question."""
-        return self.embedding_model.encode(
-            question, convert_to_tensor=False
-        ).tolist()
+        """Generate the normalized float32 embedding for the given question."""
+        return self.encode_documents([question])[0]
 
-    def retrieve_data(self, question, file_hash, collection_name="researchIQ", top_k=5):
+    def chat_completion(self, timings=None, **kwargs):
+        """
+        Call the Groq chat completion API once a slot of the process wide LLM budget is free,
+        recording the queue wait, the call latency and the consumed tokens.
+        If `timings` is a dict, the queue wait and call durations (ms) are also stored in it.
+        """
+        start = time.perf_counter()
+        with metrics.stage("llm_queue_wait"):
+            LLM_BUDGET.acquire(self.background)
+        acquired = time.perf_counter()
+        try:
+            with metrics.stage("llm_call"):
+                response = self.llm.chat.completions.create(**kwargs)
+        finally:
+            LLM_BUDGET.release(self.background)
+        if timings is not None:
+            timings["llm_queue_wait_ms"] = round((acquired - start) * 1000, 2)
+            timings["llm_call_ms"] = round((time.perf_counter() - acquired) * 1000, 2)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.increment("researchiq_llm_tokens_total", usage.prompt_tokens, type="prompt")
+            metrics.increment("researchiq_llm_tokens_total", usage.completion_tokens, type="completion")
+        return response
+
+    def retrieve_data(self, question, file_hash, collection_name=None, top_k=5, selection=None, token_budget=None):
         """Retrieve top_k relevant data based on the file_hash and return query and prompt as a dictionary."""
-        # Load or create collection
-        collection = self.client.get_or_create_collection(name=collection_name)
+        batch = self.retrieve_batch([question], file_hash, collection_name, top_k,
+                                    selection=selection, token_budget=token_budget)
+        if batch is None:
+            return None
+        return batch[0]
 
-        # Fetch all entries matching the document UID
-        results = collection.get(
-            where={"document_uid": file_hash},
-            include=["documents", "metadatas", "embeddings"]
-        )
+    @metrics.timed("retrieval")
+    def retrieve_batch(self, questions, file_hash, collection_name=None, top_k=5, timings=None, selection=None,
+                       token_budget=None):
+        """
+        Retrieve the top_k context for many questions at once: the document's normalized
+        vectors come from the matrix cache (or are fetched once), all questions are embedded
+        in one batched `encode` call and ranked together with a single matrix product.
+        `selection` and `token_budget` override CONTEXT_SELECTION and CONTEXT_TOKEN_BUDGET
+        (see `context_selection`).
 
-        if results and results["ids"]:  # If data exists, rank and return top_k
+        Returns:
+            list: One dictionary per question, shaped like `retrieve_data`'s, or None if the document is unknown.
+        """
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
+        document = self.document_matrix(file_hash, collection_name)
+        timings["fetch_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if document is None:
+            logger.warning("No data found for UID: %s", file_hash)
+            return None
 
-            # Combine embeddings and documents to calculate relevance scores
-            question_emb = self.question_embedding(question)
-            scored_results = []
+        start = time.perf_counter()
+        question_matrix = self.encode_documents(list(questions))
+        timings["encode_ms"] = round((time.perf_counter() - start) * 1000, 2)
 
-            for idx, embedding in enumerate(results["embeddings"]):
-                score = self.calculate_similarity(question_emb, embedding)
-                scored_results.append((score, results['documents'][idx]))
+        start = time.perf_counter()
+        scores = document.scores(question_matrix)
 
-            # Sort by scores in descending order and retrieve top_k
-            scored_results = sorted(
-                scored_results, key=lambda x: x[0], reverse=True)[:top_k]
+        batch = []
+        for row in range(scores.shape[0]):
+            ranked = select_context(scores[row], document.matrix, document.token_costs, top_k, selection, token_budget)
+            scored_results = [(float(scores[row, idx]), document.documents[idx]) for idx in ranked]
             top_documents = [doc for _, doc in scored_results]
+            batch.append({"prompt": " ".join(top_documents), 'scored_results': scored_results,
+                          'top_document': top_documents})
+        timings["rank_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return batch
 
-            # Combine top_k document data into a single string
-            prompt = " ".join(top_documents)
+    def generate_batch_response(self, questions, file_hash, collection_name=None, top_k=5,
+                                max_concurrency=None):
+        """
+        Answer many questions about one document. Retrieval is shared (see `retrieve_batch`)
+        and the LLM calls run concurrently, bounded by `max_concurrency` and the process
+        wide LLM budget.
 
-            # Create and return the dictionary
-            return {"prompt": prompt, 'scored_results': scored_results, 'top_document': top_documents}
-        else:
-            print(f"No data found for UID: {file_hash}")
+        Returns:
+            dict: `answers` in question order, each with its own timing breakdown, and the shared `timings`.
+        """
+        timings = {}
+        batch = self.retrieve_batch(questions, file_hash, collection_name, top_k, timings)
+        if batch is None:
             return None
 
-    def generate_response(self, question, file_hash, collection_name="researchIQ", top_k=5):
+        def answer(question, data):
+            answer_timings = {}
+            start = time.perf_counter()
+            output = self.answer_from_context(question, data, answer_timings)
+            answer_timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return {"question": question, **(output or {'output': None}), "timings": answer_timings}
+
+        workers = max(1, min(max_concurrency or getattr(settings, "LLM_MAX_CONCURRENCY", 4), len(questions)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each task runs in a copy of the request context so stage timings reach the response
+            futures = [pool.submit(contextvars.copy_context().run, answer, question, data)
+                       for question, data in zip(questions, batch)]
+            answers = [future.result() for future in futures]
+
+        return {'answers': answers, 'timings': timings}
+
+    def generate_response(self, question, file_hash, collection_name=None, top_k=5):
         """Generate a response for the given question using the top_k relevant content from file_hash."""
         # Retrieve data
         data = self.retrieve_data(question, file_hash, collection_name, top_k)
@@ -186,6 +442,10 @@ class QnaHelper(VectorEmbeddings):
         if not data:
             return None
 
+        return self.answer_from_context(question, data)
+
+    def answer_from_context(self, question, data, timings=None):
+        """Ask the LLM to answer `question` from the context returned by `retrieve_data`."""
         prompt = self.truncate_to_fit(data["prompt"])
         scored_result = data["scored_results"]
         top_document = data["top_document"]
@@ -200,7 +460,8 @@ class QnaHelper(VectorEmbeddings):
 
         # Generate response
         try:
-            response = self.llm.chat.completions.create(
+            response = self.chat_completion(
+                timings=timings,
                 messages=[{"role": "user", "content": combined_prompt}],
                 model=self.DEFAULT_MODEL,
                 temperature=0.6,
@@ -215,82 +476,58 @@ class QnaHelper(VectorEmbeddings):
                 'top_document': top_document
             }
         except Exception as e:
-            print(f"Error generating response: {e}")
+            logger.exception(f"Error generating response: {e}")
             return None
 
     def calculate_similarity(self, query_emb, doc_emb):
-        """Calculate cosine similarity between query and document embeddings."""
-        # Ensure inputs are NumPy arrays
-        query_emb = np.array(query_emb)
-        doc_emb = np.array(doc_emb)
-
-        # Reshape to 2D arrays if needed
-        query_emb = query_emb.reshape(
-            1, -1) if query_emb.ndim == 1 else query_emb
-        doc_emb = doc_emb.reshape(1, -1) if doc_emb.ndim == 1 else doc_emb
-
-        # Compute cosine similarity
-        # Extract scalar similarity value
-        return cosine_similarity(query_emb, doc_emb)[0][0]
-
+        """
+        Cosine similarity between query and document embeddings, one vector or a matrix of
+        rows each, as a single float32 matrix product. Returns a float for one pair, the
+        scores against every document row for one query, or a (queries, documents) array.
+        """
+        query = self.normalize(np.array(query_emb, dtype=np.float32, ndmin=2))
+        docs = self.normalize(np.array(doc_emb, dtype=np.float32, ndmin=2))
+        scores = query @ docs.T
+        if scores.size == 1:
+            return float(scores[0, 0])
+        return scores[0] if len(query) == 1 else scores
 
 class summmarizerHelper(QnaHelper):
 
-    def __init__(self, document_uid=""):
+    def __init__(self, document_uid="", background=False):
         super().__init__()
         self.document_uid = document_uid
+        self.background = background
 
-    def retrieve_data(self, collection_name="researchIQ"):
-        """Retrieve top_k relevant data based on the file_hash and return query and prompt as a dictionary."""
+    @metrics.timed("retrieval")
+    def retrieve_all_heading(self, collection_name=None):
+        """Return the key/value metadata of every section of the document, in chunk order."""
         # Load or create collection
-        collection = self.client.get_or_create_collection(name=collection_name)
+        collection = self.get_collection(collection_name)
 
-        # Fetch all entries matching the document UID
+        # Only the metadata is needed; skip documents and embeddings
         results = collection.get(
             where={"document_uid": self.document_uid},
-            include=["documents", "metadatas", "embeddings"]
+            include=["metadatas"]
         )
-        return results["metadatas"]
+        order = sorted(range(len(results["ids"])), key=lambda idx: chunk_index(results["ids"][idx]))
+        return [results["metadatas"][idx] for idx in order]
 
-    def retrieve_all_heading(self, collection_name="researchIQ"):
-        """Retrieve top_k relevant data based on the file_hash and return query and prompt as a dictionary."""
-        # Load or create collection
-        collection = self.client.get_or_create_collection(name=collection_name)
-
-        # Fetch all entries matching the document UID
+    @metrics.timed("retrieval")
+    def retrieve_section(self, key, collection_name=None):
+        """Return the metadata of the section named `key`, or None if the document has no such section."""
+        collection = self.get_collection(collection_name)
         results = collection.get(
-            where={"document_uid": self.document_uid},
-            include=["documents", "metadatas", "embeddings"]
+            where={"$and": [{"document_uid": self.document_uid}, {"key": key}]},
+            limit=1,
+            include=["metadatas"]
         )
-        return results["metadatas"]
-
-    def check_token_size(self, next_output):
-        if len(next_output) > 15000:
-            return True
-        return False
-
-    def token_wise_summary(self):
-        summary_prompt = ""
-        prompt = self.retrieve_data()
-        output, next_output = "", ""
-        cnt = 0
-        for i in prompt:
-            output = next_output
-            next_output += i['key'] + " " + i['value'] + " "
-            if self.check_token_size(next_output):
-                summary_prompt += self.generate_response(output)[
-                    "output"] + " "
-                print("summary_prompt", summary_prompt)
-                output = ""
-                cnt += 1
-
-        summary_prompt += self.generate_response(output)["output"] + " "
-        return cnt, summary_prompt
+        return results["metadatas"][0] if results["ids"] else None
 
     def llm_response(self, combined_prompt):
         if len(combined_prompt) > 20000:
             combined_prompt = combined_prompt[:20000]
-        response = self.llm.chat.completions.create(
+        response = self.chat_completion(
             messages=[{"role": "user", "content": combined_prompt}],
             model=self.DEFAULT_MODEL,
             temperature=0.8,
@@ -302,10 +539,7 @@ class summmarizerHelper(QnaHelper):
             'prompt': combined_prompt,
         }
 
-    def generate_response(self, prompt=""):
-        if prompt == "":
-            prompt = self.retrieve_data()
-
+    def generate_response(self, prompt):
         combined_prompt = f"""
         You are an AI assistant specialized in creating concise and accurate summaries based exclusively on
         the provided documents. Do not use any external information or personal knowledge beyond what is given below.
@@ -320,28 +554,11 @@ class summmarizerHelper(QnaHelper):
         try:
             return self.llm_response(combined_prompt)
         except Exception as e:
-            print("sleeping for 60 seconds")
+            logger.warning("LLM call failed (%s), sleeping for 60 seconds", e)
             time.sleep(60)
             return self.llm_response(combined_prompt)
 
     def document_summary(self):
-        cnt, summary_prompt = self.token_wise_summary()
-        if cnt > 0:
-            combined_prompt = f"""
-            You are an AI assistant specialized in creating concise and accurate summaries based exclusively on
-            the provided documents. Do not use any external information or personal knowledge beyond what is given below.
-            {summary_prompt}
-            ### Task:
-            Please provide a comprehensive summary of the above documents.
-            Ensure that the summary captures all key points, main ideas, and essential details without introducing any information not present in the documents.
-            Strictly limit the summary to 2-3 paragraph depending on the prompt.
-
-            ### Summary:
-            """
-            try:
-                return self.llm_response(combined_prompt)
-            except Exception as e:
-                return self.llm_response(combined_prompt)
-        return {
-            'output': summary_prompt
-        }
+        """Summary of the whole document, served from its persistent summary tree."""
+        from .summary_tree import SummaryTree
+        return SummaryTree(self.document_uid, helper=self).document_summary()
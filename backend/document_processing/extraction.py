@@ -0,0 +1,217 @@
+import io
+import logging
+import threading
+import multiprocessing
+from collections import Counter
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import fitz
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Font size ratios to the body text from which a short block counts as a heading
+H1_SIZE_RATIO = 1.5
+H2_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 200
+
+# PyMuPDF is not thread safe: every fitz call of a process holds this lock
+FITZ_LOCK = threading.Lock()
+
+
+def backend_version(backend):
+    """Library and version behind an extraction backend, as recorded in the document registry."""
+    package, name = ("pdfservices-sdk", "pdfservices-sdk") if backend == "adobe" else ("PyMuPDF", "pymupdf")
+    try:
+        return f"{name}/{metadata.version(package)}"
+    except metadata.PackageNotFoundError:
+        return name
+
+
+def pdf_page_count(pdf_bytes):
+    """Number of pages of a PDF, or None if it cannot be opened."""
+    try:
+        with FITZ_LOCK, fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+            return document.page_count
+    except Exception:
+        return None
+
+
+def split_pdf(pdf_bytes, pages_per_range):
+    """
+    Split a PDF into consecutive page ranges.
+
+    Returns:
+        list: (first page, PDF bytes of the range) tuples in page order.
+    """
+    ranges = []
+    with FITZ_LOCK, fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        for first_page in range(0, document.page_count, pages_per_range):
+            last_page = min(first_page + pages_per_range, document.page_count) - 1
+            with fitz.open() as part:
+                part.insert_pdf(document, from_page=first_page, to_page=last_page)
+                ranges.append((first_page, part.tobytes(garbage=1)))
+    return ranges
+
+
+def merge_structured_data(parts):
+    """
+    Merge the `structuredData.json` payloads of consecutive page ranges into one.
+
+    Page numbers are shifted by the first page of their range. A range starting mid-document
+    has no title of its own, so a `/Title` the extractor found at its start is demoted to
+    `/H1`; everything else, including the heading an earlier range left open, is resolved by
+    parsing the merged element stream in page order.
+
+    Args:
+        parts (list): (first page, structuredData.json payload) tuples.
+    """
+    elements, pages = [], []
+    for first_page, json_data in sorted(parts, key=lambda part: part[0]):
+        for element in json_data.get("elements", []):
+            element = dict(element)
+            if "Page" in element:
+                element["Page"] += first_page
+            if first_page and "/Title" in element.get("Path", ""):
+                element["Path"] = element["Path"].replace("/Title", "/H1")
+            elements.append(element)
+        for page in json_data.get("pages", []):
+            pages.append({**page, "page_number": page.get("page_number", 0) + first_page})
+    return {"elements": elements, "pages": pages}
+
+
+def local_structured_data(pdf_bytes):
+    """
+    Extract the text blocks of a PDF with PyMuPDF, in the shape of Adobe's
+    `structuredData.json`. Every block is a `/P` element carrying its `TextSize`; headings
+    are assigned afterwards by `classify_headings`, once the whole document is known.
+    """
+    elements, pages = [], []
+    with FITZ_LOCK, fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        for number, page in enumerate(document):
+            pages.append({"page_number": number, "width": page.rect.width, "height": page.rect.height})
+            for block in page.get_text("dict")["blocks"]:
+                if block.get("type") != 0:  # images
+                    continue
+                lines = ["".join(span["text"] for span in line["spans"]).strip() for line in block["lines"]]
+                text = " ".join(line for line in lines if line)
+                sizes = [span["size"] for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+                if not text or not sizes:
+                    continue
+                elements.append({"Path": "//Document/P", "Text": text, "Page": number,
+                                 "TextSize": round(max(sizes), 2), "Bounds": list(block["bbox"])})
+    return {"elements": elements, "pages": pages}
+
+
+def classify_headings(json_data):
+    """
+    Tag short blocks set noticeably larger than the body text of the document as `/H1` or
+    `/H2`, and the largest one on the first page as the `/Title`. Modifies `json_data` in place.
+    """
+    elements = [element for element in json_data["elements"] if "TextSize" in element]
+    weights = Counter()
+    for element in elements:
+        weights[round(element["TextSize"])] += len(element["Text"])
+    if not weights:
+        return json_data
+    body_size = weights.most_common(1)[0][0]
+
+    title = None
+    for element in elements:
+        if len(element["Text"]) > HEADING_MAX_CHARS:
+            continue
+        ratio = element["TextSize"] / body_size
+        if ratio >= H1_SIZE_RATIO:
+            element["Path"] = "//Document/H1"
+            if element.get("Page") == 0 and (title is None or element["TextSize"] > title["TextSize"]):
+                title = element
+        elif ratio >= H2_SIZE_RATIO:
+            element["Path"] = "//Document/H2"
+    if title is not None:
+        title["Path"] = "//Document/Title"
+    return json_data
+
+
+class PageRangeExtractor:
+    """
+    Turns a PDF into an Adobe style `structuredData.json` payload, with either backend.
+
+    PDFs of at least `min_pages` pages are split into ranges of `pages_per_range` pages that
+    are extracted concurrently and merged back in page order, so extraction time follows the
+    slowest range rather than the page count. Adobe ranges run in threads (each is a separate
+    Adobe job, bounded by `ADOBE_MAX_CONCURRENCY`); local ranges run in a process pool since
+    PyMuPDF is CPU bound and not thread safe. The PyMuPDF work left in the calling thread
+    (counting and splitting pages, extracting unsplit PDFs locally) is serialized by
+    `FITZ_LOCK`, so concurrent requests never use it at the same time.
+
+    `backend` is "adobe" (Adobe PDF Services) or "local" (PyMuPDF, no credentials needed).
+    Unset arguments come from EXTRACTION_BACKEND, SPLIT_MIN_PAGES (0 never splits),
+    SPLIT_PAGES_PER_RANGE and SPLIT_MAX_WORKERS.
+    """
+
+    def __init__(self, backend=None, min_pages=None, pages_per_range=None, max_workers=None):
+        backend = backend or getattr(settings, "EXTRACTION_BACKEND", "adobe")
+        min_pages = getattr(settings, "SPLIT_MIN_PAGES", 0) if min_pages is None else min_pages
+        pages_per_range = pages_per_range or getattr(settings, "SPLIT_PAGES_PER_RANGE", 50)
+        max_workers = max_workers or getattr(settings, "SPLIT_MAX_WORKERS", 4)
+        if backend not in ("adobe", "local"):
+            raise ValueError(f"Unknown extraction backend {backend!r}")
+        self.backend = backend
+        self.version = backend_version(backend)
+        self.min_pages = min_pages
+        self.pages_per_range = max(1, pages_per_range)
+        self.max_workers = max(1, max_workers)
+        self.lock = threading.Lock()
+        self._processes = None
+
+    @property
+    def processes(self):
+        with self.lock:
+            if self._processes is None:
+                # Spawned rather than forked: the server process runs threads
+                self._processes = ProcessPoolExecutor(self.max_workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+            return self._processes
+
+    def extract(self, file, adobe):
+        """
+        Args:
+            file (file-like object): The PDF.
+            adobe (AdobeFunc): Used by the Adobe backend.
+
+        Returns:
+            tuple: (structuredData.json payload, version of the backend that extracted it)
+        """
+        return self.extract_payload(file, adobe), self.version
+
+    def extract_payload(self, file, adobe):
+        if self.backend == "adobe" and not self.min_pages:
+            return adobe.extract_json_from_zip(adobe.adobe_process(file))
+
+        pdf_bytes = file.read()
+        pages = pdf_page_count(pdf_bytes) if self.min_pages else None
+        if pages is None or pages < self.min_pages or pages <= self.pages_per_range:
+            if self.backend == "adobe":
+                return adobe.extract_json_from_zip(adobe.adobe_process(io.BytesIO(pdf_bytes)))
+            with metrics.stage("extraction"):
+                return classify_headings(local_structured_data(pdf_bytes))
+
+        with metrics.stage("split_extraction"):
+            ranges = split_pdf(pdf_bytes, self.pages_per_range)
+            logger.info("Extracting %d pages in %d ranges (%s)", pages, len(ranges), self.backend)
+            if self.backend == "adobe":
+                def extract_range(range_bytes):
+                    return adobe.extract_json_from_zip(adobe.adobe_process(io.BytesIO(range_bytes)))
+                with ThreadPoolExecutor(min(self.max_workers, len(ranges)),
+                                        thread_name_prefix="extract-range") as pool:
+                    results = list(pool.map(extract_range, [range_bytes for _, range_bytes in ranges]))
+            else:
+                results = list(self.processes.map(local_structured_data, [range_bytes for _, range_bytes in ranges]))
+            merged = merge_structured_data([(first_page, result) for (first_page, _), result in zip(ranges, results)])
+        return classify_headings(merged) if self.backend == "local" else merged
+
+
+EXTRACTOR = PageRangeExtractor()
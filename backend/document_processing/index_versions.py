@@ -0,0 +1,342 @@
+import time
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .embeddings import (
+    CHUNKING_VERSION, DEFAULT_COLLECTION, IndexSpec, VectorEmbeddings, default_index, embedding_model_name)
+from .models import Document, IndexVersion
+from .preprocessing import PREPROCESSING_VERSION
+from .projections import chunk_index
+from .reduction import EmbeddingReducer, top_k_overlap
+from . import registry
+
+logger = logging.getLogger(__name__)
+
+# How long a process keeps using its cached view of the active version
+ACTIVE_INDEX_TTL = 5.0
+
+_active = {"spec": None, "loaded_at": 0.0}
+_active_lock = threading.Lock()
+
+
+def configured_key():
+    """Version key of the index this code and configuration would build."""
+    key = f"{embedding_model_name()}|p{PREPROCESSING_VERSION}|c{CHUNKING_VERSION}"
+    if configured_reduction():
+        key += f"|{configured_reduction()}{configured_dimensions()}"
+    return key
+
+
+def configured_reduction():
+    """EMBEDDING_REDUCTION of the configuration, "" when the vectors are kept whole."""
+    reduction = getattr(settings, "EMBEDDING_REDUCTION", "none")
+    return "" if reduction == "none" else reduction
+
+
+def configured_dimensions():
+    return getattr(settings, "EMBEDDING_DIMENSIONS", 128)
+
+
+def collection_name_for(key):
+    return f"{DEFAULT_COLLECTION}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]}"
+
+
+def spec_of(version):
+    reducer = None
+    if version.reduction:
+        reducer = EmbeddingReducer.from_bytes(version.reduction, version.dimensions, version.projection)
+    return IndexSpec(version.collection_name, version.embedding_model, reducer)
+
+
+def active_version():
+    return IndexVersion.objects.filter(status=IndexVersion.Status.ACTIVE).first()
+
+
+def active_index():
+    """
+    IndexSpec of the active version, cached for ACTIVE_INDEX_TTL seconds. Falls back to the
+    default collection while the table is empty or not migrated yet.
+    """
+    with _active_lock:
+        if _active["spec"] is not None and time.monotonic() - _active["loaded_at"] < ACTIVE_INDEX_TTL:
+            return _active["spec"]
+    try:
+        version = active_version()
+    except DatabaseError:
+        version = None
+    spec = spec_of(version) if version is not None else default_index()
+    with _active_lock:
+        _active["spec"], _active["loaded_at"] = spec, time.monotonic()
+    return spec
+
+
+def forget_active_index():
+    with _active_lock:
+        _active["spec"] = None
+
+
+def index_collections():
+    """Collections holding live data: the active version and any version being built."""
+    names = set(IndexVersion.objects.exclude(status=IndexVersion.Status.RETIRED)
+                .values_list("collection_name", flat=True))
+    return names or {DEFAULT_COLLECTION}
+
+
+def chunk_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class IndexMigrator:
+    """
+    Build the index version described by the current configuration next to the active one
+    and switch to it once complete.
+
+    Documents are re-chunked from their stored extractor output (or, for documents ingested
+    before it was stored, from the chunks of the active version), and only chunks whose
+    content is new to the target version are embedded: chunks already present in the target
+    are skipped, so an interrupted run resumes where it stopped, and when the embedding model
+    is unchanged (and the active vectors are not reduced) vectors of identical chunks are
+    copied from the active version, reduced if the new version reduces them.
+
+    A PCA reduced version is fitted on a sample of the stored chunks before anything is
+    embedded; the fit and its top-k overlap with full dimension search are kept on the version.
+    """
+
+    def __init__(self, batch_size=64, log=logger.info):
+        self.batch_size = batch_size
+        self.log = log
+
+    def target(self):
+        key = configured_key()
+        version, _ = IndexVersion.objects.get_or_create(key=key, defaults={
+            "collection_name": collection_name_for(key),
+            "embedding_model": embedding_model_name(),
+            "preprocessing_version": PREPROCESSING_VERSION,
+            "chunking_version": CHUNKING_VERSION,
+            "reduction": configured_reduction(),
+            "dimensions": configured_dimensions() if configured_reduction() else 0,
+        })
+        if version.status == IndexVersion.Status.RETIRED:
+            # Rolling back to an earlier version brings it up to date again
+            version.status = IndexVersion.Status.BUILDING
+            version.save(update_fields=["status"])
+        return version
+
+    def target_chunks(self, source, document):
+        """The chunks `document` has under the current preprocessing and chunking code."""
+        extraction = getattr(document, "extraction", None)
+        if extraction is not None:
+            contents = registry.parse_extraction(extraction.data)
+        else:
+            # Only the preprocessed sections are stored for older documents; re-chunk those
+            results = source.get_collection().get(where={"document_uid": document.file_hash},
+                                                  include=["metadatas"])
+            order = sorted(range(len(results["ids"])), key=lambda idx: chunk_index(results["ids"][idx]))
+            contents = {results["metadatas"][idx]["key"]: results["metadatas"][idx]["value"] for idx in order}
+        return source.build_chunks(contents, document.file_hash)
+
+    def migrate_document(self, source, target, document, same_model):
+        """
+        Bring one document up to date in the target version.
+
+        Returns:
+            tuple: (chunks embedded, chunks reused from the active version)
+        """
+        chunks = self.target_chunks(source, document)
+        target_collection = target.get_collection()
+
+        existing = target_collection.get(where={"document_uid": document.file_hash}, include=["documents"])
+        present = {content_uid: chunk_hash(text) for content_uid, text in zip(existing["ids"], existing["documents"])}
+        wanted = {content_uid for content_uid, _, _ in chunks}
+        stale = [content_uid for content_uid in present if content_uid not in wanted]
+        if stale:
+            target_collection.delete(ids=stale)
+        chunks = [chunk for chunk in chunks if present.get(chunk[0]) != chunk_hash(chunk[1])]
+        if not chunks:
+            return 0, 0
+
+        reusable = {}
+        if same_model:
+            previous = source.get_collection().get(where={"document_uid": document.file_hash},
+                                                   include=["documents", "embeddings"])
+            if previous["ids"]:
+                reusable = dict(zip(map(chunk_hash, previous["documents"]), target.reduce(previous["embeddings"])))
+
+        vectors = [reusable.get(chunk_hash(content)) for _, content, _ in chunks]
+        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            encoded = target.encode_documents([chunks[idx][1] for idx in batch], batch_size=self.batch_size)
+            for idx, vector in zip(batch, encoded):
+                vectors[idx] = vector
+        target.store_chunks(chunks, vectors)
+        return len(missing), len(chunks) - len(missing)
+
+    def migrate_pending(self, version, source, target, same_model, only_missing=False, since=None):
+        documents = Document.objects.filter(status=Document.Status.READY).select_related("extraction")
+        if since is not None:
+            documents = documents.filter(updated_at__gte=since)
+        else:
+            version.documents_total = documents.count()
+            version.save(update_fields=["documents_total"])
+        for document in documents.iterator(chunk_size=100):
+            if only_missing and target.document_exists(document.file_hash):
+                continue
+            embedded, reused = self.migrate_document(source, target, document, same_model)
+            IndexVersion.objects.filter(pk=version.pk).update(
+                documents_done=F("documents_done") + 1,
+                chunks_embedded=F("chunks_embedded") + embedded,
+                chunks_reused=F("chunks_reused") + reused)
+            version.refresh_from_db()
+            self.log(f"[{version.documents_done}/{version.documents_total}] {document.file_hash}: "
+                     f"{embedded} embedded, {reused} reused")
+
+    def fit_reducer(self, version, source, same_model):
+        """
+        Fit the reducer of `version` on up to REDUCTION_FIT_SAMPLE stored chunks (their full
+        dimension vectors are reused when `same_model`, re-encoded otherwise) and record its
+        top-k overlap with full dimension search among those chunks.
+        """
+        sample = source.get_collection().get(limit=getattr(settings, "REDUCTION_FIT_SAMPLE", 20000),
+                                             include=["documents", "embeddings"] if same_model else ["documents"])
+        if not sample["ids"]:
+            raise ValueError(f"No stored chunks to fit the {version.reduction} reduction of {version.key} on")
+        if same_model:
+            vectors = np.asarray(sample["embeddings"], dtype=np.float32)
+        else:
+            vectors = VectorEmbeddings(index=IndexSpec(version.collection_name, version.embedding_model)).encode_documents(
+                sample["documents"], batch_size=self.batch_size, reduce=False)
+
+        reducer = EmbeddingReducer.fit(version.reduction, version.dimensions, vectors)
+        version.projection = reducer.to_bytes()
+        version.reduction_overlap = round(top_k_overlap(vectors, vectors, reducer, exclude_self=True), 4)
+        version.save(update_fields=["projection", "reduction_overlap"])
+        self.log(f"Fitted {reducer!r} on {len(vectors)} chunks, top-k overlap with full dimension search "
+                 f"{version.reduction_overlap}")
+
+    def catch_up(self, version, source, target, same_model, poll=1.0):
+        """
+        Migrate documents that became ready in the previous version after it was copied. Passes
+        repeat until no process can still be serving the previous version (ACTIVE_INDEX_TTL after
+        the switch) and no document became ready while the last pass ran. Ingests pinned to the
+        previous version that finish later copy themselves (see `follow_active_version`).
+        """
+        settled_at = time.monotonic() + ACTIVE_INDEX_TTL
+        since = None
+        while True:
+            pass_start = timezone.now()
+            self.migrate_pending(version, source, target, same_model, only_missing=True, since=since)
+            if time.monotonic() >= settled_at and not Document.objects.filter(
+                    status=Document.Status.READY, updated_at__gte=pass_start).exists():
+                return
+            since = pass_start
+            time.sleep(poll)
+
+    @transaction.atomic
+    def activate(self, version):
+        """Atomically retire the active version and serve `version` instead."""
+        IndexVersion.objects.select_for_update().filter(status=IndexVersion.Status.ACTIVE).update(
+            status=IndexVersion.Status.RETIRED)
+        version.status = IndexVersion.Status.ACTIVE
+        version.activated_at = timezone.now()
+        version.save(update_fields=["status", "activated_at"])
+        Document.objects.filter(status=Document.Status.READY).update(embedding_model=version.embedding_model)
+        transaction.on_commit(forget_active_index)
+
+    def run(self):
+        """
+        Build and activate the configured version. Returns the report, or None if the
+        configured version is already active.
+        """
+        current = active_version()
+        version = self.target()
+        if current is not None and current.pk == version.pk:
+            return None
+
+        current_spec = spec_of(current) if current is not None else default_index()
+        source = VectorEmbeddings(index=current_spec)
+        # Only full dimension vectors of the same model can be reused (and reduced)
+        same_model = current_spec.embedding_model == version.embedding_model and current_spec.reducer is None
+        if version.reduction and version.reduction_overlap is None:
+            self.fit_reducer(version, source, same_model)
+        target = VectorEmbeddings(index=spec_of(version))
+        target.store.get_collection(version.collection_name, metadata={
+            "embedding_model": version.embedding_model,
+            "preprocessing_version": version.preprocessing_version,
+            "chunking_version": version.chunking_version,
+            **({"reduction": version.reduction, "dimensions": version.dimensions} if version.reduction else {}),
+        })
+
+        start = time.monotonic()
+        version.documents_done = version.chunks_embedded = version.chunks_reused = 0
+        version.save(update_fields=["documents_done", "chunks_embedded", "chunks_reused"])
+        self.migrate_pending(version, source, target, same_model)
+        self.activate(version)
+        # Documents ingested into the previous version while the switch happened
+        self.catch_up(version, source, target, same_model)
+
+        version.refresh_from_db()
+        self.log(f"Activated index {version.key} ({version.collection_name})")
+        return {**version.as_dict(), "previous": current.key if current is not None else None,
+                "elapsed_s": round(time.monotonic() - start, 1)}
+
+
+def follow_active_version(embeddings, file_hash):
+    """
+    Copy a document just stored with `embeddings` into the active index version if another
+    version was activated while it was ingested: an ingest can outlast the catch-up of a
+    migration (up to INGEST_TIMEOUT, or a whole bulk run). Called before the document is
+    marked ready.
+
+    Returns:
+        IndexSpec: The version the document is served from.
+    """
+    try:
+        current = active_version()
+    except DatabaseError:
+        return embeddings.index
+    if current is None or current.collection_name == embeddings.index.collection_name:
+        return embeddings.index
+    spec = spec_of(current)
+    same_model = embeddings.index.embedding_model == spec.embedding_model and embeddings.index.reducer is None
+    embedded, reused = IndexMigrator().migrate_document(embeddings, VectorEmbeddings(index=spec),
+                                                        Document(file_hash=file_hash), same_model)
+    logger.info("Copied document %s into index %s after the switch: %d embedded, %d reused",
+                file_hash, current.key, embedded, reused)
+    return spec
+
+
+_migration = {"thread": None}
+_migration_lock = threading.Lock()
+
+
+def start_migration(batch_size=64):
+    """
+    Run `IndexMigrator.run` in a daemon thread of this process, so a serving process builds
+    the configured version batch by batch while it keeps answering from the active one.
+    Returns False if this process is already migrating.
+    """
+    with _migration_lock:
+        thread = _migration["thread"]
+        if thread is not None and thread.is_alive():
+            return False
+        _migration["thread"] = threading.Thread(target=run_migration, args=(batch_size,), name="index-migration",
+                                                daemon=True)
+        _migration["thread"].start()
+        return True
+
+
+def run_migration(batch_size=64):
+    try:
+        IndexMigrator(batch_size=batch_size).run()
+    except Exception:
+        logger.exception("Index migration failed")
+    finally:
+        close_old_connections()
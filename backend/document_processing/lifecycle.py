@@ -0,0 +1,289 @@
+import os
+import time
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .embeddings import MATRIX_CACHE, VectorEmbeddings
+from .models import ChunkSignature, Document, SummaryNode
+from . import registry
+from .index_versions import index_collections
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.path.join("output", "ExtractTextInfoFromPDF")
+DATABASE_DIR = "database"
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def iter_chunks(collection, include, batch_size=1000):
+    """Page through every chunk of a collection, yielding (id, metadata, document) tuples."""
+    offset = 0
+    while True:
+        results = collection.get(include=include, limit=batch_size, offset=offset)
+        if not results["ids"]:
+            return
+        metadatas = results.get("metadatas") or [None] * len(results["ids"])
+        documents = results.get("documents") or [None] * len(results["ids"])
+        yield from zip(results["ids"], metadatas, documents)
+        offset += len(results["ids"])
+
+
+def delete_document(file_hash, collection_name=None):
+    """
+    Remove every chunk, stored summary, chunk signature and the registry entry of a document. Chunks
+    are removed from every live index version unless `collection_name` is given.
+
+    Returns:
+        int: Number of chunks deleted (0 if the document was unknown; 1 if it only had a registry entry).
+    """
+    embeddings = VectorEmbeddings()
+    deleted = 0
+    for name in [collection_name] if collection_name else sorted(index_collections()):
+        collection = embeddings.get_collection(name)
+        found = collection.get(where={"document_uid": file_hash}, include=[])["ids"]
+        if found:
+            collection.delete(ids=found)
+        deleted = max(deleted, len(found))
+    MATRIX_CACHE.invalidate(file_hash)
+    SummaryNode.objects.filter(document_uid=file_hash).delete()
+    ChunkSignature.objects.filter(document_uid=file_hash).delete()
+    registered = Document.objects.filter(file_hash=file_hash).delete()[0]
+    logger.info("Deleted %d chunks of document %s", deleted, file_hash)
+    return deleted or registered
+
+
+def expire_document(file_hash, ttl):
+    """
+    Schedule a document for deletion by the compactor `ttl` seconds from now.
+
+    Returns:
+        datetime: The expiry time, or None if the document is unknown.
+    """
+    document = registry.lookup(file_hash)
+    if document is None:
+        return None
+    document.expires_at = timezone.now() + timedelta(seconds=ttl)
+    document.save(update_fields=["expires_at", "updated_at"])
+    return document.expires_at
+
+
+def backfill_registry(collection_name=None):
+    """
+    Register every document of the vector store (the active index version unless
+    `collection_name` is given) that is missing from the registry.
+
+    Returns:
+        tuple: (document uids in the store, number registered)
+    """
+    collection = VectorEmbeddings().get_collection(collection_name)
+    stored = {(metadata or {}).get("document_uid")
+              for _, metadata, _ in iter_chunks(collection, ["metadatas"])} - {None}
+    missing = stored - set(Document.objects.values_list("file_hash", flat=True))
+    for file_hash in sorted(missing):
+        registry.register_existing(file_hash, collection_name)
+    return stored, len(missing)
+
+
+class StorageCompactor:
+    """
+    Garbage collector for the vector store and extraction artifacts.
+
+    One pass deletes orphaned chunks (no `document_uid`, or an id that does not belong to
+    it), drops registry entries whose chunks are gone, deletes expired ready or failed
+    documents (explicit `expires_at`, or registered more than `retention_days` ago), summary tree nodes
+    and chunk signatures of documents that no longer exist and extraction zips older than
+    `artifact_retention_hours`, then vacuums the vector store to reclaim space.
+    """
+
+    def __init__(self, collection_name=None, retention_days=None, artifact_retention_hours=None):
+        self.collection_name = collection_name
+        self.retention_days = (settings.DOCUMENT_RETENTION_DAYS
+                               if retention_days is None else retention_days)
+        self.artifact_retention_hours = (settings.ARTIFACT_RETENTION_HOURS
+                                         if artifact_retention_hours is None else artifact_retention_hours)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def collection(self):
+        # The active index version unless a collection was named
+        return VectorEmbeddings().get_collection(self.collection_name)
+
+    def expired_documents(self, now):
+        """
+        Ready or failed documents past their `expires_at`, or older than the retention
+        period. Documents still being ingested are left alone.
+        """
+        expired = Q(expires_at__lte=now)
+        if self.retention_days:
+            expired |= Q(created_at__lt=now - timedelta(days=self.retention_days))
+        return set(Document.objects.filter(expired, status__in=[Document.Status.READY, Document.Status.FAILED])
+                   .values_list("file_hash", flat=True))
+
+    def scan_chunks(self):
+        """
+        One pass over the stored chunks.
+
+        Returns:
+            tuple: (ids of orphaned chunks, document uids with chunks in the store)
+        """
+        orphans, stored = [], set()
+        for content_uid, metadata, _ in iter_chunks(self.collection, ["metadatas"]):
+            document_uid = (metadata or {}).get("document_uid")
+            if not document_uid or not content_uid.startswith(f"{document_uid}_content"):
+                orphans.append(content_uid)
+            else:
+                stored.add(document_uid)
+        return orphans, stored
+
+    def drop_missing(self, stored, scan_start):
+        """
+        Drop ready registry entries whose vectors are gone. Only entries that were already
+        ready when the scan started, and that the store still does not know when rechecked,
+        are dropped: documents finishing ingest during the scan are not in its snapshot.
+        Documents missing from the registry are registered by `backfill_registry` at startup,
+        not here, so a pass never registers anything.
+
+        Returns:
+            int: Number of entries dropped.
+        """
+        missing = Document.objects.filter(status=Document.Status.READY, updated_at__lt=scan_start) \
+            .exclude(file_hash__in=stored).values_list("file_hash", flat=True)
+        gone = [file_hash for file_hash in missing
+                if not self.collection.get(where={"document_uid": file_hash}, limit=1, include=[])["ids"]]
+        return Document.objects.filter(file_hash__in=gone, status=Document.Status.READY,
+                                       updated_at__lt=scan_start).delete()[0]
+
+    def stale_artifacts(self, now):
+        if not os.path.isdir(ARTIFACT_DIR):
+            return []
+        cutoff = now - self.artifact_retention_hours * 3600
+        return [entry.path for entry in os.scandir(ARTIFACT_DIR)
+                if entry.is_file() and entry.stat().st_mtime < cutoff]
+
+    def vacuum(self):
+        try:
+            return VectorEmbeddings().store.vacuum()
+        except Exception:
+            logger.warning("Vacuuming the vector store failed", exc_info=True)
+            return False
+
+    def run_once(self, vacuum=True):
+        """Run one compaction pass and return what it removed."""
+        with self.lock:
+            now = timezone.now()
+            database_before = directory_size(DATABASE_DIR)
+            report = {"expired_documents": [], "deleted_chunks": 0, "orphan_chunks": 0,
+                      "orphan_summaries": 0, "orphan_signatures": 0, "artifacts_removed": 0, "artifact_bytes_removed": 0}
+
+            orphans, stored = self.scan_chunks()
+            if orphans:
+                self.collection.delete(ids=orphans)
+            report["orphan_chunks"] = len(orphans)
+            report["dropped_registry_entries"] = self.drop_missing(stored, now)
+
+            for file_hash in sorted(self.expired_documents(now)):
+                report["deleted_chunks"] += delete_document(file_hash, self.collection_name)
+                report["expired_documents"].append(file_hash)
+
+            known = Document.objects.values_list("file_hash", flat=True)
+            report["orphan_summaries"] = SummaryNode.objects.exclude(document_uid__in=known).delete()[0]
+            report["orphan_signatures"] = ChunkSignature.objects.exclude(document_uid__in=known).delete()[1].get(
+                "document_processing.ChunkSignature", 0)
+
+            for path in self.stale_artifacts(now.timestamp()):
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    continue
+                report["artifacts_removed"] += 1
+                report["artifact_bytes_removed"] += size
+
+            report["vacuumed"] = vacuum and self.vacuum()
+            report["database_bytes_reclaimed"] = database_before - directory_size(DATABASE_DIR)
+            logger.info("Compaction: %s", report)
+            return report
+
+    def start(self, interval):
+        """Run a compaction pass every `interval` seconds in a daemon thread (once per process)."""
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.loop, args=(interval,), name="storage-compactor",
+                                           daemon=True)
+            self.thread.start()
+
+    def loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Storage compaction failed")
+            finally:
+                close_old_connections()
+
+
+COMPACTOR = StorageCompactor()
+
+
+def start_compactor():
+    """Start the background compactor if COMPACTION_INTERVAL is set."""
+    if settings.COMPACTION_INTERVAL > 0:
+        COMPACTOR.start(settings.COMPACTION_INTERVAL)
+
+
+def storage_report(collection_name=None):
+    """
+    Storage used per document: chunk count, text and vector bytes and stored section
+    summaries, with the registry entry, plus totals for the database and artifacts.
+    """
+    collection = VectorEmbeddings().get_collection(collection_name)
+    probe = collection.get(limit=1, include=["embeddings"])
+    dimension = len(probe["embeddings"][0]) if probe["ids"] else 0
+
+    documents = {}
+    for _, metadata, document in iter_chunks(collection, ["metadatas", "documents"]):
+        metadata = metadata or {}
+        entry = documents.setdefault(metadata.get("document_uid", ""),
+                                     {"chunks": 0, "text_bytes": 0, "vector_bytes": 0})
+        entry["chunks"] += 1
+        entry["text_bytes"] += len((document or "").encode()) + len(str(metadata.get("value", "")).encode())
+        entry["vector_bytes"] += dimension * 4
+
+    summaries = dict(SummaryNode.objects.filter(level=SummaryNode.Level.SECTION).values_list("document_uid")
+                     .annotate(count=Count("id")).values_list("document_uid", "count"))
+    registered = {document.file_hash: document for document in Document.objects.filter(file_hash__in=documents)}
+    for document_uid, entry in documents.items():
+        entry["section_summaries"] = summaries.get(document_uid, 0)
+        document = registered.get(document_uid)
+        entry["registry"] = document.as_dict() if document is not None else None
+
+    artifacts = [entry for entry in os.scandir(ARTIFACT_DIR)] if os.path.isdir(ARTIFACT_DIR) else []
+    return {
+        "documents": [{"document_uid": document_uid, **entry}
+                      for document_uid, entry in sorted(documents.items(),
+                                                        key=lambda item: -(item[1]["text_bytes"] + item[1]["vector_bytes"]))],
+        "document_count": len(documents),
+        "chunk_count": sum(entry["chunks"] for entry in documents.values()),
+        "database_bytes": directory_size(DATABASE_DIR),
+        "artifact_count": len(artifacts),
+        "artifact_bytes": sum(entry.stat().st_size for entry in artifacts if entry.is_file()),
+    }
@@ -0,0 +1,218 @@
+import json
+import time
+import uuid
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..benchmarks.fixtures import generate_structured_data, random_sentence, structured_data_zip
+
+
+class FakeService:
+    """
+    A local HTTP server standing in for an external API, served from a daemon thread.
+    Subclasses implement `handle(handler)` and count requests per route in `self.requests`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                service.dispatch(self)
+
+            do_POST = do_PUT = do_DELETE = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+        self.lock = threading.Lock()
+        self.requests = {}
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, route):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def dispatch(self, handler):
+        try:
+            self.handle(handler)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    @staticmethod
+    def read_body(handler):
+        length = int(handler.headers.get("Content-Length") or 0)
+        return handler.rfile.read(length) if length else b""
+
+    @staticmethod
+    def send(handler, status, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("x-request-id", str(uuid.uuid4()))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class FakeAdobeServer(FakeService):
+    """
+    Stand-in for the Adobe PDF Services REST API as used by the Python SDK: token, asset
+    upload, extract job submission, status polling and download.
+
+    A job stays "in progress" for `latency` seconds and then returns a synthetic
+    `structuredData.json` of `num_elements` elements (a different one per job). A fraction
+    `error_rate` of submissions is rejected with 429 (service usage limit).
+    """
+
+    def __init__(self, latency=2.0, num_elements=300, error_rate=0.0, retry_after=1, seed=0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.num_elements = num_elements
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.jobs = {}
+
+    def client_config(self):
+        """Client config for the SDK (`ADOBE_CLIENT_CONFIG`) that points it at this server."""
+        return {"pdfServices": {"pdfServicesUri": self.url}}
+
+    def handle(self, handler):
+        parts = handler.path.strip("/").split("/")
+        route = f"{handler.command} /{parts[0]}"
+        self.count(route)
+        self.read_body(handler)
+
+        if route == "POST /token":
+            self.send(handler, 200, {"access_token": "fake-token", "token_type": "bearer", "expires_in": 86399})
+        elif route == "POST /assets":
+            asset_id = uuid.uuid4().hex
+            self.send(handler, 200, {"assetID": asset_id, "uploadUri": f"{self.url}/upload/{asset_id}"})
+        elif route == "PUT /upload":
+            self.send(handler, 200)
+        elif route == "POST /operation":
+            with self.lock:
+                rejected = self.random.random() < self.error_rate
+                seed = len(self.jobs)
+            if rejected:
+                self.send(handler, 429, {"error": {"code": "429001", "message": "Too many requests"}})
+                return
+            job_id = uuid.uuid4().hex
+            with self.lock:
+                self.jobs[job_id] = (time.monotonic(), seed)
+            self.send(handler, 201, headers={"location": f"{self.url}/status/{job_id}"})
+        elif route == "GET /status":
+            submitted, _ = self.jobs[parts[1]]
+            if time.monotonic() - submitted < self.latency:
+                self.send(handler, 200, {"status": "in progress"}, headers={"retry-after": str(self.retry_after)})
+                return
+            self.send(handler, 200, {
+                "status": "done",
+                "content": {"assetID": f"{parts[1]}-content", "downloadUri": f"{self.url}/download/{parts[1]}/content"},
+                "resource": {"assetID": f"{parts[1]}-resource", "downloadUri": f"{self.url}/download/{parts[1]}/resource"},
+            })
+        elif route == "GET /download":
+            _, seed = self.jobs[parts[1]]
+            json_data = generate_structured_data(self.num_elements, seed)
+            if parts[2] == "content":
+                self.send(handler, 200, json_data)
+            else:
+                self.send(handler, 200, structured_data_zip(json_data), content_type="application/zip")
+        else:
+            self.send(handler, 404, {"error": {"code": "NotFound", "message": handler.path}})
+
+
+class FakeGroqServer(FakeService):
+    """
+    Stand-in for the Groq chat completions API (`GROQ_BASE_URL`).
+
+    Every completion takes `latency` seconds and returns `reply_words` words, streamed as
+    server-sent events when the request asks for `stream`. A fraction `rate_limit_rate` of
+    requests is answered with 429 and a `retry-after` header, like Groq's rate limiter.
+    """
+
+    def __init__(self, latency=0.5, reply_words=120, rate_limit_rate=0.0, retry_after=1, seed=0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.reply_words = reply_words
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+    def handle(self, handler):
+        if handler.command != "POST" or not handler.path.endswith("/chat/completions"):
+            self.count("other")
+            self.read_body(handler)
+            self.send(handler, 404, {"error": {"message": f"Unknown route {handler.path}"}})
+            return
+
+        request = json.loads(self.read_body(handler) or b"{}")
+        with self.lock:
+            limited = self.random.random() < self.rate_limit_rate
+            reply = " ".join(random_sentence(self.random, 10, 20) for _ in range(self.reply_words // 15 + 1))
+        reply = " ".join(reply.split()[:self.reply_words])
+        if limited:
+            self.count("429")
+            self.send(handler, 429, {"error": {"message": "Rate limit reached", "type": "tokens",
+                                               "code": "rate_limit_exceeded"}},
+                      headers={"retry-after": str(self.retry_after)})
+            return
+
+        self.count("stream" if request.get("stream") else "completion")
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in request.get("messages", []))
+        completion = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "system_fingerprint": "fake",
+        }
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.reply_words,
+                 "total_tokens": prompt_tokens + self.reply_words}
+
+        if not request.get("stream"):
+            time.sleep(self.latency)
+            self.send(handler, 200, {**completion, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop",
+                 "logprobs": None}]})
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        words = reply.split()
+        delay = self.latency / max(1, len(words))
+        for idx, word in enumerate(words):
+            chunk = {**completion, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": word if idx == 0 else " " + word}, "finish_reason": None}]}
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+            time.sleep(delay)
+        final = {**completion, "object": "chat.completion.chunk", "x_groq": {"usage": usage},
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        handler.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        handler.wfile.flush()
+        handler.close_connection = True
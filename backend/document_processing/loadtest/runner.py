@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import uuid
+import random
+import tempfile
+import platform
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import fitz
+import numpy as np
+import requests
+
+from ..benchmarks.runner import QUESTIONS
+from .fakes import FakeAdobeServer, FakeGroqServer
+
+
+API_PREFIX = "/document_processing/"
+ENDPOINTS = {
+    "file": "file/",
+    "qna": "qna/",
+    "summary": "summary/",
+    "title": "summary/title/",
+}
+DEFAULT_MIX = {"file": 1, "qna": 6, "summary": 1, "title": 2}
+DEFAULT_CONCURRENCY = [1, 4, 16]
+
+
+def synthetic_pdf(nonce):
+    """A one page PDF; the fake Adobe server ignores its content, `nonce` makes its hash unique."""
+    with fitz.open() as document:
+        page = document.new_page()
+        page.insert_text((72, 72), f"Load test document {nonce}", fontsize=14)
+        return document.tobytes()
+
+
+def summarize_samples(samples, elapsed):
+    """
+    Reduce the `(latency seconds, status)` samples of one endpoint to the report entry.
+    Status 0 means the request did not complete (connection error or timeout).
+    """
+    latencies = np.asarray([latency for latency, _ in samples]) if samples else np.zeros(1)
+    errors = sum(1 for _, status in samples if status == 0 or status >= 400)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_per_s": round(len(samples) / elapsed, 3) if elapsed else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 1),
+        "mean_ms": round(float(latencies.mean()) * 1000, 1),
+        "statuses": statuses,
+    }
+
+
+class LoadTestRunner:
+    """
+    Drives mixed concurrent traffic against a running backend.
+
+    `documents` PDFs are ingested first so Q&A and summaries have something to work on.
+    Then, for every concurrency level, that many clients send requests back to back for
+    `duration` seconds, each picking the endpoint at random with the weights in `mix`
+    (`file` uploads a new PDF every time). Throughput, latency percentiles and error rates
+    are reported per endpoint and concurrency level.
+    """
+
+    def __init__(self, base_url, concurrency=None, duration=20.0, mix=None, documents=3, timeout=300.0,
+                 seed=0, log=print):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.documents = documents
+        self.timeout = timeout
+        self.seed = seed
+        self.log = log
+        self.corpus = []  # (document_uid, section keys)
+
+    def url(self, endpoint):
+        return f"{self.base_url}{API_PREFIX}{ENDPOINTS[endpoint]}"
+
+    def upload(self, session):
+        pdf = synthetic_pdf(uuid.uuid4().hex)
+        response = session.post(self.url("file"), files={"uploaded_file": ("loadtest.pdf", pdf, "application/pdf")},
+                                timeout=self.timeout)
+        return response
+
+    def setup(self):
+        with requests.Session() as session:
+            for _ in range(self.documents):
+                response = self.upload(session)
+                response.raise_for_status()
+                document_uid = response.json()["document_uid"]
+                headings = session.post(f"{self.base_url}{API_PREFIX}summary/heading/",
+                                        data={"document_uid": document_uid}, timeout=self.timeout)
+                headings.raise_for_status()
+                self.corpus.append((document_uid, [section["key"] for section in headings.json()["output"]]))
+        self.log(f"Ingested {len(self.corpus)} documents for the load test")
+
+    def request(self, session, endpoint, rng):
+        if endpoint == "file":
+            return self.upload(session)
+        document_uid, keys = rng.choice(self.corpus)
+        if endpoint == "qna":
+            data = {"document_uid": document_uid, "question": rng.choice(QUESTIONS)}
+        elif endpoint == "title":
+            data = {"document_uid": document_uid, "key": rng.choice(keys) if keys else ""}
+        else:
+            data = {"document_uid": document_uid}
+        return session.post(self.url(endpoint), data=data, timeout=self.timeout)
+
+    def client(self, worker, deadline, samples, lock):
+        rng = random.Random(self.seed * 1000 + worker)
+        endpoints, weights = zip(*self.mix.items())
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                endpoint = rng.choices(endpoints, weights)[0]
+                start = time.perf_counter()
+                try:
+                    status = self.request(session, endpoint, rng).status_code
+                except requests.RequestException:
+                    status = 0
+                with lock:
+                    samples.setdefault(endpoint, []).append((time.perf_counter() - start, status))
+
+    def run_level(self, concurrency):
+        samples, lock = {}, threading.Lock()
+        start = time.monotonic()
+        deadline = start + self.duration
+        clients = [threading.Thread(target=self.client, args=(worker, deadline, samples, lock), daemon=True)
+                   for worker in range(concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        # Requests in flight at the deadline still finish, so measure until the last one did
+        elapsed = time.monotonic() - start
+
+        results = []
+        for endpoint in self.mix:
+            entry = {"concurrency": concurrency, "endpoint": endpoint,
+                     **summarize_samples(samples.get(endpoint, []), elapsed)}
+            self.log(json.dumps(entry))
+            results.append(entry)
+        everything = [sample for endpoint_samples in samples.values() for sample in endpoint_samples]
+        total = {"concurrency": concurrency, "endpoint": "all", **summarize_samples(everything, elapsed)}
+        self.log(json.dumps(total))
+        return results + [total]
+
+    def run(self):
+        self.setup()
+        results = []
+        for concurrency in self.concurrency:
+            results.extend(self.run_level(concurrency))
+        return results
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def local_backend(adobe_latency=2.0, adobe_elements=300, adobe_error_rate=0.0, llm_latency=0.5,
+                  llm_rate_limit_rate=0.0, encoder="model"):
+    """
+    Serve the backend in process, inside a throwaway working directory and SQLite database,
+    with Adobe and Groq replaced by local fake servers. Yields the base URL.
+    """
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.management import call_command
+    from django.db import connections
+
+    from .. import embeddings, utils
+    from ..benchmarks.stubs import OfflineEncoder
+    from adobe.pdfservices.operation.auth.service_principal_credentials import ServicePrincipalCredentials
+
+    cwd = os.getcwd()
+    original = (utils.ADOBE_SESSION, embeddings.SentenceTransformer, os.environ.get("GROQ_BASE_URL"),
+                connections["default"].settings_dict["NAME"])
+    adobe = FakeAdobeServer(latency=adobe_latency, num_elements=adobe_elements, error_rate=adobe_error_rate).start()
+    groq = FakeGroqServer(latency=llm_latency, rate_limit_rate=llm_rate_limit_rate).start()
+    with tempfile.TemporaryDirectory(prefix="researchiq-load-") as workspace:
+        os.chdir(workspace)
+        config_path = os.path.join(workspace, "adobe_client_config.json")
+        with open(config_path, "w") as f:
+            json.dump(adobe.client_config(), f)
+
+        connections.close_all()
+        connections["default"].settings_dict["NAME"] = os.path.join(workspace, "db.sqlite3")
+        call_command("migrate", verbosity=0)
+        os.environ["GROQ_BASE_URL"] = groq.url
+        os.environ.setdefault("GROQ_API_KEY", "loadtest")
+        utils.ADOBE_SESSION = utils.AdobeSession(
+            client_config=config_path, credentials=ServicePrincipalCredentials("loadtest", "loadtest"))
+        if encoder == "offline":
+            embeddings.SentenceTransformer = lambda *args, **kwargs: OfflineEncoder()
+            embeddings.load_embedding_model.cache_clear()
+
+        server = make_server("127.0.0.1", 0, WSGIHandler(), server_class=ThreadingWSGIServer,
+                             handler_class=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, name="loadtest-backend", daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_port}", adobe, groq
+        finally:
+            server.shutdown()
+            server.server_close()
+            adobe.stop()
+            groq.stop()
+            os.chdir(cwd)
+            connections.close_all()
+            utils.ADOBE_SESSION, embeddings.SentenceTransformer = original[:2]
+            embeddings.load_embedding_model.cache_clear()
+            if original[2] is None:
+                os.environ.pop("GROQ_BASE_URL", None)
+            else:
+                os.environ["GROQ_BASE_URL"] = original[2]
+            connections["default"].settings_dict["NAME"] = original[3]
+
+
+def run_load_test(url=None, concurrency=None, duration=20.0, mix=None, documents=3, timeout=300.0,
+                  adobe_latency=2.0, adobe_elements=300, adobe_error_rate=0.0, llm_latency=0.5,
+                  llm_rate_limit_rate=0.0, encoder="model", log=print):
+    """
+    Run the load test against `url`, or against an in process backend wired to fake Adobe
+    and Groq servers when no URL is given, and build the report.
+    """
+    fakes = {}
+    if url:
+        runner = LoadTestRunner(url, concurrency, duration, mix, documents, timeout, log=log)
+        results = runner.run()
+    else:
+        with local_backend(adobe_latency, adobe_elements, adobe_error_rate, llm_latency,
+                           llm_rate_limit_rate, encoder) as (base_url, adobe, groq):
+            runner = LoadTestRunner(base_url, concurrency, duration, mix, documents, timeout, log=log)
+            results = runner.run()
+            fakes = {"adobe": dict(adobe.requests), "groq": dict(groq.requests)}
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "target": url or "in-process",
+            "duration_s": duration,
+            "mix": runner.mix,
+            "encoder": None if url else encoder,
+            "adobe_latency_s": None if url else adobe_latency,
+            "llm_latency_s": None if url else llm_latency,
+            "llm_rate_limit_rate": None if url else llm_rate_limit_rate,
+        },
+        "fake_requests": fakes,
+        "results": results,
+    }
@@ -0,0 +1,477 @@
+import os
+import json
+import glob
+import math
+import shutil
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings as django_settings
+
+from .vector_store import VectorCollection, VectorStore, ann_params
+
+logger = logging.getLogger(__name__)
+
+# SQLite maps this much of the metadata file instead of reading it through its own cache
+SQLITE_MMAP_BYTES = 256 * 1024 * 1024
+# Rows scored per block when scanning a whole collection
+SCAN_BLOCK_ROWS = 65536
+
+COLUMNS = {"document_uid", "key"}
+COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_clause(where):
+    """
+    Translate a Chroma `where` filter into an SQL condition and its parameters. Supports
+    equality, `$eq`, `$ne`, `$gt`, `$gte`, `$lt`, `$lte`, `$in`, `$nin`, `$and` and `$or`.
+    """
+    if not where:
+        return "1", []
+    clauses, params = [], []
+    for field, condition in where.items():
+        if field in ("$and", "$or"):
+            parts = [where_clause(item) for item in condition]
+            clauses.append("(" + (" AND " if field == "$and" else " OR ").join(sql for sql, _ in parts) + ")")
+            for _, part_params in parts:
+                params.extend(part_params)
+            continue
+        if field in COLUMNS:
+            column, column_params = field, []
+        else:
+            column, column_params = "json_extract(metadata, ?)", ['$."' + field.replace('"', '') + '"']
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in COMPARISONS:
+                clauses.append(f"{column} {COMPARISONS[operator]} ?")
+                params.extend(column_params + [value])
+            elif operator in ("$in", "$nin"):
+                marks = ",".join("?" * len(value))
+                clauses.append(f"{column} {'IN' if operator == '$in' else 'NOT IN'} ({marks})")
+                params.extend(column_params + list(value))
+            else:
+                raise ValueError(f"Unsupported where operator {operator!r}")
+    return " AND ".join(clauses), params
+
+
+def normalize(matrix):
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+
+
+class LocalCollection(VectorCollection):
+    """
+    A collection stored as plain files in its own directory:
+
+    - `vectors-<generation>.f32`: the raw float32 embedding matrix, one row per chunk
+      version, append-only and memory-mapped read-only by every process;
+    - `centroids-<version>.npy`: IVF centroids once the collection is trained;
+    - `index.sqlite3`: ids, texts, metadata, the row and inverted list of every chunk.
+
+    Readers take an SQLite snapshot (WAL mode, so they never wait for a writer), look up
+    rows and read the vectors from the shared page cache. Writers serialize on SQLite's
+    write lock (`BEGIN IMMEDIATE`), which also holds across processes; an upsert appends
+    new rows before committing, so a snapshot never sees a row whose vector is not written.
+    Replaced and deleted rows are reclaimed by `compact`, which writes the next generation
+    file and keeps the previous one for readers still using it.
+
+    Distances are cosine distances (1 - cosine similarity).
+    """
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.db_path = os.path.join(directory, "index.sqlite3")
+        self.local = threading.local()
+        self.map_lock = threading.Lock()
+        self._vectors = None
+        self._centroids = None
+        with self.write() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, row INTEGER NOT NULL, norm REAL NOT NULL,"
+                " list_id INTEGER, document_uid TEXT, key TEXT, document TEXT, metadata TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_uid, key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_row ON chunks (row)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_list ON chunks (list_id)")
+
+    @property
+    def connection(self):
+        # One connection per thread; sqlite3 connections must not be shared between threads
+        conn = getattr(self.local, "connection", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+            self.local.connection = conn
+        return conn
+
+    @contextmanager
+    def read(self):
+        """A consistent snapshot of the collection."""
+        conn = self.connection
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def write(self):
+        """The collection's write lock, shared with every other process."""
+        conn = self.connection
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def get_meta(conn, key, default=None):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    @staticmethod
+    def set_meta(conn, key, value):
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                     (key, json.dumps(value)))
+
+    @property
+    def metadata(self):
+        with self.read() as conn:
+            return self.get_meta(conn, "metadata")
+
+    def settings(self, conn):
+        """Index parameters: dimension, vector file generation and IVF version."""
+        return {
+            "dimension": self.get_meta(conn, "dimension"),
+            "generation": self.get_meta(conn, "generation", 0),
+            "next_row": self.get_meta(conn, "next_row", 0),
+            "ivf_version": self.get_meta(conn, "ivf_version", 0),
+            "nlist": self.get_meta(conn, "nlist", 0),
+        }
+
+    def vector_path(self, generation):
+        return os.path.join(self.directory, f"vectors-{generation}.f32")
+
+    def centroid_path(self, version):
+        return os.path.join(self.directory, f"centroids-{version}.npy")
+
+    def vectors(self, generation, dimension, min_rows=0):
+        """Read-only memory map of the vector file, remapped when it was replaced or has grown."""
+        with self.map_lock:
+            current = self._vectors
+            if current is None or current[0] != generation or current[1].shape[0] < min_rows:
+                path = self.vector_path(generation)
+                rows = os.path.getsize(path) // (dimension * 4) if os.path.exists(path) else 0
+                matrix = (np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dimension)) if rows
+                          else np.zeros((0, dimension), dtype=np.float32))
+                self._vectors = current = (generation, matrix)
+            return current[1]
+
+    def centroids(self, version):
+        if not version:
+            return None
+        with self.map_lock:
+            if self._centroids is None or self._centroids[0] != version:
+                self._centroids = (version, np.load(self.centroid_path(version), mmap_mode="r"))
+            return self._centroids[1]
+
+    def gather(self, settings, rows):
+        """The vectors of `rows` as a float32 array."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return np.zeros((0, settings["dimension"] or 0), dtype=np.float32)
+        matrix = self.vectors(settings["generation"], settings["dimension"], int(rows.max()) + 1)
+        return np.asarray(matrix[rows])
+
+    def count(self):
+        with self.read() as conn:
+            return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        include = [str(getattr(item, "value", item)) for item in include]
+        condition, params = where_clause(where)
+        if ids is not None:
+            condition += f" AND id IN ({','.join('?' * len(ids))})"
+            params = params + list(ids)
+        query = f"SELECT id, row, document, metadata FROM chunks WHERE {condition} ORDER BY row"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params = params + [limit if limit is not None else -1, offset or 0]
+
+        with self.read() as conn:
+            records = conn.execute(query, params).fetchall()
+            settings = self.settings(conn)
+        return {
+            "ids": [record[0] for record in records],
+            "embeddings": self.gather(settings, [record[1] for record in records]) if "embeddings" in include else None,
+            "documents": [record[2] for record in records] if "documents" in include else None,
+            "metadatas": [json.loads(record[3]) if record[3] else None for record in records]
+            if "metadatas" in include else None,
+            "included": include,
+        }
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids but {len(vectors)} embeddings")
+        if not len(ids):
+            return
+        metadatas = metadatas or [None] * len(ids)
+        documents = documents or [None] * len(ids)
+        norms = np.linalg.norm(vectors, axis=1)
+
+        with self.write() as conn:
+            settings = self.settings(conn)
+            if settings["dimension"] is None:
+                settings["dimension"] = vectors.shape[1]
+                self.set_meta(conn, "dimension", settings["dimension"])
+            elif vectors.shape[1] != settings["dimension"]:
+                raise ValueError(f"Collection {self.name} holds {settings['dimension']} dimensional embeddings, "
+                                 f"got {vectors.shape[1]}")
+
+            # Append, never overwrite: snapshots taken before this commit still see their rows
+            start = settings["next_row"]
+            fd = os.open(self.vector_path(settings["generation"]), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                os.pwrite(fd, vectors.tobytes(), start * settings["dimension"] * 4)
+            finally:
+                os.close(fd)
+
+            centroids = self.centroids(settings["ivf_version"])
+            list_ids = (np.argmax(normalize(vectors) @ centroids.T, axis=1).tolist() if centroids is not None
+                        else [None] * len(ids))
+            conn.executemany(
+                "INSERT INTO chunks (id, row, norm, list_id, document_uid, key, document, metadata)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET row = excluded.row,"
+                " norm = excluded.norm, list_id = excluded.list_id, document_uid = excluded.document_uid,"
+                " key = excluded.key, document = excluded.document, metadata = excluded.metadata",
+                [(content_uid, start + idx, float(norms[idx]), list_ids[idx],
+                  (metadata or {}).get("document_uid"), (metadata or {}).get("key"), document,
+                  json.dumps(metadata) if metadata is not None else None)
+                 for idx, (content_uid, metadata, document) in enumerate(zip(ids, metadatas, documents))])
+            self.set_meta(conn, "next_row", start + len(ids))
+
+    def delete(self, ids=None, where=None):
+        if ids is None and where is None:
+            raise ValueError("delete needs ids or a where filter")
+        condition, params = where_clause(where)
+        if ids is not None:
+            condition += f" AND id IN ({','.join('?' * len(ids))})"
+            params = params + list(ids)
+        with self.write() as conn:
+            conn.execute(f"DELETE FROM chunks WHERE {condition}", params)
+
+    def candidates(self, conn, settings, query, where, nprobe):
+        """(rows, norms) of the chunks to score for one normalized query vector."""
+        condition, params = where_clause(where)
+        centroids = self.centroids(settings["ivf_version"]) if where is None else None
+        if centroids is not None:
+            lists = np.argsort(-(centroids @ query))[:nprobe].tolist()
+            condition = f"list_id IN ({','.join('?' * len(lists))})"
+            params = lists
+        records = conn.execute(f"SELECT row, norm FROM chunks WHERE {condition}", params).fetchall()
+        return (np.fromiter((record[0] for record in records), dtype=np.int64, count=len(records)),
+                np.fromiter((record[1] for record in records), dtype=np.float32, count=len(records)))
+
+    def score(self, settings, rows, norms, query):
+        """Cosine similarity of `query` to the vectors at `rows`."""
+        if not len(rows):
+            return np.zeros(0, dtype=np.float32)
+        matrix = self.vectors(settings["generation"], settings["dimension"], int(rows.max()) + 1)
+        if len(rows) * 2 < matrix.shape[0]:
+            dots = np.asarray(matrix[rows]) @ query
+        else:
+            # Most of the file is wanted: stream it block by block instead of gathering rows
+            dots = np.empty(matrix.shape[0], dtype=np.float32)
+            for start in range(0, matrix.shape[0], SCAN_BLOCK_ROWS):
+                dots[start:start + SCAN_BLOCK_ROWS] = matrix[start:start + SCAN_BLOCK_ROWS] @ query
+            dots = dots[rows]
+        return dots / (norms + 1e-12)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances"),
+              nprobe=None):
+        include = [str(getattr(item, "value", item)) for item in include]
+        queries = normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        results = {"ids": [], "distances": [], "documents": [], "metadatas": [], "embeddings": []}
+        nprobe = nprobe or ann_params(self.name).get("nprobe") or getattr(django_settings, "IVF_NPROBE", 8)
+        with self.read() as conn:
+            settings = self.settings(conn)
+            for query in queries:
+                if settings["dimension"] is None:
+                    rows, norms = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+                else:
+                    rows, norms = self.candidates(conn, settings, query, where, nprobe)
+                similarities = self.score(settings, rows, norms, query)
+                k = min(n_results, len(rows))
+                top = np.argpartition(-similarities, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+                top = top[np.argsort(-similarities[top])]
+                top_rows = rows[top].tolist()
+
+                records = {}
+                if top_rows:
+                    for record in conn.execute(
+                            f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(top_rows))})",
+                            top_rows):
+                        records[record[0]] = record[1:]
+                results["ids"].append([records[row][0] for row in top_rows])
+                results["distances"].append((1.0 - similarities[top]).tolist())
+                results["documents"].append([records[row][1] for row in top_rows])
+                results["metadatas"].append([json.loads(records[row][2]) if records[row][2] else None
+                                             for row in top_rows])
+                results["embeddings"].append(self.gather(settings, top_rows) if "embeddings" in include else None)
+        for field in ("distances", "documents", "metadatas", "embeddings"):
+            if field not in include:
+                results[field] = None
+        results["included"] = include
+        return results
+
+    def train(self, nlist=None, iterations=10, sample_size=100000, seed=0):
+        """
+        Build the IVF lists: cluster the vectors with spherical k-means into `nlist` lists
+        (default: the collection's ANN parameters, else 4 * sqrt(n)) and file every chunk under
+        its nearest centroid. Queries without a `where` filter then only score the chunks of
+        the `nprobe` nearest lists. `nlist=0` drops the lists so queries scan everything again.
+
+        Returns:
+            int: The number of lists.
+        """
+        with self.write() as conn:
+            settings = self.settings(conn)
+            if nlist is None:
+                nlist = ann_params(self.name).get("nlist")
+            records = conn.execute("SELECT row FROM chunks ORDER BY row").fetchall()
+            rows = np.fromiter((record[0] for record in records), dtype=np.int64, count=len(records))
+            if nlist == 0 or not len(rows):
+                conn.execute("UPDATE chunks SET list_id = NULL")
+                self.set_meta(conn, "ivf_version", 0)
+                self.set_meta(conn, "nlist", 0)
+                return 0
+
+            nlist = min(nlist or max(1, int(4 * math.sqrt(len(rows)))), len(rows))
+            rng = np.random.default_rng(seed)
+            sample = normalize(self.gather(settings, np.sort(rng.choice(rows, min(sample_size, len(rows)),
+                                                                         replace=False))))
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, sample)
+                empty = np.bincount(assignment, minlength=nlist) == 0
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]  # Reseed empty lists
+                centroids = normalize(sums)
+
+            version = settings["ivf_version"] + 1
+            np.save(self.centroid_path(version), centroids.astype(np.float32))
+            for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+                block = rows[start:start + SCAN_BLOCK_ROWS]
+                lists = np.argmax(normalize(self.gather(settings, block)) @ centroids.T, axis=1)
+                conn.executemany("UPDATE chunks SET list_id = ? WHERE row = ?", zip(lists.tolist(), block.tolist()))
+            self.set_meta(conn, "ivf_version", version)
+            self.set_meta(conn, "nlist", nlist)
+            self.set_meta(conn, "trained_rows", len(rows))
+
+        for path in glob.glob(os.path.join(self.directory, "centroids-*.npy")):
+            if path != self.centroid_path(version) and path != self.centroid_path(version - 1):
+                os.remove(path)
+        return nlist
+
+    def compact(self):
+        """
+        Rewrite the vector file without replaced or deleted rows. Returns True if anything
+        was reclaimed.
+        """
+        with self.write() as conn:
+            settings = self.settings(conn)
+            records = conn.execute("SELECT row FROM chunks ORDER BY row").fetchall()
+            if len(records) == settings["next_row"]:
+                return False
+            generation = settings["generation"] + 1
+            rows = np.fromiter((record[0] for record in records), dtype=np.int64, count=len(records))
+            with open(self.vector_path(generation), "wb") as f:
+                for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+                    f.write(self.gather(settings, rows[start:start + SCAN_BLOCK_ROWS]).tobytes())
+            # New rows are never above old ones, so updating in ascending order cannot collide
+            conn.executemany("UPDATE chunks SET row = ? WHERE row = ?", enumerate(rows.tolist()))
+            self.set_meta(conn, "generation", generation)
+            self.set_meta(conn, "next_row", len(rows))
+
+        # Keep the previous generation for readers that mapped it before the switch
+        for path in glob.glob(os.path.join(self.directory, "vectors-*.f32")):
+            if path not in (self.vector_path(generation), self.vector_path(generation - 1)):
+                os.remove(path)
+        logger.info("Compacted %s: %d of %d rows kept", self.name, len(rows), settings["next_row"])
+        return True
+
+    def stats(self):
+        with self.read() as conn:
+            settings = self.settings(conn)
+            settings["count"] = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        settings["vector_bytes"] = sum(os.path.getsize(path)
+                                       for path in glob.glob(os.path.join(self.directory, "vectors-*.f32")))
+        return settings
+
+
+class LocalStore(VectorStore):
+    """Collections of `LocalCollection`s, one directory each under `path`."""
+
+    backend = "local"
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.collections = {}
+
+    def collection_dir(self, name):
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"Invalid collection name {name!r}")
+        return os.path.join(self.path, name)
+
+    def get_collection(self, name, metadata=None):
+        with self.lock:
+            collection = self.collections.get(name)
+            if collection is None:
+                collection = LocalCollection(self.collection_dir(name), name)
+                self.collections[name] = collection
+        if metadata is not None and collection.metadata is None:
+            with collection.write() as conn:
+                collection.set_meta(conn, "metadata", metadata)
+        return collection
+
+    def delete_collection(self, name):
+        with self.lock:
+            self.collections.pop(name, None)
+        shutil.rmtree(self.collection_dir(name), ignore_errors=True)
+
+    def list_collections(self):
+        return sorted(entry.name for entry in os.scandir(self.path)
+                      if os.path.exists(os.path.join(entry.path, "index.sqlite3")))
+
+    def vacuum(self):
+        """Compact every collection and (re)train the IVF lists of those that outgrew them."""
+        done = False
+        for name in self.list_collections():
+            collection = self.get_collection(name)
+            done = collection.compact() or done
+            with collection.read() as conn:
+                count = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+                trained_rows = collection.get_meta(conn, "trained_rows", 0)
+            # Collections of at least IVF_MIN_ROWS chunks get IVF lists, and are retrained once they
+            # doubled in size since; smaller ones are scanned exhaustively (0 never trains)
+            min_rows = getattr(django_settings, "IVF_MIN_ROWS", 20000)
+            if min_rows and count >= min_rows and count >= 2 * trained_rows:
+                logger.info("Training IVF lists of %s (%d chunks)", name, count)
+                collection.train()
+                done = True
+        return done
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from document_processing.lifecycle import backfill_registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Register documents of the vector store that are missing from the document registry "
+        "(ingested before it existed). Existence checks only query the registry, so run this "
+        "once after upgrading. Safe to rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collection", default=None,
+                            help="Scan this collection instead of the active index version.")
+
+    def handle(self, *args, **options):
+        stored, registered = backfill_registry(options["collection"])
+        self.stdout.write(f"Registered {registered} of {len(stored)} stored documents.")
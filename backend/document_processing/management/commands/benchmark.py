@@ -0,0 +1,90 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_processing.benchmarks.runner import (
+    DEFAULT_COLLECTION_SIZES, DEFAULT_SIZES, run_benchmarks)
+
+
+CASES = ["preprocessing", "extraction", "embedding", "ingestion", "retrieval", "summary"]
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark preprocessing, extraction, embedding, retrieval and summarization on "
+        "synthetic structuredData.json fixtures with offline Adobe and Groq stand-ins."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cases", default=",".join(CASES),
+                            help=f"Comma separated cases to run ({', '.join(CASES)}).")
+        parser.add_argument("--sizes", type=int_list, default=DEFAULT_SIZES,
+                            help="Comma separated fixture sizes (number of elements).")
+        parser.add_argument("--collection-sizes", type=int_list, default=DEFAULT_COLLECTION_SIZES,
+                            help="Comma separated collection sizes for the retrieval case.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--warmup", type=int, default=1)
+        parser.add_argument("--encoder", choices=["offline", "model"], default="offline",
+                            help="Use the offline hashing encoder or load the real SentenceTransformer.")
+        parser.add_argument("--llm-latency", type=float, default=0.0,
+                            help="Artificial latency in seconds for every offline Groq call.")
+        parser.add_argument("--output", default="benchmarks/latest.json",
+                            help="Where to write the JSON report.")
+        parser.add_argument("--baseline", default="benchmarks/baseline.json",
+                            help="Baseline report to compare against (skipped if missing).")
+        parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Allowed relative p50 slowdown or throughput drop before a case counts as a regression.")
+        parser.add_argument("--update-baseline", action="store_true",
+                            help="Store this run as the new baseline.")
+        parser.add_argument("--fail-on-regression", action="store_true",
+                            help="Exit with an error if any case regressed against the baseline.")
+
+    def handle(self, *args, **options):
+        cases = [c.strip() for c in options["cases"].split(",") if c.strip()]
+        unknown = set(cases) - set(CASES)
+        if unknown:
+            raise CommandError(f"Unknown cases: {', '.join(sorted(unknown))}")
+
+        baseline = None
+        if os.path.exists(options["baseline"]):
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+
+        report = run_benchmarks(
+            cases,
+            sizes=options["sizes"],
+            collection_sizes=options["collection_sizes"],
+            repeat=options["repeat"],
+            warmup=options["warmup"],
+            encoder=options["encoder"],
+            llm_latency=options["llm_latency"],
+            baseline=baseline,
+            tolerance=options["tolerance"],
+            log=self.stdout.write,
+        )
+
+        self.write_report(options["output"], report)
+        self.stdout.write(f"Report written to {options['output']}")
+        if options["update_baseline"]:
+            self.write_report(options["baseline"], report)
+            self.stdout.write(f"Baseline updated at {options['baseline']}")
+
+        regressions = [c for c in report.get("comparison", []) if c["regression"]]
+        for c in regressions:
+            self.stdout.write(self.style.WARNING(
+                f"Regression: {c['case']}[{c['size']}] p50 {c['baseline_p50_ms']}ms -> {c['p50_ms']}ms, "
+                f"throughput {c['baseline_throughput_per_s']}/s -> {c['throughput_per_s']}/s"))
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"{len(regressions)} benchmark case(s) regressed.")
+
+    def write_report(self, path, report):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,56 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_processing.benchmarks.reduction import run_reduction_check
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the top-k overlap of reduced dimension search with full dimension search on the "
+        "chunks of the active index, for the active index's reduction or for candidate "
+        "reductions (--method, --dimensions), with search latency and bytes per vector."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--method", choices=["pca", "truncate"], default=None,
+                            help="Candidate reduction to try (default: check the active index's).")
+        parser.add_argument("--dimensions", type=int_list, default=None,
+                            help="Candidate dimensions, comma separated (default: EMBEDDING_DIMENSIONS).")
+        parser.add_argument("--k", type=int, default=10, help="Neighbours compared per query.")
+        parser.add_argument("--questions", default=None,
+                            help="File with one real question per line (default: the benchmark questions).")
+        parser.add_argument("--sample", type=int, default=200,
+                            help="Number of queries; questions are topped up with synthetic queries.")
+        parser.add_argument("--max-vectors", type=int, default=None, help="Only use the first N stored chunks.")
+        parser.add_argument("--output", default="benchmarks/reduction.json", help="Where to write the JSON report.")
+
+    def handle(self, *args, **options):
+        questions = None
+        if options["questions"]:
+            with open(options["questions"]) as f:
+                questions = [line.strip() for line in f if line.strip()]
+
+        try:
+            report = run_reduction_check(
+                method=options["method"],
+                dimensions=options["dimensions"],
+                k=options["k"],
+                questions=questions,
+                sample=options["sample"],
+                max_vectors=options["max_vectors"],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if os.path.dirname(options["output"]):
+            os.makedirs(os.path.dirname(options["output"]), exist_ok=True)
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Report written to {options['output']}")
@@ -0,0 +1,37 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from document_processing.lifecycle import StorageCompactor, storage_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired documents, orphaned chunks and old extraction artifacts, then vacuum "
+        "the vector store. Use --interval to keep running as a background compactor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", type=float, default=None,
+                            help="Override DOCUMENT_RETENTION_DAYS (0 keeps documents forever).")
+        parser.add_argument("--artifact-retention-hours", type=float, default=None,
+                            help="Override ARTIFACT_RETENTION_HOURS.")
+        parser.add_argument("--no-vacuum", action="store_true", help="Skip vacuuming the vector store.")
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Repeat every N seconds instead of running once.")
+        parser.add_argument("--report", action="store_true", help="Print the per-document storage report and exit.")
+
+    def handle(self, *args, **options):
+        if options["report"]:
+            self.stdout.write(json.dumps(storage_report(), indent=2))
+            return
+
+        compactor = StorageCompactor(retention_days=options["retention_days"],
+                                     artifact_retention_hours=options["artifact_retention_hours"])
+        while True:
+            report = compactor.run_once(vacuum=not options["no_vacuum"])
+            self.stdout.write(json.dumps(report, indent=2))
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,116 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_processing.loadtest.fakes import FakeAdobeServer, FakeGroqServer
+from document_processing.loadtest.runner import DEFAULT_CONCURRENCY, DEFAULT_MIX, ENDPOINTS, run_load_test
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def endpoint_mix(value):
+    mix = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test file/, qna/, summary/ and summary/title/ with mixed concurrent traffic and report "
+        "throughput, latency percentiles and error rates per endpoint and concurrency level. Without "
+        "--url the backend is served in process with local fake Adobe and Groq servers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=None,
+                            help="Base URL of a running backend (e.g. http://localhost:8000).")
+        parser.add_argument("--concurrency", type=int_list, default=DEFAULT_CONCURRENCY,
+                            help="Comma separated numbers of concurrent clients, one run each.")
+        parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level.")
+        parser.add_argument("--mix", type=endpoint_mix, default=DEFAULT_MIX,
+                            help="Endpoint weights, e.g. file=1,qna=6,summary=1,title=2.")
+        parser.add_argument("--documents", type=int, default=3, help="Documents ingested before the run.")
+        parser.add_argument("--timeout", type=float, default=300.0, help="Per request timeout in seconds.")
+        parser.add_argument("--adobe-latency", type=float, default=2.0,
+                            help="Seconds a fake Adobe extraction job stays in progress.")
+        parser.add_argument("--adobe-elements", type=int, default=300,
+                            help="Elements in the fake structuredData.json of every job.")
+        parser.add_argument("--adobe-error-rate", type=float, default=0.0,
+                            help="Fraction of fake Adobe job submissions rejected with 429.")
+        parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per fake Groq completion.")
+        parser.add_argument("--llm-429-rate", type=float, default=0.0,
+                            help="Fraction of fake Groq requests answered with 429.")
+        parser.add_argument("--encoder", choices=["offline", "model"], default="model",
+                            help="Use the offline hashing encoder or the real SentenceTransformer (in process only).")
+        parser.add_argument("--fakes-only", action="store_true",
+                            help="Only serve the fake Adobe and Groq servers, for a backend started separately.")
+        parser.add_argument("--adobe-port", type=int, default=0, help="Port of the fake Adobe server (--fakes-only).")
+        parser.add_argument("--groq-port", type=int, default=0, help="Port of the fake Groq server (--fakes-only).")
+        parser.add_argument("--output", default="loadtest/latest.json", help="Where to write the JSON report.")
+
+    def handle(self, *args, **options):
+        if options["fakes_only"]:
+            self.serve_fakes(options)
+            return
+
+        unknown = set(options["mix"]) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        report = run_load_test(
+            url=options["url"],
+            concurrency=options["concurrency"],
+            duration=options["duration"],
+            mix=options["mix"],
+            documents=options["documents"],
+            timeout=options["timeout"],
+            adobe_latency=options["adobe_latency"],
+            adobe_elements=options["adobe_elements"],
+            adobe_error_rate=options["adobe_error_rate"],
+            llm_latency=options["llm_latency"],
+            llm_rate_limit_rate=options["llm_429_rate"],
+            encoder=options["encoder"],
+            log=self.stdout.write,
+        )
+
+        directory = os.path.dirname(options["output"])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+
+        self.stdout.write(f"{'conc':>5} {'endpoint':<8} {'req':>6} {'req/s':>8} {'p50 ms':>9} "
+                          f"{'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for r in report["results"]:
+            self.stdout.write(f"{r['concurrency']:>5} {r['endpoint']:<8} {r['requests']:>6} "
+                              f"{r['throughput_per_s'] or 0:>8.2f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+                              f"{r['p99_ms']:>9.1f} {r['error_rate']:>7.1%}")
+        self.stdout.write(f"Report written to {options['output']}")
+
+    def serve_fakes(self, options):
+        adobe = FakeAdobeServer(latency=options["adobe_latency"], num_elements=options["adobe_elements"],
+                                error_rate=options["adobe_error_rate"], port=options["adobe_port"]).start()
+        groq = FakeGroqServer(latency=options["llm_latency"], rate_limit_rate=options["llm_429_rate"],
+                              port=options["groq_port"]).start()
+        config_path = os.path.abspath("adobe_client_config.json")
+        with open(config_path, "w") as f:
+            json.dump(adobe.client_config(), f)
+
+        self.stdout.write("Start the backend with:")
+        self.stdout.write(f"  GROQ_BASE_URL={groq.url}")
+        self.stdout.write(f"  ADOBE_CLIENT_CONFIG={config_path}")
+        self.stdout.write("  (any non-empty PDF_SERVICE_CLIENT_ID, PDF_SERVICES_CLIENT_SECRET and GROQ_API_KEY)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            adobe.stop()
+            groq.stop()
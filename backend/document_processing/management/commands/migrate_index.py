@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_processing.index_versions import IndexMigrator, active_version, configured_key
+from document_processing.models import IndexVersion
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the vector index for the configured embedding model, preprocessing and chunking "
+        "versions and embedding reduction next to the active one, re-embedding only changed "
+        "chunks, then switch to it. Serving continues from the active version until the switch. Safe to interrupt and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding batch.")
+        parser.add_argument("--status", action="store_true", help="Print the index versions and exit.")
+        parser.add_argument("--drop-retired", action="store_true",
+                            help="Delete the collections of retired versions afterwards.")
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            active = active_version()
+            self.stdout.write(json.dumps({
+                "configured": configured_key(),
+                "active": active.key if active is not None else None,
+                "versions": [version.as_dict() for version in IndexVersion.objects.order_by("created_at")],
+            }, indent=2))
+            return
+
+        try:
+            report = IndexMigrator(batch_size=options["batch_size"], log=self.stdout.write).run()
+        except ValueError as e:
+            raise CommandError(str(e))
+        if report is None:
+            self.stdout.write(f"Index {configured_key()} is already active.")
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        if options["drop_retired"]:
+            from document_processing.embeddings import VectorEmbeddings
+            store = VectorEmbeddings().store
+            for version in IndexVersion.objects.filter(status=IndexVersion.Status.RETIRED):
+                store.delete_collection(version.collection_name)
+                self.stdout.write(f"Dropped collection {version.collection_name} of {version.key}")
@@ -0,0 +1,95 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_processing.benchmarks.ann import DEFAULT_HNSW_GRID, DEFAULT_NPROBES, DEFAULT_TARGET_RECALL, run_ann_tuning
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ANN index parameters (HNSW M, ef_construction, ef_search or IVF nlist, nprobe) on the "
+        "vectors of a collection against exact top-k search, report recall@k, p95 latency and index "
+        "size, and optionally store the fastest configuration reaching the target recall for the "
+        "collection (ANN_PARAMS_FILE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collection", default=None, help="Collection to tune (default: the active index).")
+        parser.add_argument("--index", choices=["hnsw", "ivf"], default=None,
+                            help="Index type (default: the one of the configured VECTOR_STORE).")
+        parser.add_argument("--k", type=int, default=10, help="Neighbours per query.")
+        parser.add_argument("--questions", default=None,
+                            help="File with one real question per line (default: the benchmark questions).")
+        parser.add_argument("--sample", type=int, default=200,
+                            help="Number of queries; questions are topped up with synthetic queries.")
+        parser.add_argument("--max-vectors", type=int, default=None, help="Only use the first N stored vectors.")
+        parser.add_argument("--M", type=int_list, default=DEFAULT_HNSW_GRID["M"])
+        parser.add_argument("--ef-construction", type=int_list, default=DEFAULT_HNSW_GRID["ef_construction"])
+        parser.add_argument("--ef-search", type=int_list, default=DEFAULT_HNSW_GRID["ef_search"])
+        parser.add_argument("--nlist", type=int_list, default=None,
+                            help="IVF list counts (default: 1, 2 and 4 times the square root of the vector count).")
+        parser.add_argument("--nprobe", type=int_list, default=DEFAULT_NPROBES)
+        parser.add_argument("--target-recall", type=float, default=DEFAULT_TARGET_RECALL)
+        parser.add_argument("--apply", action="store_true",
+                            help="Store the chosen parameters for the collection (and retrain a local IVF index).")
+        parser.add_argument("--output", default="benchmarks/ann.json", help="Where to write the JSON report.")
+
+    def handle(self, *args, **options):
+        questions = None
+        if options["questions"]:
+            with open(options["questions"]) as f:
+                questions = [line.strip() for line in f if line.strip()]
+
+        try:
+            report = run_ann_tuning(
+                collection_name=options["collection"],
+                index=options["index"],
+                k=options["k"],
+                questions=questions,
+                sample=options["sample"],
+                max_vectors=options["max_vectors"],
+                hnsw_grid={"M": options["M"], "ef_construction": options["ef_construction"],
+                           "ef_search": options["ef_search"]},
+                nlists=options["nlist"],
+                nprobes=options["nprobe"],
+                target_recall=options["target_recall"],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if os.path.dirname(options["output"]):
+            os.makedirs(os.path.dirname(options["output"]), exist_ok=True)
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Report written to {options['output']}")
+
+        chosen = report["chosen"]
+        if chosen is None:
+            return
+        if chosen["recall_at_k"] < options["target_recall"]:
+            self.stdout.write(self.style.WARNING(
+                f"No configuration reached recall@{options['k']} {options['target_recall']}, best is {chosen['params']}"))
+        self.stdout.write(f"Chosen: {chosen['index']} {chosen['params']} recall@{options['k']} "
+                          f"{chosen['recall_at_k']} p95 {chosen['p95_ms']}ms ({chosen['index_bytes']} bytes)")
+        if options["apply"]:
+            self.apply(report["meta"]["collection"], chosen)
+
+    def apply(self, collection_name, chosen):
+        from document_processing.embeddings import VectorEmbeddings
+        from document_processing.vector_store import ann_params_file, save_ann_params
+
+        save_ann_params(collection_name, chosen["params"])
+        self.stdout.write(f"Stored the parameters of {collection_name} in {ann_params_file()}")
+        store = VectorEmbeddings().store
+        if chosen["index"] == "ivf" and store.backend == "local":
+            store.get_collection(collection_name).train(chosen["params"]["nlist"])
+            self.stdout.write(f"Retrained {collection_name}")
+        elif chosen["index"] == "hnsw" and store.backend == "chroma":
+            self.stdout.write("Chroma applies HNSW parameters to new collections only; they take effect "
+                              "the next time this collection is created (e.g. by migrate_index).")
@@ -0,0 +1,124 @@
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from . import metrics
+from .context_selection import estimate_tokens
+
+
+class DocumentMatrix:
+    """
+    Chunks of one document ready for scoring: ids, texts and a contiguous float32 matrix
+    of L2-normalized embeddings, so cosine similarity is a single matrix product.
+    """
+
+    def __init__(self, ids, documents, embeddings):
+        matrix = np.array(embeddings, dtype=np.float32, order="C")
+        # Ingest stores normalized vectors; this only matters for chunks stored before it did
+        if matrix.size:
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.matrix = matrix
+        self.loaded_at = time.monotonic()
+        self._token_costs = None
+
+    @property
+    def nbytes(self):
+        # The matrix dominates; texts are counted by their encoded length
+        return self.matrix.nbytes + sum(len(document) for document in self.documents)
+
+    @property
+    def token_costs(self):
+        """Estimated tokens of every chunk, computed on first use."""
+        if self._token_costs is None:
+            self._token_costs = np.fromiter((estimate_tokens(document) for document in self.documents),
+                                            dtype=np.int64, count=len(self.documents))
+        return self._token_costs
+
+    def scores(self, query_matrix):
+        """Cosine similarity of each (normalized) query row against every chunk."""
+        return query_matrix @ self.matrix.T
+
+
+class DocumentMatrixCache:
+    """
+    Bounded, thread-safe LRU of `DocumentMatrix` entries keyed by (collection, document uid).
+
+    Entries are evicted least recently used first once `max_bytes` is exceeded, and are
+    considered stale after `ttl` seconds so a document re-ingested by another process is
+    eventually reloaded. Re-ingestion in this process invalidates the entry immediately.
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+    def get(self, collection_name, file_hash):
+        key = (collection_name, file_hash)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry.loaded_at > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+        metrics.increment("researchiq_cache_hits_total" if entry is not None
+                          else "researchiq_cache_misses_total", cache="document_matrix")
+        return entry
+
+    def put(self, collection_name, file_hash, entry):
+        if entry.nbytes > self.max_bytes:
+            # Larger than the whole cache; serve it uncached
+            return entry
+        key = (collection_name, file_hash)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+            self._report()
+        return entry
+
+    def invalidate(self, file_hash, collection_name=None):
+        """Drop a document from the cache, in one collection or all of them."""
+        with self.lock:
+            for key in [k for k in self.entries
+                        if k[1] == file_hash and collection_name in (None, k[0])]:
+                self._remove(key)
+            self._report()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+            self._report()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "documents": [{"collection": collection, "document_uid": file_hash,
+                               "chunks": len(entry.ids), "bytes": entry.nbytes}
+                              for (collection, file_hash), entry in reversed(self.entries.items())],
+            }
+
+    def _remove(self, key):
+        self.nbytes -= self.entries.pop(key).nbytes
+
+    def _report(self):
+        metrics.REGISTRY.set("researchiq_matrix_cache_bytes", self.nbytes)
+        metrics.REGISTRY.set("researchiq_matrix_cache_entries", len(self.entries))
+
+
+metrics.REGISTRY.describe("researchiq_matrix_cache_bytes", "Memory held by the per-document embedding matrix cache.")
+metrics.REGISTRY.describe("researchiq_matrix_cache_entries", "Documents held by the embedding matrix cache.")
@@ -0,0 +1,162 @@
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_DURATION = "researchiq_stage_duration_seconds"
+REQUEST_DURATION = "researchiq_request_duration_seconds"
+
+# Stage timings of the request currently being served, read by StageTimingMiddleware
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class MetricsRegistry:
+    """
+    Minimal thread-safe, in-process registry of counters and histograms rendered in the
+    Prometheus text exposition format. Each worker process keeps its own registry.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text format (version 0.0.4).
+        """
+        lines = []
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self.histograms.items()}
+
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in series}):
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (metric, labels), value in sorted(series.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._format_labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in histograms}):
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f"{name}_bucket{self._format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe(STAGE_DURATION, "Time spent in each pipeline stage.")
+REGISTRY.describe(REQUEST_DURATION, "End to end duration of HTTP requests.")
+REGISTRY.describe("researchiq_cache_hits_total", "Lookups answered from an existing cache or index.")
+REGISTRY.describe("researchiq_cache_misses_total", "Lookups that had to be computed.")
+REGISTRY.describe("researchiq_chunks_total", "Chunks processed, by operation.")
+REGISTRY.describe("researchiq_llm_tokens_total", "LLM tokens consumed, by type.")
+
+
+def record(stage_name, seconds):
+    """
+    Record `seconds` spent in `stage_name`, both globally and on the current request.
+    """
+    REGISTRY.observe(STAGE_DURATION, seconds, stage=stage_name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage_name] = timings.get(stage_name, 0.0) + seconds
+
+
+@contextmanager
+def stage(stage_name):
+    """
+    Context manager timing the enclosed block as one execution of `stage_name`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage_name, time.perf_counter() - start)
+
+
+def timed(stage_name):
+    """
+    Decorator timing every call of the wrapped function as `stage_name`.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def increment(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def start_request():
+    """
+    Begin collecting stage timings for the current request.
+
+    Returns:
+        tuple: The timings dict being filled and the context token to pass to `end_request`.
+    """
+    timings = {}
+    return timings, _request_timings.set(timings)
+
+
+def end_request(token):
+    _request_timings.reset(token)
@@ -0,0 +1,35 @@
+import time
+import logging
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimingMiddleware:
+    """
+    Collect the pipeline stage timings recorded while serving a request and expose them
+    through a `Server-Timing` header, e.g. `embedding;dur=12.1, retrieval;dur=3.4, total;dur=20.0`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        elapsed = time.perf_counter() - start
+
+        route = getattr(request.resolver_match, "route", None) or "unmatched"
+        metrics.REGISTRY.observe(metrics.REQUEST_DURATION, elapsed,
+                                 route=route, method=request.method, status=response.status_code)
+
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+        entries.append(f"total;dur={elapsed * 1000:.1f}")
+        response["Server-Timing"] = ", ".join(entries)
+        logger.debug("%s %s took %.3fs %s", request.method, request.path, elapsed, timings)
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_processing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Document',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='processing', max_length=16)),
+                ('title', models.CharField(blank=True, max_length=512)),
+                ('chunk_count', models.PositiveIntegerField(default=0)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('extractor_version', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('embedding_model', models.CharField(blank=True, db_index=True, max_length=128)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('expires_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
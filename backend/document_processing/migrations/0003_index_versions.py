@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_initial_version(apps, schema_editor):
+    # Everything ingested so far lives in the `researchIQ` collection, built with these versions
+    IndexVersion = apps.get_model("document_processing", "IndexVersion")
+    IndexVersion.objects.get_or_create(
+        key="all-MiniLM-L6-v2|p1|c1",
+        defaults={"collection_name": "researchIQ", "embedding_model": "all-MiniLM-L6-v2",
+                  "preprocessing_version": 1, "chunking_version": 1, "status": "active",
+                  "activated_at": django.utils.timezone.now()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_processing', '0002_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('collection_name', models.CharField(max_length=63, unique=True)),
+                ('embedding_model', models.CharField(max_length=128)),
+                ('preprocessing_version', models.PositiveIntegerField()),
+                ('chunking_version', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('building', 'Building'), ('active', 'Active'), ('retired', 'Retired')], db_index=True, default='building', max_length=16)),
+                ('documents_total', models.PositiveIntegerField(default=0)),
+                ('documents_done', models.PositiveIntegerField(default=0)),
+                ('chunks_embedded', models.PositiveIntegerField(default=0)),
+                ('chunks_reused', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DocumentExtraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='extraction', to='document_processing.document')),
+            ],
+        ),
+        migrations.RunPython(create_initial_version, migrations.RunPython.noop),
+    ]
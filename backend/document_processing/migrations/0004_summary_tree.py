@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+def copy_section_summaries(apps, schema_editor):
+    # Stored title-wise summaries become the section level of the summary trees
+    SectionSummary = apps.get_model("document_processing", "SectionSummary")
+    SummaryNode = apps.get_model("document_processing", "SummaryNode")
+    SummaryNode.objects.bulk_create([
+        SummaryNode(document_uid=summary.document_uid, level="section", content_hash=summary.content_hash,
+                    key=summary.key, summary=summary.summary, created_at=summary.created_at)
+        for summary in SectionSummary.objects.iterator()
+    ], batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_processing', '0003_index_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_uid', models.CharField(db_index=True, max_length=64)),
+                ('level', models.CharField(choices=[('chunk', 'Chunk'), ('section', 'Section'), ('group', 'Group'), ('document', 'Document')], max_length=16)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('key', models.TextField(blank=True, default='')),
+                ('summary', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='summarynode',
+            index=models.Index(fields=['level', 'content_hash'], name='document_pr_level_f1ae4e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='summarynode',
+            constraint=models.UniqueConstraint(fields=('document_uid', 'level', 'content_hash'), name='unique_summary_node'),
+        ),
+        migrations.RunPython(copy_section_summaries, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='SectionSummary',
+        ),
+    ]
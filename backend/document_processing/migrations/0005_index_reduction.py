@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_processing', '0004_summary_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexversion',
+            name='dimensions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='indexversion',
+            name='projection',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='indexversion',
+            name='reduction',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='indexversion',
+            name='reduction_overlap',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
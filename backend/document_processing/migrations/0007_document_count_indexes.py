@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_processing', '0006_near_duplicates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='chunk_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='duplicate_chunks',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
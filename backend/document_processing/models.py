@@ -1,3 +1,190 @@
+import hashlib
+
 from django.db import models
 
 # Create your models here.
+
+
+def content_hash(content):
+    """SHA-256 of a text, used to look up its stored summary."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class SummaryNode(models.Model):
+    """
+    One node of a document's summary tree: `chunk` nodes summarize pieces of sections too
+    long for one LLM call, `section` nodes one section (the title-wise summary), `group`
+    nodes consecutive section summaries and the `document` node the whole document.
+
+    `content_hash` identifies what the node summarizes: the hash of the exact text for
+    chunks and sections (`key + " " + value`, as sent to `summary/title/`), a hash of the
+    child hashes for the nodes above. A node whose hash is already known, for this or any
+    other document, is reused instead of summarized again.
+    """
+
+    class Level(models.TextChoices):
+        CHUNK = "chunk"
+        SECTION = "section"
+        GROUP = "group"
+        DOCUMENT = "document"
+
+    document_uid = models.CharField(max_length=64, db_index=True)
+    level = models.CharField(max_length=16, choices=Level.choices)
+    content_hash = models.CharField(max_length=64)
+    key = models.TextField(blank=True, default="")
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["document_uid", "level", "content_hash"], name="unique_summary_node"),
+        ]
+        indexes = [models.Index(fields=["level", "content_hash"])]
+
+    def __str__(self):
+        return f"{self.document_uid[:12]} {self.level} {self.key[:40]}"
+
+
+class Document(models.Model):
+    """
+    Registry of ingested documents. The source of truth for whether a document exists,
+    its processing status and its listing/stats; the vectors themselves live in Chroma.
+    """
+
+    class Status(models.TextChoices):
+        PROCESSING = "processing"
+        READY = "ready"
+        FAILED = "failed"
+
+    file_hash = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PROCESSING, db_index=True)
+    title = models.CharField(max_length=512, blank=True)
+    chunk_count = models.PositiveIntegerField(default=0, db_index=True)
+    page_count = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    extractor_version = models.CharField(max_length=64, blank=True, db_index=True)
+    embedding_model = models.CharField(max_length=128, blank=True, db_index=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Chunks whose vector was reused from a near-duplicate chunk of another document
+    duplicate_chunks = models.PositiveIntegerField(default=0, db_index=True)
+    # Stored document this one is a near-duplicate version of (arXiv v1/v2, camera-ready, ...)
+    version_of = models.CharField(max_length=64, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.file_hash[:12]} {self.status} {self.title[:40]}"
+
+    def as_dict(self):
+        return {
+            "document_uid": self.file_hash,
+            "status": self.status,
+            "title": self.title,
+            "chunk_count": self.chunk_count,
+            "page_count": self.page_count,
+            "extractor_version": self.extractor_version,
+            "embedding_model": self.embedding_model,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "duplicate_chunks": self.duplicate_chunks,
+            "dedupe_ratio": round(self.duplicate_chunks / self.chunk_count, 4) if self.chunk_count else 0.0,
+            "version_of": self.version_of or None,
+        }
+
+
+class DocumentExtraction(models.Model):
+    """
+    Raw extractor output (`structuredData.json`, zlib compressed) of a document, kept so the
+    index can be rebuilt after a preprocessing or chunking change without new Adobe calls.
+    """
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name="extraction")
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.document.file_hash[:12]} ({len(self.data)} bytes)"
+
+
+class IndexVersion(models.Model):
+    """
+    One build of the vector index: a Chroma collection embedded with a given model,
+    preprocessing and chunking version, and optionally reduced to fewer dimensions. Exactly
+    one version is active and served; a new version is built in the background and
+    activated atomically once complete.
+    """
+
+    class Status(models.TextChoices):
+        BUILDING = "building"
+        ACTIVE = "active"
+        RETIRED = "retired"
+
+    key = models.CharField(max_length=255, unique=True)
+    collection_name = models.CharField(max_length=63, unique=True)
+    embedding_model = models.CharField(max_length=128)
+    preprocessing_version = models.PositiveIntegerField()
+    chunking_version = models.PositiveIntegerField()
+    # Embedding reduction ("" for full dimension vectors), see `reduction`
+    reduction = models.CharField(max_length=16, blank=True, default="")
+    dimensions = models.PositiveIntegerField(default=0)
+    # Fitted PCA projection (npz), set before the first chunk is stored
+    projection = models.BinaryField(null=True)
+    # Top-k overlap of reduced with full dimension search, measured when the reducer was fitted
+    reduction_overlap = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.BUILDING, db_index=True)
+    documents_total = models.PositiveIntegerField(default=0)
+    documents_done = models.PositiveIntegerField(default=0)
+    chunks_embedded = models.PositiveIntegerField(default=0)
+    chunks_reused = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+    def as_dict(self):
+        return {
+            "key": self.key,
+            "collection_name": self.collection_name,
+            "embedding_model": self.embedding_model,
+            "preprocessing_version": self.preprocessing_version,
+            "chunking_version": self.chunking_version,
+            "reduction": self.reduction or None,
+            "dimensions": self.dimensions or None,
+            "reduction_overlap": self.reduction_overlap,
+            "status": self.status,
+            "documents_total": self.documents_total,
+            "documents_done": self.documents_done,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_reused": self.chunks_reused,
+            "created_at": self.created_at.isoformat(),
+            "activated_at": self.activated_at.isoformat() if self.activated_at else None,
+        }
+
+
+class ChunkSignature(models.Model):
+    """
+    MinHash signature of a stored chunk's text, used at ingest to find near-duplicate chunks
+    of other documents whose vectors can be reused (see `dedupe`).
+    """
+    content_uid = models.CharField(max_length=128, unique=True)
+    document_uid = models.CharField(max_length=64, db_index=True)
+    # SHA-256 of the chunk text, to skip signatures whose chunk was re-chunked since
+    content_hash = models.CharField(max_length=64)
+    signature = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.content_uid
+
+
+class SignatureBand(models.Model):
+    """
+    One LSH band of a chunk signature. `bucket` hashes the band number with the band's rows
+    of the signature; chunks sharing a bucket are near-duplicate candidates.
+    """
+    chunk = models.ForeignKey(ChunkSignature, on_delete=models.CASCADE, related_name="bands")
+    bucket = models.BigIntegerField(db_index=True)
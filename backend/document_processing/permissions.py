@@ -0,0 +1,27 @@
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+def has_admin_token(request):
+    """
+    Check whether the request carries the admin token (`X-Admin-Token` header) or comes
+    from a staff user. Requests are never admin when ADMIN_API_TOKEN is not configured.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+
+    expected = getattr(settings, "ADMIN_API_TOKEN", "")
+    provided = request.headers.get("X-Admin-Token", "")
+    return bool(expected) and hmac.compare_digest(expected, provided)
+
+
+class HasAdminToken(BasePermission):
+    """
+    Allow access only to requests authenticated with the admin token.
+    """
+
+    def has_permission(self, request, view):
+        return has_admin_token(request)
@@ -1,7 +1,21 @@
 import hashlib
+import logging
 from io import BytesIO
 from .utils import AdobeFunc
 from .embeddings import VectorEmbeddings
+from . import index_versions, metrics, registry
+from .extraction import EXTRACTOR
+from .streaming import INGESTOR
+
+logger = logging.getLogger(__name__)
+
+
+def page_count(json_data):
+    """Number of pages in an Adobe `structuredData.json` payload, or None if it does not say."""
+    if json_data.get("pages"):
+        return len(json_data["pages"])
+    pages = [element["Page"] for element in json_data.get("elements", []) if "Page" in element]
+    return max(pages) + 1 if pages else None
 
 
 class data_pipeline:
@@ -9,6 +23,7 @@ class data_pipeline:
     def __init__(self):
         pass
 
+    @metrics.timed("hashing")
     def generate_hash_for_file(self, file):
         """
         Generate a unique hash for the file content.
@@ -17,27 +32,63 @@ class data_pipeline:
         file_content = file.read()  # Read the file content as bytes
         # Generate hash from bytes
         file_uid = hashlib.sha256(file_content).hexdigest()
-        print(f"Generated file UID: {file_uid}")
+        logger.debug("Generated file UID: %s", file_uid)
         file.seek(0)  # Reset the original file pointer again
         return file_uid
 
-    def text_extraction_pipeline(self, file):
+    def text_extraction_pipeline(self, file, include=None):
+        """
+        Return the stored chunks of `file`, extracting and embedding it first if it is new.
+        `include` limits what is fetched for an already known document (see `VectorEmbeddings.retrieve_data`).
+        The document registry decides whether the document is known and tracks its status.
+        """
         embeddings = VectorEmbeddings()
-        adobe = AdobeFunc()
 
         file_hash = self.generate_hash_for_file(file)
 
-        results = embeddings.retrieve_data(file_hash)
-        if results:
-            print("Already Exists")
-            return results
+        if registry.lookup(file_hash) is not None:
+            results = embeddings.retrieve_data(file_hash, include=include)
+            if results:
+                logger.info("Document %s already exists, skipping extraction", file_hash)
+                metrics.increment("researchiq_cache_hits_total", cache="document")
+                return results
+        metrics.increment("researchiq_cache_misses_total", cache="document")
 
-        zip_file_path = adobe.adobe_process(file)
-        json_data = adobe.extract_json_from_zip(zip_file_path)
-        text_list = adobe.extract_information_from_json(json_data)
-        # return VectorEmbeddings().fetch_document_data_by_content(file)
+        registry.mark_processing(file_hash)
+        try:
+            # Stages overlap with other documents in flight (see `streaming.StreamingIngestor`)
+            output, text_list, json_data, extractor_version, dedupe = INGESTOR.ingest(
+                file, file_hash, embeddings, AdobeFunc())
+        except Exception as e:
+            registry.mark_failed(file_hash, e)
+            raise
+        chunk_count = len(output) - 1  # every key but document_uid is a chunk
+        try:
+            index = index_versions.follow_active_version(embeddings, file_hash)
+        except Exception as e:
+            registry.mark_failed(file_hash, e)
+            raise
+        registry.mark_ready(file_hash, chunk_count, page_count(json_data), registry.document_title(text_list),
+                            index.embedding_model, structured_data=json_data,
+                            extractor_version=extractor_version, **dedupe)
+        return output
 
-        return embeddings.embedding_creation(text_list, file_hash)
-    
+    def extract_contents(self, file, adobe=None):
+        """
+        Run the extraction stages for one PDF: Adobe extraction, JSON parsing and
+        preprocessing. Returns the structured sections of the document.
+        """
+        return self.extract_document(file, adobe)[0]
 
+    def extract_document(self, file, adobe=None):
+        """
+        Like `extract_contents`, but also returns the extractor's raw JSON (for the page
+        count and for rebuilding the index later without another extraction) and the
+        version of the extraction backend that produced it.
 
+        Returns:
+            tuple: (structured sections, structuredData.json payload, extractor version)
+        """
+        adobe = adobe or AdobeFunc()
+        json_data, extractor_version = EXTRACTOR.extract(file, adobe)
+        return adobe.extract_information_from_json(json_data), json_data, extractor_version
@@ -0,0 +1,71 @@
+import queue
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .summary_tree import SECTION, SummaryTree, stored_summaries
+
+logger = logging.getLogger(__name__)
+
+
+def cached_section_summaries(hashes):
+    """Map content hash -> stored summary for the given hashes."""
+    return stored_summaries(SECTION, hashes)
+
+
+def precompute_section_summaries(document_uid):
+    """
+    Summarize every section of a document that has no stored summary yet (the section
+    level of its summary tree). LLM calls run as background work and therefore yield to
+    interactive requests.
+    """
+    tree = SummaryTree(document_uid, background=True)
+    computed = tree.build_sections()
+    logger.info("Precomputed %d of %d section summaries for %s", computed, computed + tree.reused, document_uid)
+    return computed
+
+
+class SectionSummaryPrecomputer:
+    """
+    Single low priority worker thread that precomputes section summaries of newly
+    ingested documents, one document at a time.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def schedule(self, document_uid):
+        with self.lock:
+            if document_uid in self.pending:
+                return
+            self.pending.add(document_uid)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="section-summaries", daemon=True)
+                self.thread.start()
+        self.queue.put(document_uid)
+
+    def run(self):
+        while True:
+            document_uid = self.queue.get()
+            try:
+                precompute_section_summaries(document_uid)
+            except Exception:
+                logger.exception("Precomputing section summaries failed for %s", document_uid)
+            finally:
+                with self.lock:
+                    self.pending.discard(document_uid)
+                close_old_connections()
+
+
+PRECOMPUTER = SectionSummaryPrecomputer()
+
+
+def schedule_section_summaries(document_uid):
+    """Queue a document for background precomputation if PRECOMPUTE_SECTION_SUMMARIES is on."""
+    if getattr(settings, "PRECOMPUTE_SECTION_SUMMARIES", False):
+        PRECOMPUTER.schedule(document_uid)
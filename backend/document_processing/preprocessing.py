@@ -1,4 +1,6 @@
 import re
+import logging
+from functools import lru_cache
 import emoji
 import nltk
 from nltk.tokenize import word_tokenize
@@ -7,6 +9,11 @@ from nltk.corpus import wordnet, stopwords
 
 from supporting_docs.slang_dict import abbreviations
 
+logger = logging.getLogger(__name__)
+
+# Bump whenever `preprocess_pipeline` changes its output, so the index can be rebuilt (see `index_versions`)
+PREPROCESSING_VERSION = 1
+
 
 class Preprocessing:
     """
@@ -29,6 +36,9 @@ class Preprocessing:
         nltk.download("wordnet")
         nltk.download("stopwords")
         nltk.download("averaged_perceptron_tagger")
+        self.lemmatizer = WordNetLemmatizer()
+        # Get the set of English stopwords once
+        self.stop_words = set(stopwords.words('english'))
 
     def clean_string(self, input_string):
         """
@@ -62,14 +72,12 @@ class Preprocessing:
         return html_pattern.sub(r'', text)
 
     def lemmatize_text_nltk(self, text):
-        lemmatizer = WordNetLemmatizer()
         words = nltk.word_tokenize(text)  # Tokenize the text
-        lemmatized_words = [lemmatizer.lemmatize(word) for word in words]
+        lemmatized_words = [self.lemmatizer.lemmatize(word) for word in words]
         return ' '.join(lemmatized_words)
 
     def remove_stopwords(self, text):
-        # Get the set of English stopwords
-        stop_words = set(stopwords.words('english'))
+        stop_words = self.stop_words
         words = word_tokenize(text)  # Tokenize the text
         filtered_words = [
             word for word in words if word.lower() not in stop_words]
@@ -80,15 +88,21 @@ class Preprocessing:
         return emoji.demojize(text)
 
 
-def preprocess_pipeline(text):
+@lru_cache(maxsize=None)
+def preprocessing_steps():
+    """
+    The bound preprocessing methods, in the order they are applied. The preprocessor (and
+    its NLTK downloads) is created once per process instead of once per text.
+    """
     preprocessor = Preprocessing()
     methods = [method for method in dir(preprocessor) if callable(getattr(preprocessor, method))
                and not method.startswith("__")]
-    print(methods)
+    logger.debug("Applying preprocessing functions: %s", methods)
+    return tuple(getattr(preprocessor, method_name) for method_name in methods)
+
 
+def preprocess_pipeline(text):
     # Apply each function to the text
-    for method_name in methods:
-        # Print the name of the current function being applied
-        print(f"Applying function: {method_name}")
-        text = getattr(preprocessor, method_name)(text)
+    for step in preprocessing_steps():
+        text = step(text)
     return text
@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+import time
+import random
+import cProfile
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+from django.conf import settings
+
+from .permissions import has_admin_token
+
+# Document uids are SHA-256 file hashes
+DOCUMENT_UID_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the call stack of a single thread at a fixed interval.
+
+    The samples are written in the folded ("collapsed") stack format understood by
+    flamegraph.pl, speedscope and inferno: one `frame;frame;frame count` line per stack.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        if stack:
+            self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, path):
+        path = f"{path}.folded"
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class DeterministicProfiler:
+    """
+    cProfile based profiler; the `.prof` output opens in snakeviz or converts to a
+    flamegraph with flameprof.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def save(self, path):
+        path = f"{path}.prof"
+        self.profile.dump_stats(path)
+        return path
+
+
+class ProfileRateLimiter:
+    """
+    Allow at most `max_per_minute` profiles per process and never more than one at a time,
+    so profiling cannot hurt overall throughput.
+    """
+
+    def __init__(self, max_per_minute):
+        self.max_per_minute = max_per_minute
+        self.started = deque()
+        self.lock = threading.Lock()
+        self.active = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.started and now - self.started[0] > 60:
+                self.started.popleft()
+            if len(self.started) >= self.max_per_minute or not self.active.acquire(blocking=False):
+                return False
+            self.started.append(now)
+            return True
+
+    def release(self):
+        self.active.release()
+
+
+def document_uid_for(request, response):
+    """
+    Find the document uid a request worked on, from the response body or the submitted form.
+    Anything that is not a SHA-256 file hash (the value ends up in a file name) is "untagged".
+    """
+    data = getattr(response, "data", None)
+    uid = data.get("document_uid") if isinstance(data, dict) else None
+    if not uid:
+        try:
+            uid = request.POST.get("document_uid")
+        except Exception:
+            uid = None
+    uid = str(uid) if uid else ""
+    return uid if DOCUMENT_UID_PATTERN.fullmatch(uid) else "untagged"
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in profiling of single requests through the DRF views.
+
+    Off unless PROFILING_ENABLED is set. A request is profiled when it sends `X-Profile: 1`
+    together with admin credentials, or when it is randomly picked by PROFILING_SAMPLE_RATE.
+    Profiles are saved in PROFILING_DIR tagged with the document uid and the profile file
+    name is returned in the `X-Profile-Id` header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "PROFILING_ENABLED", False)
+        self.mode = getattr(settings, "PROFILING_MODE", "sample")
+        self.interval = getattr(settings, "PROFILING_INTERVAL", 0.005)
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+        self.output_dir = getattr(settings, "PROFILING_DIR", "profiles")
+        self.limiter = ProfileRateLimiter(getattr(settings, "PROFILING_MAX_PER_MINUTE", 2))
+
+    def should_profile(self, request):
+        if request.headers.get("X-Profile") == "1" and has_admin_token(request):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.enabled or not self.should_profile(request) or not self.limiter.acquire():
+            return self.get_response(request)
+
+        try:
+            profiler = DeterministicProfiler() if self.mode == "cprofile" else \
+                SamplingProfiler(interval=self.interval)
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+
+            view = request.path.strip("/").replace("/", "_") or "root"
+            time_stamp = datetime.now().strftime("%Y-%m-%dT%H-%M-%S-%f")
+            name = f"{document_uid_for(request, response)}_{view}_{time_stamp}"
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                path = profiler.save(os.path.join(self.output_dir, name))
+            except Exception:
+                # The request itself completed; a lost profile must not turn it into a 500
+                logger.exception("Could not save the request profile %s", name)
+                return response
+        finally:
+            self.limiter.release()
+
+        logger.info("Saved request profile to %s", path)
+        response["X-Profile-Id"] = os.path.basename(path)
+        return response
@@ -0,0 +1,91 @@
+import re
+
+import numpy as np
+
+# Opt-in fields of the document response; everything else is always returned
+DOCUMENT_FIELDS = {"values", "documents", "embeddings"}
+# Opt-in fields of the section list
+SECTION_FIELDS = {"value"}
+
+
+def requested_fields(request, allowed):
+    """
+    Parse the comma separated `fields` parameter (query string or body) into the set
+    of opt-in fields, ignoring unknown names.
+    """
+    raw = request.query_params.get("fields") or request.data.get("fields") or ""
+    return {field.strip() for field in raw.split(",") if field.strip()} & allowed
+
+
+def paging(request, default_limit=None):
+    """Read non-negative `offset` and `limit` parameters; a missing limit means no limit."""
+    def read(name, default):
+        value = request.query_params.get(name) or request.data.get(name)
+        if value in (None, ""):
+            return default
+        value = int(value)
+        if value < 0:
+            raise ValueError(f"{name} must not be negative.")
+        return value
+
+    return read("offset", 0), read("limit", default_limit)
+
+
+def chunk_index(content_uid):
+    """Position of a chunk in its document, from its `<file_hash>_content<n>` id."""
+    match = re.search(r"_content(\d+)$", content_uid)
+    return int(match.group(1)) if match else 0
+
+
+def document_projection(output, fields=()):
+    """
+    Project the result of ingestion (`VectorEmbeddings.embedding_creation`) or lookup
+    (`VectorEmbeddings.retrieve_data`) into one compact shape, ordered by chunk position.
+
+    Args:
+        output (dict): Either result shape.
+        fields (set): Opt-in fields among DOCUMENT_FIELDS.
+
+    Returns:
+        dict: `document_uid`, `chunk_count`, `ids` and `keys`, plus the requested fields.
+    """
+    if "ids" in output:
+        # Chroma `get` result
+        rows = [
+            (content_uid, metadata, document,
+             output["embeddings"][idx] if output.get("embeddings") is not None else None)
+            for idx, (content_uid, metadata, document) in enumerate(zip(
+                output["ids"], output["metadatas"], output.get("documents") or [None] * len(output["ids"])))
+        ]
+    else:
+        # `embedding_creation` output: {content_uid: [{key, value, embedding}]}
+        rows = []
+        for content_uid, entries in output.items():
+            if content_uid == "document_uid":
+                continue
+            entry = entries[0]
+            rows.append((content_uid, entry, f"{entry['key']}: {entry['value']}", entry.get("embedding")))
+    rows.sort(key=lambda row: chunk_index(row[0]))
+
+    projection = {
+        "document_uid": output["document_uid"],
+        "chunk_count": len(rows),
+        "ids": [row[0] for row in rows],
+        "keys": [row[1]["key"] for row in rows],
+    }
+    if "values" in fields:
+        projection["values"] = [row[1]["value"] for row in rows]
+    if "documents" in fields:
+        projection["documents"] = [row[2] for row in rows]
+    if "embeddings" in fields:
+        # float32 matrix; the JSON renderer turns it into lists, binary renderers pack it as is
+        projection["embeddings"] = np.asarray([row[3] for row in rows], dtype=np.float32)
+    return projection
+
+
+def section_projection(section, summary=None, fields=()):
+    """Compact entry of the section list: key, text length and any stored summary."""
+    projection = {"key": section["key"], "length": len(section["value"]), "summary": summary}
+    if "value" in fields:
+        projection["value"] = section["value"]
+    return projection
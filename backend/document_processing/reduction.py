@@ -0,0 +1,98 @@
+import io
+
+import numpy as np
+
+# Neighbours compared by the top-k overlap check of a reduction
+REDUCTION_CHECK_K = 10
+
+METHODS = ("pca", "truncate")
+
+
+def normalize(matrix):
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+
+
+class EmbeddingReducer:
+    """
+    Maps full dimension embeddings to `dimensions` dimensions, normalized so that inner
+    product, cosine and l2 rank alike. PCA reducers carry the corpus `mean` and the
+    `components` (one row per kept dimension) they were fitted with.
+    """
+
+    def __init__(self, method, dimensions, mean=None, components=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown embedding reduction {method!r}")
+        if method == "pca" and components is None:
+            raise ValueError("A PCA reducer needs fitted components, see EmbeddingReducer.fit")
+        self.method = method
+        self.dimensions = dimensions
+        self.mean = mean
+        self.components = components
+
+    def __repr__(self):
+        return f"EmbeddingReducer({self.method!r}, {self.dimensions})"
+
+    @classmethod
+    def fit(cls, method, dimensions, vectors):
+        """A reducer for the full dimension `vectors` (a sample of the corpus)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dimensions >= vectors.shape[1]:
+            raise ValueError(f"Cannot reduce {vectors.shape[1]} dimensions to {dimensions}")
+        if method != "pca":
+            return cls(method, dimensions)
+        if len(vectors) < dimensions:
+            raise ValueError(f"PCA to {dimensions} dimensions needs at least {dimensions} vectors, got {len(vectors)}")
+        vectors = normalize(vectors)
+        mean = vectors.mean(axis=0)
+        # Right singular vectors of the centered sample, by decreasing variance
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(method, dimensions, mean.astype(np.float32), vt[:dimensions].astype(np.float32))
+
+    def apply(self, vectors):
+        """Reduce a (n, full dimension) array; returns normalized float32 rows."""
+        vectors = normalize(np.asarray(vectors, dtype=np.float32))
+        if self.method == "pca":
+            reduced = (vectors - self.mean) @ self.components.T
+        else:
+            reduced = vectors[:, :self.dimensions]
+        return normalize(reduced).astype(np.float32, copy=False)
+
+    def to_bytes(self):
+        """The fitted projection, for `IndexVersion.projection` (empty for truncation)."""
+        if self.method != "pca":
+            return b""
+        buffer = io.BytesIO()
+        np.savez(buffer, mean=self.mean, components=self.components)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, method, dimensions, data):
+        if method != "pca":
+            return cls(method, dimensions)
+        arrays = np.load(io.BytesIO(bytes(data)))
+        return cls(method, dimensions, arrays["mean"], arrays["components"])
+
+
+def top_k(matrix, queries, k, exclude_self=False, block=256):
+    """Exact top `k` row indices of `matrix` per query, by inner product (unordered)."""
+    found = []
+    for start in range(0, len(queries), block):
+        scores = queries[start:start + block] @ matrix.T
+        if exclude_self:
+            rows = np.arange(start, min(start + block, len(queries)))
+            scores[rows - start, rows] = -np.inf
+        found.append(np.argpartition(-scores, k - 1, axis=1)[:, :k])
+    return np.vstack(found)
+
+
+def top_k_overlap(matrix, queries, reducer, k=REDUCTION_CHECK_K, exclude_self=False):
+    """
+    Mean fraction of the full dimension top `k` neighbours of each query that search in the
+    reduced space finds as well. With `exclude_self`, `queries` are the rows of `matrix`
+    and each one is not its own neighbour.
+    """
+    k = min(k, len(matrix) - 1 if exclude_self else len(matrix))
+    matrix, queries = normalize(np.asarray(matrix, dtype=np.float32)), normalize(np.asarray(queries, dtype=np.float32))
+    full = top_k(matrix, queries, k, exclude_self)
+    reduced = top_k(reducer.apply(matrix), reducer.apply(queries), k, exclude_self)
+    return float(np.mean([len(set(f) & set(r)) / k for f, r in zip(full, reduced)]))
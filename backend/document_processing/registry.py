@@ -0,0 +1,113 @@
+import json
+import zlib
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Count, Sum
+
+from .embeddings import VectorEmbeddings, embedding_model_name
+from .models import Document, DocumentExtraction
+from .utils import AdobeFunc
+
+logger = logging.getLogger(__name__)
+
+
+def document_title(contents):
+    """First section heading of the extracted contents, used as the listing title."""
+    return next(iter(contents), "")[:512] if contents else ""
+
+
+def mark_processing(file_hash):
+    document, _ = Document.objects.update_or_create(
+        file_hash=file_hash,
+        defaults={"status": Document.Status.PROCESSING, "error": ""},
+    )
+    return document
+
+
+def mark_ready(file_hash, chunk_count, page_count=None, title="", embedding_model=None,
+               structured_data=None, duplicate_chunks=0, version_of="", extractor_version=""):
+    """
+    Record a successfully ingested document. `structured_data` (the extractor's JSON) is
+    kept so the index can later be rebuilt without extracting the PDF again, and
+    `extractor_version` names the extraction backend that produced it (see
+    `PageRangeExtractor.extract`); `duplicate_chunks` and `version_of` come from
+    near-duplicate detection (see `dedupe`).
+    """
+    document, _ = Document.objects.update_or_create(
+        file_hash=file_hash,
+        defaults={
+            "status": Document.Status.READY,
+            "chunk_count": chunk_count,
+            "page_count": page_count,
+            "title": title,
+            "extractor_version": extractor_version,
+            "embedding_model": embedding_model or embedding_model_name(),
+            "duplicate_chunks": duplicate_chunks,
+            "version_of": version_of,
+            "error": "",
+        },
+    )
+    if structured_data is not None:
+        DocumentExtraction.objects.update_or_create(document=document, defaults={
+            "data": zlib.compress(json.dumps(structured_data).encode("utf-8"))})
+    return document
+
+
+def parse_extraction(data):
+    """Re-run parsing and preprocessing on stored extractor output; returns the structured sections."""
+    return AdobeFunc().extract_information_from_json(json.loads(zlib.decompress(bytes(data))))
+
+
+def mark_failed(file_hash, error):
+    Document.objects.update_or_create(
+        file_hash=file_hash,
+        defaults={"status": Document.Status.FAILED, "error": f"{type(error).__name__}: {error}"},
+    )
+
+
+def register_existing(file_hash, collection_name=None):
+    """
+    Register a document that is in the vector store but not in the registry (ingested
+    before the registry existed). Returns None if the store does not know it either.
+    """
+    overview = VectorEmbeddings().document_overview(file_hash, collection_name)
+    if overview is None:
+        return None
+    # Versions are unknown for documents ingested before the registry
+    document, _ = Document.objects.update_or_create(
+        file_hash=file_hash,
+        defaults={"status": Document.Status.READY, "chunk_count": overview["chunk_count"],
+                  "title": document_title(overview["keys"])},
+    )
+    if overview["ingested_at"]:
+        # created_at is set automatically on insert; backfill the real ingestion time
+        document.created_at = datetime.fromtimestamp(overview["ingested_at"], tz=dt_timezone.utc)
+        Document.objects.filter(pk=document.pk).update(created_at=document.created_at)
+    logger.info("Registered existing document %s", file_hash)
+    return document
+
+
+def lookup(file_hash):
+    """
+    The ready registry entry of a document, or None. Only the registry is queried; documents
+    ingested before it existed are registered by `manage.py backfill_registry`.
+    """
+    return Document.objects.filter(file_hash=file_hash, status=Document.Status.READY).first()
+
+
+def document_stats():
+    """Aggregate counts of the registry, by status and overall."""
+    by_status = dict(Document.objects.values_list("status").annotate(count=Count("id"))
+                     .values_list("status", "count"))
+    totals = Document.objects.filter(status=Document.Status.READY).aggregate(
+        chunks=Sum("chunk_count"), pages=Sum("page_count"), duplicate_chunks=Sum("duplicate_chunks"))
+    return {
+        "documents": sum(by_status.values()),
+        "by_status": by_status,
+        "chunks": totals["chunks"] or 0,
+        "pages": totals["pages"] or 0,
+        "duplicate_chunks": totals["duplicate_chunks"] or 0,
+        "embedding_models": dict(Document.objects.values_list("embedding_model")
+                                 .annotate(count=Count("id")).values_list("embedding_model", "count")),
+    }
@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency, the msgpack format is simply not offered
+    msgpack = None
+
+
+def embedding_matrix(data):
+    """
+    The `embeddings` of a response (top level or under `output`) as a contiguous float32 matrix.
+    """
+    source = data.get("output", data) if isinstance(data, dict) else {}
+    embeddings = source.get("embeddings") if isinstance(source, dict) else None
+    if embeddings is None or len(embeddings) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+
+
+class NumpyRenderer(BaseRenderer):
+    """
+    Render the response's embeddings as a float32 `.npy` file. Rows follow the order of
+    the `ids` returned by the JSON format.
+    """
+    media_type = "application/x-npy"
+    format = "npy"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.BytesIO()
+        np.save(buffer, embedding_matrix(data), allow_pickle=False)
+        return buffer.getvalue()
+
+
+class MsgpackRenderer(BaseRenderer):
+    """
+    Render the response as msgpack, with `output.embeddings` packed as raw little-endian
+    float32 bytes next to their `shape`.
+    """
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        payload = dict(data) if isinstance(data, dict) else {"output": data}
+        if isinstance(payload.get("output"), dict) and "embeddings" in payload["output"]:
+            matrix = embedding_matrix(payload).astype("<f4", copy=False)
+            payload["output"] = {**payload["output"], "embeddings": matrix.tobytes(),
+                                 "shape": list(matrix.shape), "dtype": "float32"}
+        return msgpack.packb(payload, use_bin_type=True, default=str)
+
+
+BINARY_RENDERERS = [NumpyRenderer] + ([MsgpackRenderer] if msgpack is not None else [])
+BINARY_FORMATS = {renderer.format for renderer in BINARY_RENDERERS}
@@ -0,0 +1,266 @@
+import time
+import queue
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import dedupe, metrics
+from .extraction import EXTRACTOR
+from .models import ChunkSignature
+
+logger = logging.getLogger(__name__)
+
+
+class IngestJob:
+    """
+    One document moving through the pipeline. Its future resolves to
+    `(output_data, contents, json_data, extractor_version, dedupe)` once every chunk is
+    stored, `dedupe` being the document's `dedupe.report`. A failed job removes the chunks
+    it already stored, so the index never serves part of a document.
+    """
+
+    def __init__(self, file, file_hash, embeddings, adobe):
+        self.file = file
+        self.file_hash = file_hash
+        self.embeddings = embeddings
+        self.adobe = adobe
+        self.future = Future()
+        # Stage timings are recorded on the submitting request
+        self.context = contextvars.copy_context()
+        self.lock = threading.Lock()
+        self.contents = None
+        self.json_data = None
+        self.extractor_version = ""
+        self.chunks_total = None
+        self.chunks_stored = 0
+        self.signatures = {}
+        self.sources = []
+        self.dedupe = {"duplicate_chunks": 0, "version_of": ""}
+        self.output = {"document_uid": file_hash}
+
+    def run(self, func, *args):
+        # A fresh copy per call: stages of one job may run at the same time
+        return self.context.copy().run(func, *args)
+
+    def fail(self, error):
+        with self.lock:
+            if self.future.done():
+                return
+            self.future.set_exception(error)
+        logger.error("Ingestion of %s failed: %s", self.file_hash, error)
+        if self.chunks_total:
+            self.discard()
+
+    def discard(self):
+        """Delete the chunks, and their signatures, stored for this document so far."""
+        try:
+            collection = self.embeddings.get_collection()
+            stored = collection.get(where={"document_uid": self.file_hash}, include=[])["ids"]
+            if stored:
+                collection.delete(ids=stored)
+            ChunkSignature.objects.filter(document_uid=self.file_hash).delete()
+        except Exception:
+            logger.exception("Could not delete the stored chunks of failed document %s", self.file_hash)
+
+    def finish(self):
+        with self.lock:
+            if not self.future.done():
+                self.future.set_result((self.output, self.contents, self.json_data, self.extractor_version,
+                                        self.dedupe))
+
+
+class StreamingIngestor:
+    """
+    Producer-consumer ingestion: extraction -> parsing and preprocessing -> batched
+    embedding -> batched upserts, each stage in its own thread(s) and connected by bounded
+    queues so a slow stage applies backpressure instead of buffering whole documents.
+
+    Several documents are in flight at once: while one waits on the extraction service,
+    another is being preprocessed and a third embedded. Chunks of different documents
+    built for the same index are embedded together when they are queued at the same time.
+    Near-duplicates of already stored chunks skip the embedding stage (see `dedupe`).
+
+    An error in a stage fails the jobs it was working on; the stage itself keeps running.
+    """
+
+    def __init__(self, extract_workers=None, queue_size=None, embed_batch=None, upsert_batch=None):
+        # Concurrent extraction jobs (network bound), bounded queue length between stages, and
+        # chunks per embedding call / per upsert (the INGEST_* settings by default)
+        self.extract_workers = extract_workers or getattr(settings, "INGEST_EXTRACT_WORKERS", 4)
+        self.embed_batch = embed_batch or getattr(settings, "INGEST_EMBED_BATCH", 64)
+        self.upsert_batch = upsert_batch or getattr(settings, "INGEST_UPSERT_BATCH", 256)
+        queue_size = queue_size or getattr(settings, "INGEST_QUEUE_SIZE", 8)
+        self.queues = {name: queue.Queue(queue_size) for name in ("parse", "embed", "upsert")}
+        self.lock = threading.Lock()
+        self.extractor = None
+        self.threads = []
+
+    def start(self):
+        with self.lock:
+            if self.extractor is not None:
+                return
+            self.extractor = ThreadPoolExecutor(self.extract_workers, thread_name_prefix="ingest-extract")
+            for name, target in (("parse", self.parse_loop), ("embed", self.embed_loop),
+                                 ("upsert", self.upsert_loop)):
+                thread = threading.Thread(target=target, name=f"ingest-{name}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def enqueue(self, file, file_hash, embeddings, adobe):
+        self.start()
+        job = IngestJob(file, file_hash, embeddings, adobe)
+        self.extractor.submit(self.extract, job)
+        return job
+
+    def submit(self, file, file_hash, embeddings, adobe):
+        """Queue a document; returns the Future of its `IngestJob`."""
+        return self.enqueue(file, file_hash, embeddings, adobe).future
+
+    def alive(self):
+        return all(thread.is_alive() for thread in self.threads)
+
+    def ingest(self, file, file_hash, embeddings, adobe, timeout=None, poll_interval=1.0):
+        """
+        Queue a document and wait for it. Raises the stage's error if the document failed,
+        TimeoutError after `timeout` seconds (INGEST_TIMEOUT by default, 0 waits forever) and
+        RuntimeError if a stage thread has stopped.
+        """
+        timeout = getattr(settings, "INGEST_TIMEOUT", 900) if timeout is None else timeout
+        job = self.enqueue(file, file_hash, embeddings, adobe)
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            if wait([job.future], timeout=poll_interval).done:
+                return job.future.result()
+            if not self.alive():
+                job.fail(RuntimeError("The ingestion pipeline has stopped"))
+            elif deadline is not None and time.monotonic() >= deadline:
+                job.fail(TimeoutError(f"Ingestion of {file_hash} did not finish within {timeout:g}s"))
+
+    def put(self, stage, item):
+        self.queues[stage].put(item)  # Blocks while the next stage is saturated
+        metrics.REGISTRY.set("researchiq_ingest_queue_depth", self.queues[stage].qsize(), queue=stage)
+
+    # Stage 1, in the extraction pool: network bound
+    def extract(self, job):
+        try:
+            json_data, job.extractor_version = job.run(EXTRACTOR.extract, job.file, job.adobe)
+            self.put("parse", (job, json_data))
+        except Exception as e:
+            job.fail(e)
+
+    # Stage 2: parsing, preprocessing and near-duplicate lookup, CPU bound
+    def parse_loop(self):
+        while True:
+            job, json_data = self.queues["parse"].get()
+            if job.future.done():
+                continue
+            try:
+                self.parse(job, json_data)
+            except Exception as e:
+                job.fail(e)
+            finally:
+                # Long-lived thread: drop connections the database closed or that broke
+                close_old_connections()
+
+    def parse(self, job, json_data):
+        contents = job.run(job.adobe.extract_information_from_json, json_data)
+        chunks = job.embeddings.build_chunks(contents, job.file_hash)
+        chunk_signatures = job.run(dedupe.signatures, chunks)
+        vectors, job.sources = job.run(dedupe.reuse_vectors, job.embeddings, chunks, chunk_signatures)
+        job.contents, job.json_data, job.chunks_total = contents, json_data, len(chunks)
+        job.signatures = {chunk[0]: signature for chunk, signature in zip(chunks, chunk_signatures)}
+        if not chunks:
+            job.finish()
+            return
+        reused = [idx for idx, vector in enumerate(vectors) if vector is not None]
+        if reused:
+            self.put("upsert", (job, [chunks[idx] for idx in reused],
+                                np.asarray([vectors[idx] for idx in reused], dtype=np.float32)))
+        pending = [chunk for chunk, vector in zip(chunks, vectors) if vector is None]
+        for start in range(0, len(pending), self.embed_batch):
+            self.put("embed", (job, pending[start:start + self.embed_batch]))
+
+    # Stage 3: embedding, coalescing queued batches of documents that share an index
+    def embed_loop(self):
+        while True:
+            batches = [self.queues["embed"].get()]
+            size = len(batches[0][1])
+            while size < self.embed_batch:
+                try:
+                    batches.append(self.queues["embed"].get_nowait())
+                except queue.Empty:
+                    break
+                size += len(batches[-1][1])
+            try:
+                self.embed(batches)
+            except Exception as e:
+                for job, _ in batches:
+                    job.fail(e)
+            finally:
+                close_old_connections()
+
+    def embed(self, batches):
+        groups = {}
+        for job, chunks in batches:
+            groups.setdefault(job.embeddings.index, []).append((job, chunks))
+        for group in groups.values():
+            live = [(job, chunks) for job, chunks in group if not job.future.done()]
+            if not live:
+                continue
+            texts = [content for _, chunks in live for _, content, _ in chunks]
+            try:
+                vectors = live[0][0].run(live[0][0].embeddings.encode_documents, texts, self.embed_batch)
+            except Exception as e:
+                # Only the documents of this group fail
+                for job, _ in live:
+                    job.fail(e)
+                continue
+            offset = 0
+            for job, chunks in live:
+                self.put("upsert", (job, chunks, vectors[offset:offset + len(chunks)]))
+                offset += len(chunks)
+
+    # Stage 4: upserts; ChromaDB has a single writer thread
+    def upsert_loop(self):
+        while True:
+            job, chunks, vectors = self.queues["upsert"].get()
+            if job.future.done():
+                continue
+            try:
+                self.upsert(job, chunks, vectors)
+            except Exception as e:
+                job.fail(e)
+            finally:
+                close_old_connections()
+
+    def upsert(self, job, chunks, vectors):
+        job.run(job.embeddings.store_chunks, chunks, vectors, None, self.upsert_batch)
+        job.run(dedupe.record, chunks, [job.signatures[chunk[0]] for chunk in chunks])
+
+        for (content_uid, _, metadata), embedding in zip(chunks, vectors):
+            job.output[content_uid] = [
+                {"key": metadata["key"], "value": metadata["value"], "embedding": embedding}
+            ]
+        with job.lock:
+            job.chunks_stored += len(chunks)
+            finished = job.chunks_stored == job.chunks_total
+            failed = job.future.done()
+        if failed:
+            # Failed (timed out) while this batch was stored
+            job.discard()
+        elif finished:
+            job.dedupe = dedupe.report(job.file_hash, job.sources)
+            metrics.increment("researchiq_chunks_total", job.chunks_total - job.dedupe["duplicate_chunks"],
+                              operation="embedded")
+            logger.info("Stored %d chunks for document %s", job.chunks_total, job.file_hash)
+            job.finish()
+
+
+metrics.REGISTRY.describe("researchiq_ingest_queue_depth", "Items waiting between ingestion stages.")
+
+INGESTOR = StreamingIngestor()
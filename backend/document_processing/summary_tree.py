@@ -0,0 +1,219 @@
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, connection
+
+from .embeddings import summmarizerHelper
+from .models import SummaryNode, content_hash
+
+logger = logging.getLogger(__name__)
+
+CHUNK, SECTION, GROUP, DOCUMENT = (SummaryNode.Level.CHUNK.value, SummaryNode.Level.SECTION.value,
+                                   SummaryNode.Level.GROUP.value, SummaryNode.Level.DOCUMENT.value)
+# Bump when the prompts change so that the nodes above the sections are summarized again
+SUMMARY_TREE_VERSION = 1
+
+DOCUMENT_PROMPT = """
+            You are an AI assistant specialized in creating concise and accurate summaries based exclusively on
+            the provided documents. Do not use any external information or personal knowledge beyond what is given below.
+            {summaries}
+            ### Task:
+            Please provide a comprehensive summary of the above documents.
+            Ensure that the summary captures all key points, main ideas, and essential details without introducing any information not present in the documents.
+            Strictly limit the summary to 2-3 paragraph depending on the prompt.
+
+            ### Summary:
+            """
+
+
+def section_content(section):
+    """The exact text a section summary is computed from."""
+    return section["key"] + " " + section["value"]
+
+
+def split_text(text, size):
+    """Split `text` into pieces of at most `size` characters, at whitespace where possible."""
+    pieces = []
+    while len(text) > size:
+        cut = text.rfind(" ", 0, size)
+        cut = cut if cut > 0 else size
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    return pieces + [text] if text or not pieces else pieces
+
+
+def parent_hash(level, child_hashes):
+    return content_hash(f"{SUMMARY_TREE_VERSION}|{level}|" + ",".join(child_hashes))
+
+
+def stored_summaries(level, hashes):
+    """Map content hash -> stored summary of the nodes of `level` with these hashes, in any document."""
+    return dict(SummaryNode.objects.filter(level=level, content_hash__in=hashes)
+                .values_list("content_hash", "summary"))
+
+
+def store_summary(document_uid, level, node_hash, summary, key=""):
+    try:
+        SummaryNode.objects.update_or_create(
+            document_uid=document_uid, level=level, content_hash=node_hash,
+            defaults={"key": key, "summary": summary},
+        )
+    except IntegrityError:
+        # Computed concurrently by a click and the background job; either copy is fine
+        pass
+
+
+class SummaryTree:
+    """
+    The persistent summary tree of one document: chunk summaries of long sections, section
+    summaries, group summaries of up to SUMMARY_TREE_FANOUT summaries, and the document
+    summary at the root.
+
+    The shape of the tree and the hash of every node follow from the section texts alone,
+    so the tree is resolved top down: a stored node is returned without looking at its
+    children, and a missing one summarizes its (resolved) children. After re-ingestion only
+    the changed sections and the nodes above them are summarized again; nodes with the same
+    content in another document (another version of the same paper) are copied. Children
+    are resolved concurrently, bounded by the process wide LLM budget. A tree without a
+    `document_uid` (sections sent as text) reuses stored nodes but stores none.
+    """
+
+    def __init__(self, document_uid, helper=None, background=False):
+        self.document_uid = document_uid
+        self.helper = helper or summmarizerHelper(document_uid, background=background)
+        self.lock = threading.Lock()
+        self.computed = 0
+        self.reused = 0
+
+    def count(self, computed):
+        with self.lock:
+            if computed:
+                self.computed += 1
+            else:
+                self.reused += 1
+
+    def node(self, level, node_hash, key, build, summarize=None):
+        """
+        The summary of one node: stored for this document, copied from another document, or
+        `summarize(build())`, where `build` returns the text to summarize.
+        """
+        stored = list(SummaryNode.objects.filter(level=level, content_hash=node_hash)
+                      .values_list("document_uid", "summary")[:2])
+        if stored:
+            if self.document_uid and all(document_uid != self.document_uid for document_uid, _ in stored):
+                store_summary(self.document_uid, level, node_hash, stored[0][1], key)
+            self.count(False)
+            return stored[0][1]
+
+        text = build()
+        summary = (summarize or self.summarize)(text)
+        if self.document_uid:
+            store_summary(self.document_uid, level, node_hash, summary, key)
+        self.count(True)
+        return summary
+
+    def summarize(self, text):
+        return self.helper.generate_response(text)["output"]
+
+    def summarize_document(self, summaries):
+        return self.helper.llm_response(DOCUMENT_PROMPT.format(summaries=summaries))["output"]
+
+    def resolve_all(self, resolvers):
+        """Run the resolvers of sibling nodes concurrently; returns their summaries in order."""
+        if len(resolvers) == 1:
+            return [resolvers[0]()]
+
+        def run(resolver):
+            try:
+                return resolver()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=min(getattr(settings, "LLM_MAX_CONCURRENCY", 4), len(resolvers)),
+                                thread_name_prefix="summary-tree") as pool:
+            # Each task runs in a copy of the request context so stage timings reach the response
+            futures = [pool.submit(contextvars.copy_context().run, run, resolver) for resolver in resolvers]
+            return [future.result() for future in futures]
+
+    def section_node(self, key, content):
+        """
+        Hash, resolver and (level, hash) keys of a section node, with chunk nodes below it if
+        the section is too long for one call (longer than SUMMARY_CHUNK_CHARS characters).
+        """
+        pieces = split_text(content, getattr(settings, "SUMMARY_CHUNK_CHARS", 15000))
+
+        def build():
+            if len(pieces) == 1:
+                return content
+            return " ".join(self.resolve_all([
+                lambda piece=piece: self.node(CHUNK, content_hash(piece), key, lambda: piece)
+                for piece in pieces]))
+
+        section_hash = content_hash(content)
+        hashes = {(SECTION, section_hash)}
+        if len(pieces) > 1:
+            hashes |= {(CHUNK, content_hash(piece)) for piece in pieces}
+        return section_hash, lambda: self.node(SECTION, section_hash, key, build), hashes
+
+    def section_summary(self, key, content):
+        """The title-wise summary of one section."""
+        _, resolver, _ = self.section_node(key, content)
+        return resolver()
+
+    def sections(self):
+        return self.helper.retrieve_all_heading()
+
+    def build_sections(self, sections=None):
+        """Resolve every section node (the background precomputation). Returns the number computed."""
+        sections = [s for s in (sections if sections is not None else self.sections()) if s["value"]]
+        if sections:
+            self.resolve_all([self.section_node(s["key"], section_content(s))[1] for s in sections])
+        return self.computed
+
+    def document_summary(self):
+        """
+        The document summary, resolved through the tree. Nodes of this document that are no
+        longer part of its tree are deleted afterwards.
+
+        Returns:
+            dict: The summary as `output`, with the numbers of nodes `computed` and `reused`,
+            or None if the document has no sections.
+        """
+        sections = self.sections()
+        if not sections:
+            return None
+
+        children, tree_hashes = [], set()
+        for section in sections:
+            section_hash, resolver, hashes = self.section_node(section["key"], section_content(section))
+            children.append((section_hash, resolver))
+            tree_hashes |= hashes
+
+        # Group summaries level by level until one call can combine them
+        fanout = getattr(settings, "SUMMARY_TREE_FANOUT", 8)
+        while len(children) > fanout:
+            groups = []
+            for start in range(0, len(children), fanout):
+                members = children[start:start + fanout]
+                group_hash = parent_hash(GROUP, [member_hash for member_hash, _ in members])
+                groups.append((group_hash, lambda group_hash=group_hash, members=members: self.node(
+                    GROUP, group_hash, "",
+                    lambda: " ".join(self.resolve_all([resolver for _, resolver in members])))))
+                tree_hashes.add((GROUP, group_hash))
+            children = groups
+
+        root_hash = parent_hash(DOCUMENT, [child_hash for child_hash, _ in children])
+        tree_hashes.add((DOCUMENT, root_hash))
+        summary = self.node(DOCUMENT, root_hash, "",
+                            lambda: " ".join(self.resolve_all([resolver for _, resolver in children])),
+                            self.summarize_document)
+
+        stale = [pk for pk, level, node_hash in SummaryNode.objects.filter(document_uid=self.document_uid)
+                 .values_list("pk", "level", "content_hash") if (level, node_hash) not in tree_hashes]
+        SummaryNode.objects.filter(pk__in=stale).delete()
+        logger.info("Document summary of %s: %d nodes computed, %d reused, %d stale removed",
+                    self.document_uid, self.computed, self.reused, len(stale))
+        return {'output': summary, 'computed': self.computed, 'reused': self.reused}
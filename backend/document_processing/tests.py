@@ -1,3 +1,1258 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import fitz
+import numpy as np
+import requests
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from . import apps, bulk_ingest, dedupe, index_versions, lifecycle, metrics, profiling, registry, streaming, summary_tree, utils, views
+from .benchmarks import ann
+from .benchmarks.fixtures import generate_structured_data
+from .benchmarks.runner import BenchmarkRunner, compare_with_baseline
+from .benchmarks.stubs import OfflineEncoder, OfflineGroq
+from .concurrency import LLMBudget
+from .context_selection import mmr_select, top_k_select
+from .embeddings import VectorEmbeddings
+from .extraction import PageRangeExtractor, merge_structured_data
+from .loadtest.fakes import FakeAdobeServer, FakeGroqServer
+from .loadtest.runner import summarize_samples
+from .local_index import LocalCollection, where_clause
+from .matrix_cache import DocumentMatrix, DocumentMatrixCache
+from .middleware import StageTimingMiddleware
+from .models import ChunkSignature, Document, IndexVersion, SummaryNode
+from .projections import DOCUMENT_FIELDS, SECTION_FIELDS, document_projection, paging, requested_fields, section_projection
+from .reduction import EmbeddingReducer, normalize, top_k_overlap
+from .renderers import NumpyRenderer
+from .vector_store import ann_params, save_ann_params
+
+VOCABULARY = [f"word{idx}" for idx in range(2000)]
+
+
+def random_text(rng, words=200):
+    return " ".join(rng.choice(VOCABULARY, words))
+
+
+def clustered_vectors(rng, count, dimension=32, clusters=8):
+    centers = rng.normal(size=(clusters, dimension))
+    return (centers[rng.integers(0, clusters, count)] + 0.1 * rng.normal(size=(count, dimension))).astype(np.float32)
+
+
+class LocalCollectionTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.collection = LocalCollection(directory, "test")
+        self.rng = np.random.default_rng(0)
+
+    def upsert(self, vectors, document_uid="doc", start=0):
+        ids = [f"{document_uid}_{start + idx}" for idx in range(len(vectors))]
+        self.collection.upsert(ids, vectors, [{"document_uid": document_uid, "key": str(idx)} for idx in ids],
+                               [f"text {content_uid}" for content_uid in ids])
+        return ids
+
+    def test_upsert_get_delete(self):
+        vectors = self.rng.normal(size=(5, 8)).astype(np.float32)
+        ids = self.upsert(vectors[:3], "a") + self.upsert(vectors[3:], "b")
+
+        results = self.collection.get(ids=ids[:2], include=["embeddings", "documents", "metadatas"])
+        self.assertEqual(results["ids"], ids[:2])
+        np.testing.assert_allclose(results["embeddings"], vectors[:2])
+        self.assertEqual(results["documents"], ["text a_0", "text a_1"])
+        self.assertEqual(results["metadatas"][1]["document_uid"], "a")
+        self.assertEqual(self.collection.get(where={"document_uid": "b"})["ids"], ids[3:])
+        self.assertEqual(len(self.collection.get(limit=2, offset=4)["ids"]), 1)
+
+        # Upserting an existing id replaces its vector
+        replacement = self.rng.normal(size=(1, 8)).astype(np.float32)
+        self.collection.upsert([ids[0]], replacement, [{"document_uid": "a"}], ["new"])
+        results = self.collection.get(ids=[ids[0]], include=["embeddings", "documents"])
+        np.testing.assert_allclose(results["embeddings"], replacement)
+        self.assertEqual(results["documents"], ["new"])
+        self.assertEqual(self.collection.count(), 5)
+
+        self.collection.delete(where={"document_uid": "a"})
+        self.assertEqual(self.collection.get()["ids"], ids[3:])
+        self.collection.delete(ids=[ids[3]])
+        self.assertEqual(self.collection.get()["ids"], ids[4:])
+
+    def test_rejects_other_dimensions(self):
+        self.upsert(self.rng.normal(size=(2, 8)))
+        with self.assertRaises(ValueError):
+            self.upsert(self.rng.normal(size=(2, 4)), start=2)
+
+    def test_where_clause(self):
+        self.assertEqual(where_clause(None), ("1", []))
+        self.assertEqual(where_clause({"$and": [{"document_uid": "a"}, {"key": {"$in": ["x", "y"]}}]}),
+                         ("(document_uid = ? AND key IN (?,?))", ["a", "x", "y"]))
+        # Other metadata fields are read from the JSON column
+        self.assertEqual(where_clause({"page": {"$gte": 2}}), ("json_extract(metadata, ?) >= ?", ['$."page"', 2]))
+        with self.assertRaises(ValueError):
+            where_clause({"key": {"$regex": "x"}})
+
+    def test_where_filters(self):
+        ids = [f"{document_uid}_{idx}" for document_uid in "ab" for idx in range(3)]
+        vectors = self.rng.normal(size=(6, 8)).astype(np.float32)
+        self.collection.upsert(ids, vectors, [{"document_uid": content_uid[0], "key": f"k{content_uid[-1]}",
+                                               "page": int(content_uid[-1])} for content_uid in ids], ids)
+
+        # The section lookup of `summmarizerHelper`
+        self.assertEqual(self.collection.get(where={"$and": [{"document_uid": "a"}, {"key": "k1"}]})["ids"], ["a_1"])
+        self.assertEqual(self.collection.get(where={"$or": [{"key": "k0"}, {"page": {"$gt": 1}}]})["ids"],
+                         ["a_0", "a_2", "b_0", "b_2"])
+        self.assertEqual(self.collection.get(where={"document_uid": {"$ne": "a"}, "page": {"$lt": 2}})["ids"],
+                         ["b_0", "b_1"])
+
+        results = self.collection.query(vectors[4:5], n_results=3,
+                                        where={"$and": [{"document_uid": "b"}, {"page": {"$nin": [0]}}]})
+        self.assertEqual(results["ids"], [["b_1", "b_2"]])
+        self.collection.delete(where={"$and": [{"document_uid": "b"}, {"key": {"$in": ["k0", "k2"]}}]})
+        self.assertEqual(self.collection.get(where={"document_uid": "b"})["ids"], ["b_1"])
+
+    def test_compact_reclaims_replaced_and_deleted_rows(self):
+        vectors = self.rng.normal(size=(10, 8)).astype(np.float32)
+        ids = self.upsert(vectors)
+        replaced = self.rng.normal(size=(3, 8)).astype(np.float32)
+        self.collection.upsert(ids[:3], replaced, [{"document_uid": "doc"}] * 3, ["x"] * 3)
+        self.collection.delete(ids=ids[8:])
+        self.assertEqual(self.collection.stats()["next_row"], 13)
+
+        self.assertTrue(self.collection.compact())
+        stats = self.collection.stats()
+        self.assertEqual((stats["count"], stats["next_row"], stats["generation"]), (8, 8, 1))
+        results = self.collection.get(include=["embeddings"])
+        # Replaced chunks were appended, so they come after the others
+        self.assertEqual(results["ids"], ids[3:8] + ids[:3])
+        np.testing.assert_allclose(results["embeddings"], np.vstack([vectors[3:8], replaced]))
+        self.assertFalse(self.collection.compact())
+
+    def test_ivf_query_matches_exact_search(self):
+        vectors = clustered_vectors(self.rng, 400)
+        ids = self.upsert(vectors)
+        queries = vectors[:20] + 0.01 * self.rng.normal(size=(20, vectors.shape[1])).astype(np.float32)
+        exact = self.collection.query(queries, n_results=5, include=["distances"])
+
+        self.assertEqual(self.collection.train(nlist=8), 8)
+        self.assertEqual(self.collection.stats()["nlist"], 8)
+        # Probing every list scans everything, so results match exact search
+        probed = self.collection.query(queries, n_results=5, include=["distances"], nprobe=8)
+        self.assertEqual(probed["ids"], exact["ids"])
+        np.testing.assert_allclose(probed["distances"], exact["distances"], atol=1e-5)
+        # A stored vector is filed under the list nearest to it, so one probe finds it
+        nearest = self.collection.query(vectors[:20], n_results=1, include=["distances"], nprobe=1)
+        self.assertEqual([found[0] for found in nearest["ids"]], ids[:20])
+        # Filtered queries ignore the lists
+        filtered = self.collection.query(queries[:1], n_results=3, where={"document_uid": "doc"}, nprobe=1)
+        self.assertEqual(filtered["ids"], [exact["ids"][0][:3]])
+
+        # Rows added after training are filed under a list too
+        added = self.upsert(vectors[:1] * 2, start=400)
+        self.assertCountEqual(self.collection.query(vectors[:1], n_results=2, nprobe=1)["ids"][0], [ids[0], added[0]])
+
+        self.assertEqual(self.collection.train(nlist=0), 0)
+        self.assertEqual(self.collection.query(queries, n_results=5, include=["distances"], nprobe=1)["ids"],
+                         self.collection.query(queries, n_results=5, include=["distances"], nprobe=8)["ids"])
+
+
+class LLMBudgetTests(SimpleTestCase):
+    def start(self, budget, background):
+        acquired = threading.Event()
+
+        def run():
+            budget.acquire(background)
+            acquired.set()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return acquired
+
+    def test_background_calls_are_limited(self):
+        budget = LLMBudget(3, background_limit=1)
+        budget.acquire(background=True)
+        waiting = self.start(budget, background=True)
+        self.assertFalse(waiting.wait(0.1))
+        # Interactive calls may still use the remaining slots
+        budget.acquire()
+        budget.release(background=True)
+        self.assertTrue(waiting.wait(1))
+        self.assertEqual((budget.in_use, budget.background_in_use), (2, 1))
+
+    def test_interactive_calls_go_first(self):
+        budget = LLMBudget(1, background_limit=1)
+        budget.acquire()
+        interactive = self.start(budget, background=False)
+        while not budget.interactive_waiting:
+            time.sleep(0.01)
+        background = self.start(budget, background=True)
+        budget.release()
+        self.assertTrue(interactive.wait(1))
+        self.assertFalse(background.wait(0.1))
+        budget.release()
+        self.assertTrue(background.wait(1))
+
+    def test_background_calls_start_once_interactive_calls_stop_waiting(self):
+        budget = LLMBudget(3, background_limit=1)
+        for _ in range(3):
+            budget.acquire()
+        interactive = self.start(budget, background=False)
+        while not budget.interactive_waiting:
+            time.sleep(0.01)
+        background = self.start(budget, background=True)
+        time.sleep(0.1)
+        # Free two slots at once: the interactive waiter takes one, the background one the other
+        with budget.condition:
+            budget.release()
+            budget.release()
+        self.assertTrue(interactive.wait(1))
+        self.assertTrue(background.wait(1))
+        self.assertEqual((budget.in_use, budget.background_in_use), (3, 1))
+
+
+class MatrixCacheTests(SimpleTestCase):
+    def entry(self, rows=4):
+        return DocumentMatrix([f"id{idx}" for idx in range(rows)], ["text"] * rows, np.ones((rows, 8)))
+
+    def test_evicts_least_recently_used(self):
+        size = self.entry().nbytes
+        cache = DocumentMatrixCache(max_bytes=2 * size)
+        cache.put("c", "a", self.entry())
+        cache.put("c", "b", self.entry())
+        self.assertIsNotNone(cache.get("c", "a"))
+        cache.put("c", "d", self.entry())
+        self.assertIsNone(cache.get("c", "b"))
+        self.assertIsNotNone(cache.get("c", "a"))
+        self.assertEqual(cache.stats()["bytes"], 2 * size)
+
+    def test_oversized_entries_are_not_cached(self):
+        cache = DocumentMatrixCache(max_bytes=10)
+        cache.put("c", "a", self.entry())
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_ttl_and_invalidate(self):
+        cache = DocumentMatrixCache(max_bytes=10 ** 6, ttl=60)
+        cache.put("c1", "a", self.entry())
+        cache.put("c2", "a", self.entry())
+        cache.put("c1", "b", self.entry())
+        cache.invalidate("a", "c1")
+        self.assertIsNone(cache.get("c1", "a"))
+        self.assertIsNotNone(cache.get("c2", "a"))
+        cache.invalidate("a")
+        self.assertIsNone(cache.get("c2", "a"))
+
+        cache.get("c1", "b").loaded_at -= 61
+        self.assertIsNone(cache.get("c1", "b"))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_matrix_is_normalized(self):
+        entry = DocumentMatrix(["x"], ["some text"], [[3.0, 4.0]])
+        np.testing.assert_allclose(entry.matrix, [[0.6, 0.8]], rtol=1e-6)
+        np.testing.assert_allclose(entry.scores(np.array([[1.0, 0.0]], dtype=np.float32)), [[0.6]], rtol=1e-6)
+
+
+class PageRangeExtractorTests(SimpleTestCase):
+    def test_reports_the_backend_that_ran(self):
+        with fitz.open() as document:
+            document.new_page().insert_text((72, 72), "A local extraction", fontsize=11)
+            pdf_bytes = document.tobytes()
+        json_data, version = PageRangeExtractor(backend="local").extract(io.BytesIO(pdf_bytes), None)
+        self.assertEqual([element["Text"] for element in json_data["elements"]], ["A local extraction"])
+        self.assertTrue(version.startswith("pymupdf"))
+        self.assertTrue(PageRangeExtractor(backend="adobe").version.startswith("pdfservices-sdk"))
+
+
+class RegistryTests(TestCase):
+    def test_lookup_only_returns_ready_documents(self):
+        ready = Document.objects.create(file_hash="a" * 64, status=Document.Status.READY, chunk_count=3)
+        Document.objects.create(file_hash="b" * 64, status=Document.Status.PROCESSING)
+        Document.objects.create(file_hash="c" * 64, status=Document.Status.FAILED, error="RuntimeError: down")
+        self.assertEqual(registry.lookup("a" * 64), ready)
+        self.assertIsNone(registry.lookup("b" * 64))
+        self.assertIsNone(registry.lookup("c" * 64))
+
+    def test_lookup_does_not_scan_the_vector_store(self):
+        with mock.patch.object(VectorEmbeddings, "get_collection") as get_collection, self.assertNumQueries(1):
+            self.assertIsNone(registry.lookup("d" * 64))
+        get_collection.assert_not_called()
+
+    def test_backfill_registers_stored_documents(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        collection = LocalCollection(directory, "test")
+        for document_uid, keys in (("a" * 64, ["Intro", "Method"]), ("e" * 64, ["Abstract"])):
+            ids = [f"{document_uid}_content{idx + 1}" for idx in range(len(keys))]
+            collection.upsert(ids, np.eye(len(keys), 4, dtype=np.float32),
+                              [{"document_uid": document_uid, "key": key, "ingested_at": 1e9} for key in keys],
+                              keys)
+        Document.objects.create(file_hash="a" * 64, status=Document.Status.READY, chunk_count=2)
+
+        with mock.patch.object(VectorEmbeddings, "get_collection", return_value=collection):
+            stored, registered = lifecycle.backfill_registry()
+        self.assertEqual((stored, registered), ({"a" * 64, "e" * 64}, 1))
+        document = registry.lookup("e" * 64)
+        self.assertEqual((document.chunk_count, document.title, document.created_at.year), (1, "Abstract", 2001))
+
+
+class MergeStructuredDataTests(SimpleTestCase):
+    def test_pages_are_shifted_and_range_titles_demoted(self):
+        parts = [
+            (2, {"elements": [{"Path": "//Document/Title", "Text": "Continued", "Page": 0},
+                              {"Path": "//Document/P", "Text": "c", "Page": 1}],
+                 "pages": [{"page_number": 0}, {"page_number": 1}]}),
+            (0, {"elements": [{"Path": "//Document/Title", "Text": "Paper", "Page": 0},
+                              {"Path": "//Document/P", "Text": "a", "Page": 1}],
+                 "pages": [{"page_number": 0}, {"page_number": 1}]}),
+        ]
+        merged = merge_structured_data(parts)
+        self.assertEqual([(e["Path"], e["Text"], e["Page"]) for e in merged["elements"]], [
+            ("//Document/Title", "Paper", 0), ("//Document/P", "a", 1),
+            ("//Document/H1", "Continued", 2), ("//Document/P", "c", 3)])
+        self.assertEqual([page["page_number"] for page in merged["pages"]], [0, 1, 2, 3])
+        # The parts themselves are left untouched
+        self.assertEqual(parts[0][1]["elements"][0]["Page"], 0)
+
+
+class ContextSelectionTests(SimpleTestCase):
+    def test_top_k(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.7])
+        self.assertEqual(top_k_select(scores, 2).tolist(), [1, 3])
+        self.assertEqual(top_k_select(scores, 10).tolist(), [1, 3, 2, 0])
+
+    def test_top_k_budget_skips_chunks_that_do_not_fit(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.7])
+        costs = np.array([10, 50, 10, 60])
+        self.assertEqual(top_k_select(scores, 3, costs, budget=70).tolist(), [1, 2, 0])
+        # The best chunk is taken even if it alone exceeds the budget
+        self.assertEqual(top_k_select(scores, 3, costs, budget=20).tolist(), [1])
+
+    def test_mmr_skips_near_duplicates(self):
+        matrix = normalize(np.array([[1.0, 0.0], [1.0, 0.01], [0.6, 0.8], [0.0, 1.0]], dtype=np.float32))
+        scores = np.array([0.9, 0.89, 0.6, 0.3], dtype=np.float32)
+        selected = mmr_select(scores, matrix, 3, lambda_=0.7, candidates=4, duplicate_threshold=0.95)
+        self.assertEqual(selected.tolist()[0], 0)
+        self.assertNotIn(1, selected.tolist())
+        self.assertEqual(sorted(selected.tolist()), [0, 2, 3])
+
+    def test_mmr_without_diversity_is_top_k(self):
+        matrix = normalize(np.random.default_rng(0).normal(size=(30, 8)).astype(np.float32))
+        scores = np.random.default_rng(1).random(30).astype(np.float32)
+        selected = mmr_select(scores, matrix, 5, lambda_=1.0, candidates=30, duplicate_threshold=2.0)
+        self.assertEqual(selected.tolist(), top_k_select(scores, 5).tolist())
+
+    def test_mmr_budget(self):
+        matrix = normalize(np.eye(4, dtype=np.float32))
+        scores = np.array([0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+        costs = np.array([40, 70, 30, 20])
+        selected = mmr_select(scores, matrix, 4, candidates=4, costs=costs, budget=100)
+        self.assertEqual(selected.tolist(), [0, 2, 3])
+        self.assertLessEqual(costs[selected].sum(), 100)
+        self.assertEqual(mmr_select(np.zeros(0), np.zeros((0, 4)), 3).tolist(), [])
+
+
+class ReductionTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # 16 informative dimensions embedded in 64
+        self.vectors = (rng.normal(size=(500, 16)) @ rng.normal(size=(16, 64))
+                        + 0.01 * rng.normal(size=(500, 64))).astype(np.float32)
+
+    def test_pca_preserves_neighbours(self):
+        reducer = EmbeddingReducer.fit("pca", 16, self.vectors)
+        reduced = reducer.apply(self.vectors)
+        self.assertEqual(reduced.shape, (500, 16))
+        self.assertEqual(reduced.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1.0, rtol=1e-5)
+        self.assertGreater(top_k_overlap(self.vectors, self.vectors, reducer, 10, exclude_self=True), 0.95)
+
+    def test_serialization(self):
+        reducer = EmbeddingReducer.fit("pca", 16, self.vectors)
+        restored = EmbeddingReducer.from_bytes("pca", 16, reducer.to_bytes())
+        np.testing.assert_allclose(restored.apply(self.vectors[:10]), reducer.apply(self.vectors[:10]))
+        self.assertEqual(EmbeddingReducer.fit("truncate", 8, self.vectors).to_bytes(), b"")
+
+    def test_truncate(self):
+        reducer = EmbeddingReducer.fit("truncate", 8, self.vectors)
+        np.testing.assert_allclose(reducer.apply(self.vectors), normalize(self.vectors[:, :8]), rtol=1e-5)
+
+    def test_invalid_reductions(self):
+        with self.assertRaises(ValueError):
+            EmbeddingReducer.fit("pca", 64, self.vectors)
+        with self.assertRaises(ValueError):
+            EmbeddingReducer.fit("pca", 32, self.vectors[:10])
+        with self.assertRaises(ValueError):
+            EmbeddingReducer("svd", 8)
+
+
+class DedupeTests(TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_signatures(self):
+        self.assertIsNone(dedupe.minhash("too short to compare"))
+        text = random_text(self.rng)
+        words = text.split()
+        near = " ".join(words[:100] + ["changed"] + words[101:])
+        self.assertEqual(dedupe.similarity(dedupe.minhash(text), dedupe.minhash(text)), 1.0)
+        self.assertGreater(dedupe.similarity(dedupe.minhash(text), dedupe.minhash(near)), 0.9)
+        self.assertLess(dedupe.similarity(dedupe.minhash(text), dedupe.minhash(random_text(self.rng))), 0.2)
+        self.assertEqual(len(dedupe.buckets(dedupe.minhash(text))), dedupe.BANDS)
+
+    def test_find_duplicates_across_documents(self):
+        texts = [random_text(self.rng) for _ in range(3)]
+        stored = [(f"old_{idx}", text, {"document_uid": "old"}) for idx, text in enumerate(texts)]
+        dedupe.record(stored, [dedupe.minhash(text) for text in texts])
+
+        words = texts[0].split()
+        chunks = [
+            ("new_0", " ".join(words[:100] + ["changed"] + words[101:]), {"document_uid": "new"}),
+            ("new_1", random_text(self.rng), {"document_uid": "new"}),
+            ("new_2", "a short heading", {"document_uid": "new"}),
+        ]
+        matches = dedupe.find_duplicates(chunks, [dedupe.minhash(content) for _, content, _ in chunks])
+        self.assertEqual(matches[0][:2], ("old_0", "old"))
+        self.assertEqual(matches[1:], [None, None])
+
+        # Chunks of the same document never match each other
+        same = [("old_9", texts[1], {"document_uid": "old"})]
+        self.assertEqual(dedupe.find_duplicates(same, [dedupe.minhash(texts[1])]), [None])
+
+    def test_version_source(self):
+        self.assertEqual(dedupe.version_source(["old", "old", None, "other"]), "old")
+        self.assertEqual(dedupe.version_source(["old", None, None, "other"]), "")
+        self.assertEqual(dedupe.version_source([None, None]), "")
+
+
+class OfflineIndex:
+    reducer = None
+
+
+class OfflineEmbeddings(VectorEmbeddings):
+    """
+    VectorEmbeddings with the offline encoder, storing into `collection` and recording the
+    upserted chunk ids in `stored`.
+    """
+
+    def __init__(self, index, stored, collection, upsert_gate=None):
+        super().__init__(index)
+        self._embedding_model = OfflineEncoder(dimension=16)
+        self.stored = stored
+        self.collection = collection
+        self.upsert_gate = upsert_gate
+        self.encoded = 0
+
+    def get_collection(self, collection_name=None):
+        return self.collection
+
+    def encode_documents(self, documents, batch_size=32, reduce=True):
+        self.encoded += 1
+        return super().encode_documents(documents, batch_size, reduce)
+
+    def store_chunks(self, chunks, embeddings, collection_name=None, batch_size=500):
+        if self.upsert_gate is not None:
+            self.upsert_gate.wait(5)
+        self.stored.extend(content_uid for content_uid, _, _ in chunks)
+        super().store_chunks(chunks, embeddings, collection_name, batch_size)
+
+
+class OfflineAdobe:
+    def extract_information_from_json(self, json_data):
+        return json_data["sections"]
+
+
+class StreamingIngestorTests(TransactionTestCase):
+    def setUp(self):
+        self.index = OfflineIndex()
+        self.stored = []
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.collection = LocalCollection(directory, "test")
+        self.gates = {}
+        patcher = mock.patch.object(streaming, "EXTRACTOR")
+        patcher.start().extract.side_effect = self.extract
+        self.addCleanup(patcher.stop)
+
+    def extract(self, file, adobe):
+        if file["name"] in self.gates:
+            self.gates[file["name"]].wait(5)
+        return file, "offline/1"
+
+    def document(self, name, sections=3):
+        return {"name": name, "sections": {f"{name} heading {idx}": f"{name} text {idx}" for idx in range(sections)}}
+
+    def embeddings(self, upsert_gate=None):
+        return OfflineEmbeddings(self.index, self.stored, self.collection, upsert_gate)
+
+    def submit(self, ingestor, name, sections=3, embeddings=None):
+        embeddings = embeddings or self.embeddings()
+        return ingestor.submit(self.document(name, sections), name, embeddings, OfflineAdobe())
+
+    def test_documents_overlap(self):
+        ingestor = streaming.StreamingIngestor(extract_workers=2)
+        self.gates["slow"] = threading.Event()
+        slow = self.submit(ingestor, "slow")
+        fast = self.submit(ingestor, "fast")
+        # The second document goes through every stage while the first is still extracting
+        output, contents, _, extractor_version, dedupe_report = fast.result(5)
+        self.assertFalse(slow.done())
+        self.assertEqual(sorted(key for key in output if key != "document_uid"),
+                         [f"fast_content{idx}" for idx in range(1, 4)])
+        self.assertEqual(output["fast_content1"][0]["embedding"].shape, (16,))
+        self.assertEqual((len(contents), extractor_version), (3, "offline/1"))
+        self.assertEqual(dedupe_report, {"duplicate_chunks": 0, "version_of": ""})
+
+        self.gates["slow"].set()
+        self.assertEqual(len(slow.result(5)[0]), 4)
+        self.assertEqual(len(self.stored), 6)
+
+    def test_full_queues_hold_back_earlier_stages(self):
+        ingestor = streaming.StreamingIngestor(queue_size=1, embed_batch=1, upsert_batch=1)
+        gate = threading.Event()
+        embeddings = self.embeddings(upsert_gate=gate)
+        future = self.submit(ingestor, "big", sections=20, embeddings=embeddings)
+        time.sleep(0.3)
+        # One batch in each queue, one being upserted and one waiting to be queued: the rest
+        # of the document is held back until the upserts move again
+        self.assertLessEqual(embeddings.encoded, 3)
+        self.assertTrue(all(stage.qsize() <= 1 for stage in ingestor.queues.values()))
+        self.assertFalse(future.done())
+
+        gate.set()
+        self.assertEqual(len(future.result(5)[0]), 21)
+        self.assertEqual(embeddings.encoded, 20)
+
+    def test_stage_errors_fail_the_document_only(self):
+        ingestor = streaming.StreamingIngestor()
+        broken = self.embeddings()
+        broken.encode_documents = mock.Mock(side_effect=RuntimeError("encoder down"))
+        with self.assertRaisesRegex(RuntimeError, "encoder down"):
+            self.submit(ingestor, "first", embeddings=broken).result(5)
+
+        # Errors after the last upsert used to stop the upsert thread
+        with mock.patch.object(streaming.dedupe, "report", side_effect=RuntimeError("database is locked")):
+            with self.assertRaisesRegex(RuntimeError, "database is locked"):
+                self.submit(ingestor, "second").result(5)
+
+        output = ingestor.ingest(self.document("third"), "third", self.embeddings(),
+                                 OfflineAdobe(), timeout=5)[0]
+        self.assertEqual(len(output), 4)
+        self.assertTrue(ingestor.alive())
+
+    def test_failed_documents_leave_no_chunks(self):
+        ingestor = streaming.StreamingIngestor(embed_batch=1, upsert_batch=1)
+        # Every chunk is stored, then the document fails
+        with mock.patch.object(streaming.dedupe, "report", side_effect=RuntimeError("database is locked")):
+            with self.assertRaises(RuntimeError):
+                self.submit(ingestor, "failed").result(5)
+        self.assertEqual(len(self.stored), 3)
+        self.assertEqual(self.collection.get(where={"document_uid": "failed"}, include=[])["ids"], [])
+
+        self.submit(ingestor, "kept").result(5)
+        self.assertEqual(len(self.collection.get(where={"document_uid": "kept"}, include=[])["ids"]), 3)
+
+    def test_ingest_times_out(self):
+        ingestor = streaming.StreamingIngestor()
+        self.gates["stuck"] = threading.Event()
+        self.addCleanup(self.gates["stuck"].set)
+        with self.assertRaises(TimeoutError):
+            ingestor.ingest(self.document("stuck"), "stuck", self.embeddings(),
+                            OfflineAdobe(), timeout=0.2, poll_interval=0.05)
+
+
+class OfflineSummarizer:
+    """Stands in for summmarizerHelper: serves `sections` and counts LLM calls."""
+
+    def __init__(self, sections):
+        self.sections = sections
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def retrieve_all_heading(self):
+        return self.sections
+
+    def llm_response(self, prompt):
+        with self.lock:
+            self.calls += 1
+        return {"output": f"summary {self.calls}", "prompt": prompt}
+
+    def generate_response(self, prompt):
+        return self.llm_response(prompt)
+
+
+# Children are resolved in worker threads, which need to see committed rows
+@override_settings(LLM_MAX_CONCURRENCY=1, SUMMARY_TREE_FANOUT=2)
+class SummaryTreeTests(TransactionTestCase):
+    def sections(self, count, changed=()):
+        return [{"key": f"Section {idx}", "value": f"text of section {idx}" + (" v2" if idx in changed else "")}
+                for idx in range(count)]
+
+    def summarize(self, sections, document_uid="doc"):
+        helper = OfflineSummarizer(sections)
+        output = summary_tree.SummaryTree(document_uid, helper=helper).document_summary()
+        return output, helper.calls
+
+    def test_nodes_are_reused_after_reingest(self):
+        # 4 sections, 2 groups and the root
+        output, calls = self.summarize(self.sections(4))
+        self.assertEqual((output["computed"], output["reused"], calls), (7, 0, 7))
+        self.assertEqual(SummaryNode.objects.filter(document_uid="doc").count(), 7)
+
+        # Unchanged: the stored root is returned
+        output, calls = self.summarize(self.sections(4))
+        self.assertEqual((output["computed"], output["reused"], calls), (0, 1, 0))
+
+        # One changed section: it, its group and the root are summarized again
+        output, calls = self.summarize(self.sections(4, changed={3}))
+        self.assertEqual((output["computed"], output["reused"], calls), (3, 2, 3))
+
+    def test_stale_nodes_are_deleted(self):
+        self.summarize(self.sections(4))
+        self.summarize(self.sections(4, changed={3}))
+        # The old section 3, its group and the old root are gone
+        self.assertEqual(SummaryNode.objects.filter(document_uid="doc").count(), 7)
+        self.assertFalse(SummaryNode.objects.filter(
+            document_uid="doc", level=SummaryNode.Level.SECTION,
+            content_hash=summary_tree.content_hash(summary_tree.section_content(self.sections(4)[3]))).exists())
+
+    def test_other_documents_copy_stored_nodes(self):
+        self.summarize(self.sections(4))
+        output, calls = self.summarize(self.sections(4), document_uid="copy")
+        self.assertEqual((output["reused"], calls), (1, 0))
+        self.assertEqual(SummaryNode.objects.filter(document_uid="copy").count(), 1)
+
+    def test_document_without_sections(self):
+        self.assertEqual(self.summarize([]), (None, 0))
+        with mock.patch.object(views, "SummaryTree",
+                               lambda document_uid: summary_tree.SummaryTree(document_uid, OfflineSummarizer([]))):
+            response = self.client.post("/document_processing/summary/", {"document_uid": "missing"})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("error", response.json())
+
+
+class IndexMigratorTests(TransactionTestCase):
+    # The switch forgets the cached active version on commit
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        overrides = self.settings(VECTOR_STORE="local", VECTOR_STORE_PATH=directory, EMBEDDING_MODEL_NAME="offline-a",
+                                  EMBEDDING_REDUCTION="none")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for patcher in (mock.patch("document_processing.embeddings.load_embedding_model",
+                                   lambda name: OfflineEncoder(dimension=16)),
+                        mock.patch.object(index_versions, "ACTIVE_INDEX_TTL", 0)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        index_versions.forget_active_index()
+        self.addCleanup(index_versions.forget_active_index)
+        self.migrator = index_versions.IndexMigrator(log=lambda message: None)
+
+    def ingest(self, embeddings, file_hash, sections=3):
+        contents = {f"{file_hash} heading {idx}": f"{file_hash} text {idx}" for idx in range(sections)}
+        embeddings.embedding_creation(contents, file_hash)
+        registry.mark_ready(file_hash, sections, embedding_model=embeddings.index.embedding_model)
+
+    def chunks(self, spec, file_hash):
+        return VectorEmbeddings(index=spec).get_collection().get(where={"document_uid": file_hash}, include=[])["ids"]
+
+    def test_run_copies_then_reembeds_on_model_change(self):
+        self.ingest(VectorEmbeddings(), "a")
+
+        # Same model: the vectors of the default collection are reused
+        report = self.migrator.run()
+        self.assertEqual((report["previous"], report["chunks_embedded"], report["chunks_reused"]), (None, 0, 3))
+        self.assertIsNone(self.migrator.run())
+
+        with self.settings(EMBEDDING_MODEL_NAME="offline-b"):
+            report = self.migrator.run()
+            active = index_versions.active_version()
+            self.assertEqual((active.key, active.embedding_model), (index_versions.configured_key(), "offline-b"))
+        self.assertEqual((report["chunks_embedded"], report["chunks_reused"]), (3, 0))
+        self.assertEqual(len(self.chunks(index_versions.spec_of(active), "a")), 3)
+        self.assertEqual(Document.objects.get(file_hash="a").embedding_model, "offline-b")
+        self.assertEqual(IndexVersion.objects.filter(status=IndexVersion.Status.RETIRED).count(), 1)
+
+    def test_catch_up_migrates_documents_ready_after_the_copy(self):
+        self.migrator.run()
+        previous = index_versions.active_index()
+        with self.settings(EMBEDDING_MODEL_NAME="offline-b"):
+            version = self.migrator.target()
+            source, target = VectorEmbeddings(index=previous), VectorEmbeddings(index=index_versions.spec_of(version))
+            self.migrator.migrate_pending(version, source, target, same_model=False)
+            self.migrator.activate(version)
+            # Ingested into the previous version while the switch happened
+            self.ingest(source, "late")
+            self.migrator.catch_up(version, source, target, same_model=False, poll=0)
+        self.assertEqual(len(self.chunks(target.index, "late")), 3)
+
+    def test_ingests_that_outlast_the_catch_up_follow_the_switch(self):
+        self.migrator.run()
+        pinned = VectorEmbeddings(index=index_versions.active_index())
+        self.assertEqual(index_versions.follow_active_version(pinned, "slow"), pinned.index)
+
+        with self.settings(EMBEDDING_MODEL_NAME="offline-b"):
+            self.migrator.run()
+        self.ingest(pinned, "slow")
+        spec = index_versions.follow_active_version(pinned, "slow")
+        self.assertEqual(spec.embedding_model, "offline-b")
+        self.assertEqual(len(self.chunks(spec, "slow")), 3)
+
+
+class LifecycleTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.collection = LocalCollection(os.path.join(self.directory, "store"), "test")
+        artifacts = os.path.join(self.directory, "artifacts")
+        os.makedirs(artifacts)
+        for patcher in (mock.patch.object(VectorEmbeddings, "get_collection", return_value=self.collection),
+                        mock.patch.object(lifecycle, "ARTIFACT_DIR", artifacts),
+                        mock.patch.object(lifecycle, "DATABASE_DIR", os.path.join(self.directory, "store"))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def store(self, document_uid, chunks, register=True):
+        ids = [f"{document_uid}_content{idx + 1}" for idx in range(chunks)]
+        self.collection.upsert(ids, np.eye(chunks, 4, dtype=np.float32),
+                               [{"document_uid": document_uid, "key": f"key {idx}"} for idx in ids], ids)
+        SummaryNode.objects.create(document_uid=document_uid, level=SummaryNode.Level.SECTION,
+                                   content_hash=document_uid, summary="summary")
+        ChunkSignature.objects.create(content_uid=ids[0], document_uid=document_uid, content_hash="x", signature=b"")
+        if register:
+            return Document.objects.create(file_hash=document_uid, status=Document.Status.READY, chunk_count=chunks)
+
+    def test_delete_document(self):
+        self.store("a", 3)
+        self.store("b", 2)
+        self.assertEqual(lifecycle.delete_document("a"), 3)
+        self.assertEqual(self.collection.get()["ids"], ["b_content1", "b_content2"])
+        self.assertEqual(list(Document.objects.values_list("file_hash", flat=True)), ["b"])
+        self.assertEqual(set(SummaryNode.objects.values_list("document_uid", flat=True)), {"b"})
+        self.assertEqual(set(ChunkSignature.objects.values_list("document_uid", flat=True)), {"b"})
+
+        # Registered without chunks, and unknown
+        Document.objects.create(file_hash="c", status=Document.Status.FAILED)
+        self.assertEqual(lifecycle.delete_document("c"), 1)
+        self.assertEqual(lifecycle.delete_document("missing"), 0)
+
+    def test_expire_document(self):
+        self.store("a", 1)
+        expires_at = lifecycle.expire_document("a", 60)
+        self.assertAlmostEqual((expires_at - timezone.now()).total_seconds(), 60, delta=5)
+        self.assertEqual(Document.objects.get(file_hash="a").expires_at, expires_at)
+        Document.objects.create(file_hash="b", status=Document.Status.PROCESSING)
+        self.assertIsNone(lifecycle.expire_document("b", 60))
+        self.assertIsNone(lifecycle.expire_document("missing", 60))
+
+    def test_run_once(self):
+        expired = self.store("expired", 2)
+        expired.expires_at = timezone.now() - timedelta(seconds=1)
+        expired.save()
+        self.store("kept", 2)
+        self.store("legacy", 1, register=False)
+        Document.objects.create(file_hash="gone", status=Document.Status.READY, chunk_count=4)
+        # Still being ingested: never expired
+        Document.objects.create(file_hash="ingesting", status=Document.Status.PROCESSING,
+                                expires_at=timezone.now() - timedelta(seconds=1))
+        SummaryNode.objects.create(document_uid="deleted", level=SummaryNode.Level.DOCUMENT,
+                                   content_hash="x", summary="summary")
+        self.collection.upsert(["stray"], np.ones((1, 4), dtype=np.float32), [{"document_uid": "kept"}], ["stray"])
+        old, new = os.path.join(lifecycle.ARTIFACT_DIR, "old.zip"), os.path.join(lifecycle.ARTIFACT_DIR, "new.zip")
+        for path in (old, new):
+            with open(path, "wb") as f:
+                f.write(b"zip")
+        os.utime(old, (time.time() - 48 * 3600,) * 2)
+
+        report = lifecycle.StorageCompactor(retention_days=0, artifact_retention_hours=24).run_once(vacuum=False)
+        self.assertEqual(report["expired_documents"], ["expired"])
+        self.assertEqual(report["deleted_chunks"], 2)
+        self.assertEqual(report["orphan_chunks"], 1)
+        self.assertEqual(report["dropped_registry_entries"], 1)
+        self.assertEqual((report["orphan_summaries"], report["orphan_signatures"]), (1, 0))
+        self.assertEqual((report["artifacts_removed"], report["artifact_bytes_removed"]), (1, 3))
+        # Unregistered documents are kept but only registered by `backfill_registry`
+        self.assertEqual(set(Document.objects.values_list("file_hash", flat=True)), {"kept", "ingesting"})
+        self.assertEqual(sorted(self.collection.get()["ids"]),
+                         ["kept_content1", "kept_content2", "legacy_content1"])
+        self.assertEqual(os.listdir(lifecycle.ARTIFACT_DIR), ["new.zip"])
+
+    def test_background_jobs_need_the_setting(self):
+        cases = [(["gunicorn", "backend.wsgi"], {}, True),
+                 (["manage.py", "runserver"], {"RUN_MAIN": "true"}, True),
+                 (["manage.py", "runserver"], {}, False),
+                 (["manage.py", "runserver", "--noreload"], {}, True),
+                 (["manage.py", "compact_storage"], {}, True)]
+        for argv, environ, expected in cases:
+            with mock.patch("sys.argv", argv), mock.patch.dict(os.environ, environ):
+                if "RUN_MAIN" not in environ:
+                    os.environ.pop("RUN_MAIN", None)
+                with self.settings(BACKGROUND_JOBS_ENABLED=True):
+                    self.assertEqual(apps.background_jobs_enabled(), expected, argv)
+                with self.settings(BACKGROUND_JOBS_ENABLED=False):
+                    self.assertFalse(apps.background_jobs_enabled(), argv)
+
+
+class BenchmarkTests(SimpleTestCase):
+    def result(self, case, p50_ms, throughput, size=10):
+        return {"case": case, "size": size, "p50_ms": p50_ms, "throughput_per_s": throughput}
+
+    def test_compare_with_baseline(self):
+        baseline = {"results": [self.result("steady", 10.0, 100.0), self.result("slower", 10.0, 100.0),
+                                self.result("fewer", 10.0, 100.0), {"case": "broken", "size": 10, "error": "x"}]}
+        results = [self.result("steady", 11.0, 95.0), self.result("slower", 13.0, 100.0),
+                   self.result("fewer", 10.0, 70.0), self.result("broken", 1.0, 1.0), self.result("new", 1.0, 1.0)]
+        comparison = {entry["case"]: entry for entry in compare_with_baseline(results, baseline, tolerance=0.2)}
+        # Cases missing from either report, or failed in the baseline, are not compared
+        self.assertEqual(set(comparison), {"steady", "slower", "fewer"})
+        self.assertEqual({case: entry["regression"] for case, entry in comparison.items()},
+                         {"steady": False, "slower": True, "fewer": True})
+        self.assertEqual((comparison["slower"]["p50_change"], comparison["fewer"]["throughput_change"]), (0.3, -0.3))
+
+    def test_failed_cases_are_reported(self):
+        runner = BenchmarkRunner(repeat=2, warmup=0, log=lambda line: None)
+        result = runner.measure("broken", 1, 1, lambda: 1 / 0)
+        self.assertEqual(result["error"], "ZeroDivisionError: division by zero")
+        result = runner.measure("working", 1, 4, lambda: None)
+        self.assertEqual((result["runs"], result["items"]), (2, 4))
+        self.assertEqual(len(runner.results), 2)
+
+    def test_offline_stand_ins_are_repeatable(self):
+        self.assertEqual(generate_structured_data(50, seed=3), generate_structured_data(50, seed=3))
+        self.assertEqual(len(generate_structured_data(50)["elements"]), 50)
+
+        encoder = OfflineEncoder(dimension=32)
+        vectors = encoder.encode(["the same text", "the same text", "other words"])
+        np.testing.assert_allclose(vectors[0], vectors[1])
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+
+        groq = OfflineGroq(reply_words=3)
+        reply = groq.chat.completions.create(messages=[{"role": "user", "content": "one two three four"}])
+        self.assertEqual((reply.choices[0].message.content, groq.calls), ("one two three", 1))
+
+
+class MetricsTests(TestCase):
+    def test_render(self):
+        store = metrics.MetricsRegistry(buckets=(0.1, 1.0))
+        store.describe("calls_total", "Calls.")
+        store.inc("calls_total", 2, kind="a")
+        store.observe("duration_seconds", 0.05, stage="x")
+        store.observe("duration_seconds", 2.0, stage="x")
+        lines = store.render().splitlines()
+        self.assertEqual(lines[:3], ["# HELP calls_total Calls.", "# TYPE calls_total counter", 'calls_total{kind="a"} 2'])
+        self.assertIn('duration_seconds_bucket{stage="x",le="1.0"} 1', lines)
+        self.assertIn('duration_seconds_bucket{stage="x",le="+Inf"} 2', lines)
+        self.assertIn('duration_seconds_count{stage="x"} 2', lines)
+
+    def test_stages_are_recorded_on_the_request(self):
+        @metrics.timed("embedding")
+        def embed():
+            pass
+
+        timings, token = metrics.start_request()
+        try:
+            embed()
+            with metrics.stage("embedding"):
+                pass
+            with metrics.stage("retrieval"):
+                pass
+        finally:
+            metrics.end_request(token)
+        self.assertEqual(set(timings), {"embedding", "retrieval"})
+        # Outside a request, stages only reach the registry
+        with metrics.stage("embedding"):
+            pass
+        self.assertEqual(set(timings), {"embedding", "retrieval"})
+
+    def test_server_timing_header(self):
+        def view(request):
+            metrics.record("embedding", 0.012)
+            return HttpResponse()
+
+        response = StageTimingMiddleware(view)(RequestFactory().get("/"))
+        entries = response["Server-Timing"].split(", ")
+        self.assertEqual(entries[0], "embedding;dur=12.0")
+        self.assertTrue(entries[-1].startswith("total;dur="))
+
+    def test_metrics_endpoint(self):
+        self.client.get("/document_processing/metrics/")
+        response = self.client.get("/document_processing/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertIn(f'{metrics.REQUEST_DURATION}_count{{method="GET",route="document_processing/metrics/",status="200"}}',
+                      response.content.decode())
+
+
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_rate_limiter(self):
+        limiter = profiling.ProfileRateLimiter(max_per_minute=2)
+        self.assertTrue(limiter.acquire())
+        # One profile at a time
+        self.assertFalse(limiter.acquire())
+        limiter.release()
+        self.assertTrue(limiter.acquire())
+        limiter.release()
+        self.assertFalse(limiter.acquire())
+
+    def test_document_uid_tags(self):
+        request = RequestFactory().get("/")
+        uid = "a" * 64
+        self.assertEqual(profiling.document_uid_for(request, mock.Mock(data={"document_uid": uid})), uid)
+        self.assertEqual(profiling.document_uid_for(request, mock.Mock(data={"document_uid": "../../x"})), "untagged")
+        self.assertEqual(profiling.document_uid_for(request, HttpResponse()), "untagged")
+
+    def test_only_admin_requests_are_profiled(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_MODE="cprofile", PROFILING_DIR=self.directory,
+                           ADMIN_API_TOKEN="secret"):
+            middleware = profiling.RequestProfilingMiddleware(lambda request: HttpResponse("ok"))
+            response = middleware(RequestFactory().get("/document_processing/qna/", HTTP_X_PROFILE="1"))
+            self.assertNotIn("X-Profile-Id", response)
+
+            response = middleware(RequestFactory().get("/document_processing/qna/", HTTP_X_PROFILE="1",
+                                                       HTTP_X_ADMIN_TOKEN="secret"))
+        self.assertTrue(response["X-Profile-Id"].startswith("untagged_document_processing_qna_"))
+        self.assertEqual(os.listdir(self.directory), [response["X-Profile-Id"]])
+
+    def test_disabled_by_default(self):
+        with self.settings(PROFILING_ENABLED=False, PROFILING_SAMPLE_RATE=1.0, PROFILING_DIR=self.directory):
+            response = profiling.RequestProfilingMiddleware(lambda request: HttpResponse("ok"))(
+                RequestFactory().get("/"))
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class DocumentExistsTests(TestCase):
+    url = "/document_processing/file/exists/"
+
+    def test_negotiation(self):
+        ready, processing = "a" * 64, "b" * 64
+        Document.objects.create(file_hash=ready, status=Document.Status.READY, chunk_count=3, title="Paper")
+        Document.objects.create(file_hash=processing, status=Document.Status.PROCESSING)
+
+        response = self.client.post(self.url, {"file_hash": ready.upper()})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["exists"], body["document_uid"]), (True, ready))
+        self.assertEqual((body["summary"]["title"], body["summary"]["chunk_count"]), ("Paper", 3))
+
+        # Unknown and unfinished documents have to be uploaded
+        for file_hash in (processing, "c" * 64):
+            self.assertFalse(self.client.post(self.url, {"file_hash": file_hash}).json()["exists"])
+
+    def test_invalid_hash(self):
+        for file_hash in ("", "not a hash", "a" * 63, "g" * 64):
+            self.assertEqual(self.client.post(self.url, {"file_hash": file_hash}).status_code, 400)
+
+
+class BulkIngestTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def write(self, name, content=""):
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        with open(self.path(name), "w") as f:
+            f.write(content)
+        return self.path(name)
+
+    def test_discover(self):
+        for name in ("corpus/b.pdf", "corpus/nested/a.PDF", "corpus/notes.txt"):
+            self.write(name)
+        self.assertEqual(bulk_ingest.discover(self.path("corpus")),
+                         [self.path("corpus", "b.pdf"), self.path("corpus", "nested", "a.PDF")])
+
+        manifest = self.write("manifest.txt", "# papers\ncorpus/b.pdf\n\n/data/other.pdf\n")
+        self.assertEqual(bulk_ingest.discover(manifest), [self.path("corpus/b.pdf"), "/data/other.pdf"])
+        manifest = self.write("manifest.json", '["corpus/b.pdf", "/data/other.pdf"]')
+        self.assertEqual(bulk_ingest.discover(manifest), [self.path("corpus/b.pdf"), "/data/other.pdf"])
+
+    def test_checkpoint_resumes_finished_files_only(self):
+        checkpoint = bulk_ingest.Checkpoint(self.path("checkpoint.jsonl"))
+        checkpoint.record("a.pdf", "done", file_hash="a", chunks=3)
+        checkpoint.record("b.pdf", "skipped", file_hash="b")
+        checkpoint.record("c.pdf", "failed", error="RuntimeError: boom")
+        self.assertEqual(set(checkpoint.finished), {"a.pdf", "b.pdf"})
+
+        resumed = bulk_ingest.Checkpoint(self.path("checkpoint.jsonl"))
+        self.assertEqual(resumed.finished["a.pdf"], {"path": "a.pdf", "status": "done", "file_hash": "a", "chunks": 3})
+        self.assertNotIn("c.pdf", resumed.finished)
+
+
+@override_settings(BATCH_QNA_MAX_QUESTIONS=2, BATCH_QNA_CONCURRENCY=3)
+class BatchQnATests(SimpleTestCase):
+    url = "/document_processing/qna/batch/"
+
+    def setUp(self):
+        patcher = mock.patch.object(views, "QnaHelper")
+        self.helper = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.helper.generate_batch_response.return_value = {"answers": [], "timings": {}}
+
+    def post(self, data):
+        return self.client.post(self.url, data, content_type="application/json")
+
+    def test_answers_json_and_form_batches(self):
+        response = self.post({"document_uid": "doc", "questions": ["What?", " ", "Why?"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"document_uid": "doc", "output": {"answers": [], "timings": {}}})
+        # Blank questions are dropped and the configured concurrency is passed on
+        self.helper.generate_batch_response.assert_called_with(["What?", "Why?"], file_hash="doc", max_concurrency=3)
+
+        response = self.client.post(self.url, {"document_uid": "doc", "questions": ["What?", "Why?"]})
+        self.assertEqual(response.status_code, 200)
+        self.helper.generate_batch_response.assert_called_with(["What?", "Why?"], file_hash="doc", max_concurrency=3)
+
+    def test_invalid_batches(self):
+        for data in ({"questions": ["What?"]}, {"document_uid": "doc"}, {"document_uid": "doc", "questions": [" "]},
+                     {"document_uid": "doc", "questions": "What?"},
+                     {"document_uid": "doc", "questions": ["What?", "Why?", "How?"]}):
+            self.assertEqual(self.post(data).status_code, 400, data)
+        self.helper.generate_batch_response.assert_not_called()
+
+
+class ProjectionTests(SimpleTestCase):
+    def request(self, **params):
+        return Request(APIRequestFactory().get("/", params))
+
+    def test_document_projection_of_both_shapes(self):
+        stored = {"document_uid": "doc", "ids": ["doc_content10", "doc_content2"],
+                  "metadatas": [{"key": "B", "value": "second"}, {"key": "A", "value": "first"}],
+                  "documents": ["B: second", "A: first"], "embeddings": [[0.5, 0.5], [1.0, 0.0]]}
+        created = {"document_uid": "doc",
+                   "doc_content10": [{"key": "B", "value": "second", "embedding": [0.5, 0.5]}],
+                   "doc_content2": [{"key": "A", "value": "first", "embedding": [1.0, 0.0]}]}
+        for output in (stored, created):
+            # Raw embeddings are opt-in, and chunks come back in document order
+            self.assertEqual(document_projection(output), {"document_uid": "doc", "chunk_count": 2,
+                                                           "ids": ["doc_content2", "doc_content10"], "keys": ["A", "B"]})
+            projection = document_projection(output, DOCUMENT_FIELDS)
+            self.assertEqual(projection["values"], ["first", "second"])
+            self.assertEqual(projection["documents"], ["A: first", "B: second"])
+            self.assertEqual(projection["embeddings"].dtype, np.float32)
+            np.testing.assert_array_equal(projection["embeddings"], [[1.0, 0.0], [0.5, 0.5]])
+
+    def test_section_projection(self):
+        section = {"key": "Intro", "value": "Some text"}
+        self.assertEqual(section_projection(section, "Short"), {"key": "Intro", "length": 9, "summary": "Short"})
+        self.assertEqual(section_projection(section, fields=SECTION_FIELDS)["value"], "Some text")
+
+    def test_fields_and_paging(self):
+        self.assertEqual(requested_fields(self.request(fields="values, embeddings,secret"), DOCUMENT_FIELDS),
+                         {"values", "embeddings"})
+        self.assertEqual(requested_fields(self.request(), DOCUMENT_FIELDS), set())
+        self.assertEqual(paging(self.request(offset="5", limit="10")), (5, 10))
+        self.assertEqual(paging(self.request(), default_limit=20), (0, 20))
+        for params in ({"offset": "-1"}, {"limit": "many"}):
+            with self.assertRaises(ValueError):
+                paging(self.request(**params))
+
+    def test_numpy_renderer(self):
+        matrix = np.load(io.BytesIO(NumpyRenderer().render({"output": {"embeddings": [[1, 2], [3, 4]]}})))
+        self.assertEqual((matrix.dtype, matrix.shape), (np.float32, (2, 2)))
+        self.assertEqual(np.load(io.BytesIO(NumpyRenderer().render({"output": {}}))).shape, (0, 0))
+
+
+class AdobeSessionTests(SimpleTestCase):
+    def session(self, **kwargs):
+        session = utils.AdobeSession(**kwargs)
+        # The client is created lazily, so the SDK is never reached
+        session._pdf_services = mock.Mock()
+        session._pdf_services.get_job_status.return_value.get_status.return_value = "DONE"
+        return session
+
+    def test_settings_defaults(self):
+        with self.settings(ADOBE_MAX_CONCURRENCY=2, ADOBE_POLL_INTERVAL=0.5, ADOBE_POLL_DEADLINE=30):
+            session = utils.AdobeSession()
+        self.assertEqual((session.poll_interval, session.poll_deadline), (0.5, 30))
+        self.assertTrue(session.slots.acquire(blocking=False) and session.slots.acquire(blocking=False))
+        self.assertFalse(session.slots.acquire(blocking=False))
+
+    def test_jobs_wait_for_a_slot(self):
+        session = self.session(max_concurrency=1)
+        started, release = threading.Event(), threading.Event()
+        session.pdf_services.upload.side_effect = lambda **kwargs: (started.set(), release.wait())
+        session.pdf_services.get_content.return_value.get_input_stream.return_value = b"zip"
+
+        with mock.patch.object(utils, "ExtractPDFJob"), mock.patch.object(utils, "ExtractPDFParams"):
+            threads = [threading.Thread(target=session.extract, args=(b"%PDF",)) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            self.assertTrue(started.wait(5))
+            deadline = time.monotonic() + 5
+            while session.queued != 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual((session.queued, session.running), (1, 1))
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual((session.queued, session.running), (0, 0))
+        self.assertEqual(session.pdf_services.submit.call_count, 2)
+
+    def test_poll_deadline(self):
+        session = self.session(poll_interval=0.01, poll_deadline=0.05)
+        self.assertEqual(session.wait_for("location"), "DONE")
+
+        in_progress = utils.PDFServicesJobStatus.IN_PROGRESS.get_value()
+        session.pdf_services.get_job_status.return_value.get_status.return_value = in_progress
+        with self.assertRaises(TimeoutError):
+            session.wait_for("location")
+
+
+class LoadTestFakesTests(SimpleTestCase):
+    def serve(self, service):
+        service.start()
+        self.addCleanup(service.stop)
+        return service
+
+    def test_summarize_samples(self):
+        summary = summarize_samples([(0.1, 200), (0.3, 200), (0.2, 429), (5.0, 0)], elapsed=2.0)
+        self.assertEqual((summary["requests"], summary["errors"], summary["error_rate"]), (4, 2, 0.5))
+        self.assertEqual(summary["throughput_per_s"], 2.0)
+        self.assertEqual(summary["statuses"], {"200": 2, "429": 1, "0": 1})
+        self.assertEqual(summarize_samples([], elapsed=1.0)["error_rate"], 0.0)
+
+    def test_adobe_job_flow(self):
+        adobe = self.serve(FakeAdobeServer(latency=0.2, num_elements=5))
+        self.assertEqual(requests.post(f"{adobe.url}/token").json()["access_token"], "fake-token")
+        upload_uri = requests.post(f"{adobe.url}/assets").json()["uploadUri"]
+        self.assertEqual(requests.put(upload_uri, data=b"%PDF").status_code, 200)
+
+        location = requests.post(f"{adobe.url}/operation/extractpdf").headers["location"]
+        self.assertEqual(requests.get(location).json()["status"], "in progress")
+        time.sleep(0.25)
+        status = requests.get(location).json()
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(len(requests.get(status["content"]["downloadUri"]).json()["elements"]), 5)
+        self.assertEqual(adobe.requests["GET /status"], 2)
+
+    def test_adobe_rejections(self):
+        adobe = self.serve(FakeAdobeServer(error_rate=1.0))
+        self.assertEqual(requests.post(f"{adobe.url}/operation/extractpdf").status_code, 429)
+        self.assertEqual(requests.get(f"{adobe.url}/unknown").status_code, 404)
+
+    def test_groq_completions(self):
+        groq = self.serve(FakeGroqServer(latency=0, reply_words=12))
+        url = f"{groq.url}/openai/v1/chat/completions"
+        body = requests.post(url, json={"model": "m", "messages": [{"role": "user", "content": "two words"}]}).json()
+        self.assertEqual(len(body["choices"][0]["message"]["content"].split()), 12)
+        self.assertEqual(body["usage"]["prompt_tokens"], 2)
+
+        events = [line[len("data: "):] for line in requests.post(url, json={"stream": True}).text.splitlines()
+                  if line.startswith("data: ")]
+        self.assertEqual(events[-1], "[DONE]")
+        self.assertEqual(len(events), 12 + 2)
+        self.assertEqual(groq.requests, {"completion": 1, "stream": 1})
+
+    def test_groq_rate_limit(self):
+        groq = self.serve(FakeGroqServer(latency=0, rate_limit_rate=1.0, retry_after=3))
+        response = requests.post(f"{groq.url}/openai/v1/chat/completions", json={})
+        self.assertEqual((response.status_code, response.headers["retry-after"]), (429, "3"))
+
+
+class AnnTuningTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.rng = np.random.default_rng(0)
+
+    def test_recall_and_exact_top_k(self):
+        matrix = ann.normalize(self.rng.normal(size=(50, 8)).astype(np.float32))
+        exact = ann.exact_top_k(matrix, matrix[:5], k=3)
+        # Every vector is its own nearest neighbour
+        self.assertEqual(exact[:, 0].tolist(), list(range(5)))
+        self.assertEqual(ann.recall_at_k(exact, exact), 1.0)
+        self.assertEqual(ann.recall_at_k([[0, 1, 2]], [[0, 3, 4]]), 1 / 3)
+
+    def test_synthetic_queries(self):
+        matrix = ann.normalize(self.rng.normal(size=(50, 8)).astype(np.float32))
+        queries = ann.query_vectors(None, [], matrix, sample=20)
+        self.assertEqual((queries.shape, queries.dtype), ((20, 8), np.float32))
+        np.testing.assert_allclose(np.linalg.norm(queries, axis=1), 1.0, atol=1e-5)
+        # Each query is at least as close to some stored chunk as to the one it was derived from
+        self.assertTrue(np.all(np.max(queries @ matrix.T, axis=1) >= ann.SYNTHETIC_QUERY_SIMILARITY - 1e-4))
+
+    def test_choose_params(self):
+        results = [{"index": "exact", "recall_at_k": 1.0, "p95_ms": 9.0, "index_bytes": 1},
+                   {"index": "ivf", "params": "slow", "recall_at_k": 0.99, "p95_ms": 3.0, "index_bytes": 10},
+                   {"index": "ivf", "params": "fast", "recall_at_k": 0.96, "p95_ms": 1.0, "index_bytes": 10},
+                   {"index": "ivf", "params": "inexact", "recall_at_k": 0.5, "p95_ms": 0.1, "index_bytes": 10}]
+        self.assertEqual(ann.choose_params(results)["params"], "fast")
+        # The most accurate configuration when none reaches the target
+        self.assertEqual(ann.choose_params(results, target_recall=1.0)["params"], "slow")
+        self.assertIsNone(ann.choose_params(results[:1]))
+
+    def test_tune_ivf(self):
+        matrix = ann.normalize(clustered_vectors(self.rng, 200))
+        queries = ann.query_vectors(None, [], matrix, sample=10)
+        exact = ann.exact_top_k(matrix, queries, 5)
+        results = ann.tune_ivf(matrix, queries, exact, 5, nlists=[4], nprobes=[1, 4, 8], log=lambda line: None)
+        self.assertEqual([result["params"] for result in results], [{"nlist": 4, "nprobe": 1}, {"nlist": 4, "nprobe": 4}])
+        # Probing every list is exact search
+        self.assertEqual(results[1]["recall_at_k"], 1.0)
+
+    def test_saved_params(self):
+        path = os.path.join(self.directory, "ann_params.json")
+        with self.settings(ANN_PARAMS_FILE=path):
+            self.assertEqual(ann_params("papers"), {})
+            save_ann_params("*", {"nlist": 64, "nprobe": 4})
+            save_ann_params("papers", {"nprobe": 16})
+            # A collection's own entry overrides the "*" entry
+            self.assertEqual(ann_params("papers"), {"nlist": 64, "nprobe": 16})
+            self.assertEqual(ann_params("other"), {"nlist": 64, "nprobe": 4})
+
+
+class Float32EmbeddingTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.collection = LocalCollection(directory, "float32")
+        self.embeddings = OfflineEmbeddings(OfflineIndex(), [], self.collection)
+
+    def test_encode_documents(self):
+        vectors = self.embeddings.encode_documents(["alpha beta", "gamma delta epsilon"])
+        self.assertEqual((vectors.shape, vectors.dtype), ((2, 16), np.float32))
+        self.assertTrue(vectors.flags["C_CONTIGUOUS"])
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-6)
+
+        # Model output of another dtype is converted and normalized once
+        self.embeddings._embedding_model = mock.Mock(**{"encode.return_value": np.array([[3.0, 4.0]])})
+        vectors = self.embeddings.encode_documents(["text"])
+        self.assertEqual(vectors.dtype, np.float32)
+        np.testing.assert_allclose(vectors, [[0.6, 0.8]], atol=1e-6)
+
+    def test_calculate_similarity(self):
+        self.assertAlmostEqual(self.embeddings.calculate_similarity([1, 0], [2, 0]), 1.0, places=6)
+        scores = self.embeddings.calculate_similarity([1, 0], [[1, 0], [0, 3]])
+        self.assertEqual(scores.dtype, np.float32)
+        np.testing.assert_allclose(scores, [1.0, 0.0], atol=1e-6)
+        self.assertEqual(self.embeddings.calculate_similarity([[1, 0], [0, 1]], [[1, 0], [0, 3], [1, 1]]).shape, (2, 3))
+
+    def test_stored_vectors_stay_float32(self):
+        texts = ["alpha beta", "gamma delta", "epsilon zeta"]
+        chunks = [(f"float32_content{idx}", text, {"document_uid": "float32", "key": str(idx), "value": text})
+                  for idx, text in enumerate(texts)]
+        vectors = self.embeddings.encode_documents(texts)
+        self.embeddings.store_chunks(chunks, vectors)
+
+        document = self.embeddings.document_matrix("float32", self.collection.name)
+        self.assertEqual(document.matrix.dtype, np.float32)
+        self.assertTrue(document.matrix.flags["C_CONTIGUOUS"])
+        np.testing.assert_allclose(document.matrix, vectors, atol=1e-6)
+        self.assertEqual(document.scores(vectors[:1]).dtype, np.float32)
+        self.assertEqual(int(np.argmax(document.scores(vectors[1:2]))), 1)
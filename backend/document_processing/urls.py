@@ -3,8 +3,18 @@ from .views import *
 
 urlpatterns = [
     path('file/', InformationExtractor.as_view()),
+    path('file/exists/', DocumentExistsView.as_view()),
     path('qna/', QnAView.as_view()),
+    path('qna/batch/', BatchQnAView.as_view()),
     path('summary/', SummarizerView.as_view()),
     path('summary/heading/', SummarizerHeadingView.as_view()),
-    path('summary/title/', TitleWiseSummary.as_view())
+    path('summary/title/', TitleWiseSummary.as_view()),
+    path('metrics/', MetricsView.as_view()),
+    path('index/', IndexStatusView.as_view()),
+    path('documents/', DocumentListView.as_view()),
+    path('documents/stats/', DocumentStatsView.as_view()),
+    path('documents/storage/', StorageReportView.as_view()),
+    path('documents/compact/', CompactionView.as_view()),
+    path('documents/<str:document_uid>/', DocumentView.as_view()),
+    path('documents/<str:document_uid>/expire/', DocumentExpireView.as_view())
 ]
@@ -1,24 +1,31 @@
 import os
 import json
+import time
+import threading
+import uuid
 
 import zipfile
 from datetime import datetime
 from collections import defaultdict
 import logging
 from .preprocessing import preprocess_pipeline
+from . import metrics
 
 
 from adobe.pdfservices.operation.auth.service_principal_credentials import ServicePrincipalCredentials
+from adobe.pdfservices.operation.config.client_config import ClientConfig
 from adobe.pdfservices.operation.pdf_services_media_type import PDFServicesMediaType
 from adobe.pdfservices.operation.io.cloud_asset import CloudAsset
 from adobe.pdfservices.operation.io.stream_asset import StreamAsset
 from adobe.pdfservices.operation.pdf_services import PDFServices
+from adobe.pdfservices.operation.pdf_services_job_status import PDFServicesJobStatus
 from adobe.pdfservices.operation.pdfjobs.jobs.extract_pdf_job import ExtractPDFJob
 from adobe.pdfservices.operation.pdfjobs.params.extract_pdf.extract_element_type import ExtractElementType
 from adobe.pdfservices.operation.pdfjobs.params.extract_pdf.extract_pdf_params import ExtractPDFParams
 from adobe.pdfservices.operation.pdfjobs.result.extract_pdf_result import ExtractPDFResult
 
 from dotenv import load_dotenv
+from django.conf import settings
 
 load_dotenv()
 
@@ -26,20 +33,124 @@ PDF_SERVICE_CLIENT_ID = os.environ.get("PDF_SERVICE_CLIENT_ID")
 PDF_SERVICES_CLIENT_SECRET = os.environ.get("PDF_SERVICES_CLIENT_SECRET")
 ORGANIZATION_ID = os.environ.get("ORGANIZATION_ID")
 
+logger = logging.getLogger(__name__)
+
+
+class AdobeSession:
+    """
+    Process wide Adobe PDF Services client.
+
+    The `PDFServices` client (and with it the access token, which the SDK refreshes shortly
+    before it expires) is created once and shared by every extraction in the process. At
+    most `max_concurrency` jobs are submitted at a time; further extractions wait for a
+    slot. Job status is polled every `poll_interval` seconds until the job finishes or
+    `poll_deadline` seconds have passed. `client_config` is an optional PDF Services SDK
+    client config file (timeouts, proxy, region or `pdfServices.pdfServicesUri`). Unset
+    arguments come from the ADOBE_* settings.
+
+    Time spent waiting for a slot and for the job to finish is recorded as the
+    `extraction_queue_wait` and `extraction_poll_wait` stages.
+    """
+
+    def __init__(self, max_concurrency=None, poll_interval=None, poll_deadline=None, client_config=None,
+                 credentials=None):
+        self.poll_interval = poll_interval or getattr(settings, "ADOBE_POLL_INTERVAL", 1.0)
+        self.poll_deadline = poll_deadline or getattr(settings, "ADOBE_POLL_DEADLINE", 600)
+        self.client_config = client_config or getattr(settings, "ADOBE_CLIENT_CONFIG", None)
+        self.credentials = credentials
+        self.slots = threading.BoundedSemaphore(max_concurrency or getattr(settings, "ADOBE_MAX_CONCURRENCY", 4))
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self._pdf_services = None
+
+    @property
+    def pdf_services(self):
+        with self.lock:
+            if self._pdf_services is None:
+                credentials = self.credentials or ServicePrincipalCredentials(
+                    client_id=PDF_SERVICE_CLIENT_ID,
+                    client_secret=PDF_SERVICES_CLIENT_SECRET
+                )
+                client_config = ClientConfig().from_file(self.client_config) if self.client_config else None
+                self._pdf_services = PDFServices(credentials=credentials, client_config=client_config)
+            return self._pdf_services
+
+    def _track(self, queued=0, running=0):
+        with self.lock:
+            self.queued += queued
+            self.running += running
+            metrics.REGISTRY.set("researchiq_adobe_jobs", self.queued, state="queued")
+            metrics.REGISTRY.set("researchiq_adobe_jobs", self.running, state="running")
+
+    def extract(self, input_stream):
+        """
+        Run a text extraction job on a PDF.
+
+        Args:
+            input_stream (bytes): The PDF.
+
+        Returns:
+            bytes: The ZIP file produced by the job.
+        """
+        self._track(queued=1)
+        try:
+            with metrics.stage("extraction_queue_wait"):
+                self.slots.acquire()
+        finally:
+            self._track(queued=-1)
+
+        self._track(running=1)
+        try:
+            pdf_services = self.pdf_services
+            input_asset = pdf_services.upload(input_stream=input_stream, mime_type=PDFServicesMediaType.PDF)
+            extract_pdf_job = ExtractPDFJob(
+                input_asset=input_asset,
+                extract_pdf_params=ExtractPDFParams(elements_to_extract=[ExtractElementType.TEXT])
+            )
+            location = pdf_services.submit(extract_pdf_job)
+            self.wait_for(location)
+
+            # The job is done, so this returns without sleeping
+            response = pdf_services.get_job_result(location, ExtractPDFResult)
+            result_asset: CloudAsset = response.get_result().get_resource()
+            stream_asset: StreamAsset = pdf_services.get_content(result_asset)
+            return stream_asset.get_input_stream()
+        finally:
+            self._track(running=-1)
+            self.slots.release()
+
+    def wait_for(self, location):
+        """Poll the job at `location` until it is no longer in progress."""
+        deadline = time.monotonic() + self.poll_deadline
+        with metrics.stage("extraction_poll_wait"):
+            while True:
+                status = self.pdf_services.get_job_status(location).get_status()
+                if status != PDFServicesJobStatus.IN_PROGRESS.get_value():
+                    return status
+                if time.monotonic() + self.poll_interval > deadline:
+                    raise TimeoutError(f"Adobe extraction job did not finish within {self.poll_deadline:g}s")
+                time.sleep(self.poll_interval)
+
+
+metrics.REGISTRY.describe("researchiq_adobe_jobs", "Adobe extraction jobs waiting for a slot or running.")
+
+ADOBE_SESSION = AdobeSession()
+
+
 class AdobeFunc:
     """
     A class to interact with Adobe PDF Services for extracting text from PDFs and returning structured data.
     """
 
-    def __init__(self):
+    def __init__(self, session=None):
         """
-        Initialize AdobeFunc with Service Principal Credentials.
+        Initialize AdobeFunc with the Adobe session to extract with (the process wide one
+        by default); credentials are only needed once a PDF is extracted.
         """
-        self.credentials = ServicePrincipalCredentials(
-            client_id=PDF_SERVICE_CLIENT_ID,
-            client_secret=PDF_SERVICES_CLIENT_SECRET
-        )
+        self.session = session or ADOBE_SESSION
 
+    @metrics.timed("extraction")
     def adobe_process(self, file):
         """
         Process the PDF file using Adobe PDF Services and return the path of the resulting ZIP file.
@@ -54,41 +165,17 @@ class AdobeFunc:
             input_stream = file.read()
             # file.close()
 
-            pdf_services = PDFServices(credentials=self.credentials)
-
-            # Upload the input PDF
-            input_asset = pdf_services.upload(
-                input_stream=input_stream, mime_type=PDFServicesMediaType.PDF
-            )
-
-            # Define parameters for extracting text
-            extract_pdf_params = ExtractPDFParams(
-                elements_to_extract=[ExtractElementType.TEXT]
-            )
-
-            # Create and submit the job
-            extract_pdf_job = ExtractPDFJob(
-                input_asset=input_asset, extract_pdf_params=extract_pdf_params
-            )
-
-            location = pdf_services.submit(extract_pdf_job)
-            pdf_services_response = pdf_services.get_job_result(
-                location, ExtractPDFResult
-            )
-
-            # Get the content from the resulting asset
-            result_asset: CloudAsset = pdf_services_response.get_result().get_resource()
-            stream_asset: StreamAsset = pdf_services.get_content(result_asset)
+            zip_data = self.session.extract(input_stream)
 
             # Save the ZIP file
             output_file_path = self.create_output_file_path()
             with open(output_file_path, "wb") as output_file:
-                output_file.write(stream_asset.get_input_stream())
+                output_file.write(zip_data)
 
             return output_file_path
 
         except Exception as e:
-            logging.exception(f"Error during Adobe PDF processing: {e}")
+            logger.exception(f"Error during Adobe PDF processing: {e}")
             raise
 
     def create_output_file_path(self):
@@ -101,8 +188,10 @@ class AdobeFunc:
         now = datetime.now()
         time_stamp = now.strftime("%Y-%m-%dT%H-%M-%S")
         os.makedirs("output/ExtractTextInfoFromPDF", exist_ok=True)
-        return f"output/ExtractTextInfoFromPDF/extract{time_stamp}.zip"
+        # Several jobs can finish within the same second
+        return f"output/ExtractTextInfoFromPDF/extract{time_stamp}-{uuid.uuid4().hex[:8]}.zip"
 
+    @metrics.timed("json_parsing")
     def extract_json_from_zip(self, zip_file_path):
         """
         Extract JSON data from the ZIP file.
@@ -117,6 +206,7 @@ class AdobeFunc:
             with archive.open('structuredData.json') as json_entry:
                 return json.load(json_entry)
 
+    @metrics.timed("preprocessing")
     def extract_information_from_json(self, json_data=""):
         """
         Process JSON data to extract structured text information.
@@ -0,0 +1,166 @@
+import os
+import json
+import logging
+import threading
+
+import chromadb
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Chroma collection metadata keys of the HNSW parameters
+HNSW_METADATA = {"M": "hnsw:M", "ef_construction": "hnsw:construction_ef", "ef_search": "hnsw:search_ef"}
+
+_params_cache = (None, {})
+_params_lock = threading.Lock()
+
+
+def ann_params_file():
+    """
+    ANN parameters per collection, as chosen by `manage.py tune_ann`: a JSON object mapping
+    collection names (or "*" for all) to HNSW (M, ef_construction, ef_search) or IVF (nlist, nprobe).
+    """
+    return getattr(settings, "ANN_PARAMS_FILE", "ann_params.json")
+
+
+def load_ann_params():
+    """The whole parameter file, reread only when it changed."""
+    global _params_cache
+    path = ann_params_file()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    with _params_lock:
+        if _params_cache[0] != mtime:
+            with open(path) as f:
+                _params_cache = (mtime, json.load(f))
+        return _params_cache[1]
+
+
+def ann_params(name):
+    """ANN parameters of collection `name`: its own entry over the "*" entry."""
+    params = load_ann_params()
+    return {**params.get("*", {}), **params.get(name, {})}
+
+
+def save_ann_params(name, params):
+    """Record the parameters of collection `name` in ANN_PARAMS_FILE."""
+    path = ann_params_file()
+    with _params_lock:
+        try:
+            with open(path) as f:
+                everything = json.load(f)
+        except FileNotFoundError:
+            everything = {}
+        everything[name] = params
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(everything, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+class VectorCollection:
+    """
+    The collection API the app relies on, a subset of Chroma's `Collection`. Results use
+    Chroma's shapes: `get` returns `{"ids", "documents", "metadatas", "embeddings"}` with
+    None for what was not included, `query` the same with one list per query embedding plus
+    `distances`.
+    """
+
+    name = None
+
+    def count(self):
+        raise NotImplementedError
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        raise NotImplementedError
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        raise NotImplementedError
+
+    def delete(self, ids=None, where=None):
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        raise NotImplementedError
+
+
+class VectorStore:
+    """A set of named collections on disk."""
+
+    backend = None
+
+    def get_collection(self, name, metadata=None):
+        """Open the collection `name`, creating it (with `metadata`) if needed."""
+        raise NotImplementedError
+
+    def delete_collection(self, name):
+        """Drop a collection and its data; no-op if it does not exist."""
+        raise NotImplementedError
+
+    def list_collections(self):
+        raise NotImplementedError
+
+    def vacuum(self):
+        """Reclaim the space of deleted chunks. Returns True if anything was done."""
+        raise NotImplementedError
+
+
+class ChromaStore(VectorStore):
+    """
+    Chroma's persistent client; its collections already implement `VectorCollection`.
+    Chroma fixes the HNSW parameters of a collection when it is created, so the collection's
+    ANN parameters only apply to collections created after they were set.
+    """
+
+    backend = "chroma"
+
+    def __init__(self, path):
+        self.client = chromadb.PersistentClient(path=path)
+
+    def get_collection(self, name, metadata=None):
+        hnsw = {HNSW_METADATA[param]: int(value) for param, value in ann_params(name).items() if param in HNSW_METADATA}
+        return self.client.get_or_create_collection(name=name, metadata={**(metadata or {}), **hnsw} or None)
+
+    def delete_collection(self, name):
+        try:
+            self.client.delete_collection(name)
+        except ValueError:
+            pass  # Already gone
+
+    def list_collections(self):
+        return [collection.name for collection in self.client.list_collections()]
+
+    def vacuum(self):
+        # Chroma has no public vacuum API before 0.6; use the same internals as `chroma utils vacuum`
+        from chromadb.db.impl.sqlite import SqliteDB
+        self.client._system.instance(SqliteDB).vacuum()
+        return True
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(backend=None, path=None):
+    """
+    The process wide store for `backend` at `path` (VECTOR_STORE and VECTOR_STORE_PATH by
+    default): "chroma" (chromadb.PersistentClient) or "local" (memory-mapped IVF index, see
+    `local_index`). Stores are cached by absolute path, so switching the working directory (as the
+    benchmarks do) opens a separate store.
+    """
+    backend = backend or getattr(settings, "VECTOR_STORE", "chroma")
+    path = os.path.abspath(path or getattr(settings, "VECTOR_STORE_PATH", "database"))
+    with _stores_lock:
+        store = _stores.get((backend, path))
+        if store is None:
+            if backend == "chroma":
+                store = ChromaStore(path)
+            elif backend == "local":
+                from .local_index import LocalStore
+                store = LocalStore(os.path.join(path, "local"))
+            else:
+                raise ValueError(f"Unknown vector store {backend!r}")
+            _stores[(backend, path)] = store
+        return store
@@ -1,18 +1,47 @@
+import re
+from django.conf import settings
 from django.shortcuts import render
+from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from .pipeline import data_pipeline
 from .embeddings import VectorEmbeddings, QnaHelper, summmarizerHelper
-from rest_framework.status import HTTP_200_OK, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST
+from . import index_versions, registry
+from .metrics import REGISTRY
+from .models import Document, IndexVersion, content_hash
+from .lifecycle import delete_document, expire_document, storage_report, COMPACTOR
+from .permissions import HasAdminToken
+from .precompute import cached_section_summaries, schedule_section_summaries
+from .summary_tree import SummaryTree, section_content
+from .projections import (
+    DOCUMENT_FIELDS, SECTION_FIELDS, document_projection, paging, requested_fields, section_projection)
+from .renderers import BINARY_FORMATS, BINARY_RENDERERS
+from rest_framework.status import (
+    HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND)
 
 
 class InformationExtractor(APIView):
+    """
+    Ingest a PDF and describe the stored document. By default only ids, keys and counts are
+    returned; `fields=values,documents,embeddings` opts into more, and `format=npy` /
+    `format=msgpack` (or the matching Accept header) returns the embeddings as float32.
+    """
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + BINARY_RENDERERS
+
     def post(self, request):
         file = request.FILES.get('uploaded_file')
         if file and file.name.endswith('.pdf'):
-            output = data_pipeline().text_extraction_pipeline(file)
+            fields = requested_fields(request, DOCUMENT_FIELDS)
+            if request.accepted_renderer.format in BINARY_FORMATS:
+                fields.add('embeddings')
+            # Only fetch what will be returned when the document already exists
+            include = ['metadatas'] + [name for name in ('documents', 'embeddings') if name in fields]
+
+            output = data_pipeline().text_extraction_pipeline(file, include=include)
+            schedule_section_summaries(output['document_uid'])
             return Response({
-                'output': output,
+                'output': document_projection(output, fields),
                 'document_uid': output['document_uid'],
                 'status': HTTP_200_OK
             })
@@ -22,6 +51,34 @@ class InformationExtractor(APIView):
                 'error': 'Uploaded file is not a PDF.'
             })
 
+class DocumentExistsView(APIView):
+    """
+    Hash-first upload negotiation: the client sends the SHA-256 of its PDF and only uploads
+    the file if the backend does not know it yet.
+    """
+
+    def post(self, request):
+        file_hash = request.POST.get('file_hash', '').lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', file_hash):
+            return Response({
+                'status': HTTP_400_BAD_REQUEST,
+                'error': 'file_hash must be a SHA-256 hex digest.'
+            }, status=HTTP_400_BAD_REQUEST)
+
+        document = registry.lookup(file_hash)
+        if document is None:
+            return Response({
+                'exists': False,
+                'status': HTTP_404_NOT_FOUND
+            })
+        return Response({
+            'exists': True,
+            'document_uid': file_hash,
+            'summary': document.as_dict(),
+            'status': HTTP_200_OK
+        })
+
+
 class QnAView(APIView):
     def post(self, request):
         document_uid = request.POST['document_uid']
@@ -34,26 +91,239 @@ class QnAView(APIView):
             'output': output
         })
 
+class BatchQnAView(APIView):
+    """
+    Answer many questions about one document in a single call. Accepts JSON
+    (`{"document_uid": ..., "questions": [...]}`) or a form with repeated `questions` fields.
+    """
+
+    def post(self, request):
+        document_uid = request.data.get('document_uid')
+        if hasattr(request.data, 'getlist'):
+            questions = request.data.getlist('questions')
+        else:
+            questions = request.data.get('questions') or []
+        if not isinstance(questions, list):
+            return Response({
+                'status': HTTP_400_BAD_REQUEST,
+                'error': 'questions must be a list of strings.'
+            }, status=HTTP_400_BAD_REQUEST)
+        questions = [q for q in questions if isinstance(q, str) and q.strip()]
+
+        if not document_uid or not questions:
+            return Response({
+                'status': HTTP_400_BAD_REQUEST,
+                'error': 'document_uid and at least one question are required.'
+            }, status=HTTP_400_BAD_REQUEST)
+        if len(questions) > settings.BATCH_QNA_MAX_QUESTIONS:
+            return Response({
+                'status': HTTP_400_BAD_REQUEST,
+                'error': f'At most {settings.BATCH_QNA_MAX_QUESTIONS} questions per batch.'
+            }, status=HTTP_400_BAD_REQUEST)
+
+        output = QnaHelper().generate_batch_response(
+            questions, file_hash=document_uid, max_concurrency=settings.BATCH_QNA_CONCURRENCY)
+
+        return Response({
+            'document_uid': document_uid,
+            'output': output
+        })
+
+
 class SummarizerHeadingView(APIView):
+    """
+    List the sections of a document as `{key, length, summary}`; `fields=value` adds the
+    section text. `offset` and `limit` page through long section lists.
+    """
+
     def post(self, request):
         document_uid = request.POST['document_uid']
-        key_value_pair = summmarizerHelper(document_uid).retrieve_all_heading()
+        fields = requested_fields(request, SECTION_FIELDS)
+        try:
+            offset, limit = paging(request)
+        except ValueError as e:
+            return Response({
+                'status': HTTP_400_BAD_REQUEST,
+                'error': str(e)
+            }, status=HTTP_400_BAD_REQUEST)
+
+        sections = summmarizerHelper(document_uid).retrieve_all_heading()
+        page = sections[offset:] if limit is None else sections[offset:offset + limit]
+
+        # Inline the section summaries that are already computed
+        hashes = [content_hash(section_content(section)) for section in page]
+        summaries = cached_section_summaries(hashes)
+
         return Response({
-            "output" : key_value_pair
+            "output": [section_projection(section, summaries.get(section_hash), fields)
+                       for section, section_hash in zip(page, hashes)],
+            "count": len(sections),
+            "offset": offset,
         })
 
 class TitleWiseSummary(APIView):
+    """
+    Summarize one section, from the document's summary tree. Clients send `document_uid`
+    and `key` and the section text is read server side; sending the text itself as
+    `content` is still supported.
+    """
+
     def post(self, request):
-        content = request.POST['content']
-        title_summary = summmarizerHelper().generate_response(content)
+        document_uid = request.POST.get('document_uid', '')
+        key = request.POST.get('key', '')
+        content = request.POST.get('content')
+        if content is None:
+            section = summmarizerHelper(document_uid).retrieve_section(key) if document_uid and key else None
+            if section is None:
+                return Response({
+                    'status': HTTP_404_NOT_FOUND,
+                    'error': 'Unknown document_uid or key.'
+                }, status=HTTP_404_NOT_FOUND)
+            content = section_content(section)
+
+        tree = SummaryTree(document_uid)
+        summary = tree.section_summary(key, content)
         return Response({
-            "output" : title_summary
+            "output": {'output': summary, 'cached': tree.computed == 0}
         })
     
 class SummarizerView(APIView):
+    """Summarize a whole document, reusing the stored nodes of its summary tree."""
+
     def post(self, request):
         document_uid = request.POST['document_uid']
-        output = summmarizerHelper(document_uid).document_summary()
+        output = SummaryTree(document_uid).document_summary()
+        if output is None:
+            return Response({
+                'status': HTTP_404_NOT_FOUND,
+                'error': 'Unknown document_uid or document without sections.'
+            }, status=HTTP_404_NOT_FOUND)
         return Response({
             'output': output
         })
+
+
+class MetricsView(APIView):
+    def get(self, request):
+        return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class DocumentListView(APIView):
+    """List registered documents, newest first, optionally filtered by `status`, with `offset`/`limit` paging."""
+    permission_classes = [HasAdminToken]
+
+    def get(self, request):
+        try:
+            offset, limit = paging(request, default_limit=100)
+        except ValueError as e:
+            return Response({
+                'status': HTTP_400_BAD_REQUEST,
+                'error': str(e)
+            }, status=HTTP_400_BAD_REQUEST)
+
+        documents = Document.objects.all()
+        if request.query_params.get('status'):
+            documents = documents.filter(status=request.query_params['status'])
+        return Response({
+            'output': [document.as_dict() for document in documents[offset:offset + limit]],
+            'count': documents.count(),
+            'offset': offset,
+        })
+
+
+class DocumentStatsView(APIView):
+    """Document counts by status, and total chunks and pages, from the registry."""
+    permission_classes = [HasAdminToken]
+
+    def get(self, request):
+        return Response(registry.document_stats())
+
+
+class IndexStatusView(APIView):
+    """
+    Configured and active index versions, and the progress of any version being built.
+    POST builds the configured version in a background thread of this process and switches
+    to it once complete, like `manage.py migrate_index`.
+    """
+    permission_classes = [HasAdminToken]
+
+    def get(self, request):
+        active = index_versions.active_version()
+        return Response({
+            'configured': index_versions.configured_key(),
+            'active': active.key if active is not None else None,
+            'versions': [version.as_dict() for version in IndexVersion.objects.order_by('created_at')],
+        })
+
+    def post(self, request):
+        started = index_versions.start_migration()
+        return Response({
+            'configured': index_versions.configured_key(),
+            'started': started,
+            'status': HTTP_202_ACCEPTED if started else HTTP_200_OK
+        }, status=HTTP_202_ACCEPTED if started else HTTP_200_OK)
+
+
+class DocumentView(APIView):
+    """Delete a document: its vectors, chunks and stored section summaries."""
+    permission_classes = [HasAdminToken]
+
+    def delete(self, request, document_uid):
+        deleted = delete_document(document_uid)
+        if not deleted:
+            return Response({
+                'status': HTTP_404_NOT_FOUND,
+                'error': 'Unknown document_uid.'
+            }, status=HTTP_404_NOT_FOUND)
+        return Response({
+            'document_uid': document_uid,
+            'deleted_chunks': deleted,
+            'status': HTTP_200_OK
+        })
+
+
+class DocumentExpireView(APIView):
+    """Schedule a document for deletion by the compactor after `ttl` seconds (default 0)."""
+    permission_classes = [HasAdminToken]
+
+    def post(self, request, document_uid):
+        try:
+            ttl = float(request.data.get('ttl', 0))
+        except (TypeError, ValueError):
+            ttl = -1
+        if ttl < 0:
+            return Response({
+                'status': HTTP_400_BAD_REQUEST,
+                'error': 'ttl must be a non-negative number of seconds.'
+            }, status=HTTP_400_BAD_REQUEST)
+
+        expires_at = expire_document(document_uid, ttl)
+        if expires_at is None:
+            return Response({
+                'status': HTTP_404_NOT_FOUND,
+                'error': 'Unknown document_uid.'
+            }, status=HTTP_404_NOT_FOUND)
+        return Response({
+            'document_uid': document_uid,
+            'expires_at': expires_at,
+            'status': HTTP_200_OK
+        })
+
+
+class StorageReportView(APIView):
+    """Storage used per document, largest first."""
+    permission_classes = [HasAdminToken]
+
+    def get(self, request):
+        return Response(storage_report())
+
+
+class CompactionView(APIView):
+    """Run one compaction pass now and return what it removed."""
+    permission_classes = [HasAdminToken]
+
+    def post(self, request):
+        return Response({
+            'output': COMPACTOR.run_once(),
+            'status': HTTP_200_OK
+        })
@@ -15,7 +15,8 @@ ls -l /app/frontend
 # Start Django backend
 echo "Starting Django backend..."
 python /app/backend/manage.py migrate
-python /app/backend/manage.py runserver 0.0.0.0:8000 &
+python /app/backend/manage.py backfill_registry
+BACKGROUND_JOBS_ENABLED=true python /app/backend/manage.py runserver 0.0.0.0:8000 &
 
 # Store the PID of the backend process
 DJANGO_PID=$!
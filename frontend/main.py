@@ -45,7 +45,7 @@ class UI(HelperFunction):
             with qna:
                 pdf_viewer, QnA = st.columns([1, 1])
                 with pdf_viewer:
-                    self.pdf_viewer(uploaded_file)
+                    self.pdf_viewer(uploaded_file, key_prefix="qna")
                 with QnA:
                     # Apply CSS for QnA section to have fixed input at the bottom
                     self.qa_section_with_fixed_input()
@@ -53,7 +53,7 @@ class UI(HelperFunction):
             with summarizer:
                 pdf_viewer, summary = st.columns([1, 1])
                 with pdf_viewer:
-                    self.pdf_viewer(uploaded_file)
+                    self.pdf_viewer(uploaded_file, key_prefix="summary")
                 with summary:
                     # Display chat history for summarizer
                     # self.summary_heading()
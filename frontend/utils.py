@@ -1,18 +1,71 @@
 import os
 import fitz
+import hashlib
+import threading
 import requests
 import streamlit as st
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 load_dotenv()
 
 # Define the API endpoints
 EXTRACTOR_API_URL = os.environ.get("EXTRACTOR_API_URL")
+EXTRACTOR_API_EXISTS_URL = os.environ.get("EXTRACTOR_API_EXISTS_URL")
 QNA_API_URL = os.environ.get("QNA_API_URL")
 SUMMARIZER_API_URL = os.environ.get("SUMMARIZER_API_URL")
 SUMMARIZER_API_HEADING_URL = os.environ.get("SUMMARIZER_API_HEADING_URL")
 SUMMARIZER_API_TITLE_URL = os.environ.get("SUMMARIZER_API_TITLE_URL")
 
+# (connect, read) timeouts in seconds; extraction and LLM calls can take minutes
+REQUEST_TIMEOUT = (float(os.environ.get("API_CONNECT_TIMEOUT", 5)),
+                   float(os.environ.get("API_READ_TIMEOUT", 300)))
+
+THUMBNAIL_ZOOM = 0.2
+
+
+@st.cache_resource
+def http_session():
+    """
+    Keep-alive session shared by every Streamlit session, retrying transient failures.
+    Failed connections are retried for every method since nothing reached the server; read
+    errors and retryable statuses only for GETs, so uploads and LLM calls are never repeated.
+    """
+    retry = Retry(total=3, connect=3, read=1, status=2, backoff_factor=0.5,
+                  status_forcelist=(429, 502, 503, 504), allowed_methods=frozenset({"GET"}))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# PyMuPDF documents are not thread safe and Streamlit serves every session from its own thread
+PDF_RENDER_LOCK = threading.Lock()
+
+
+@st.cache_resource(max_entries=4)
+def open_pdf(file_hash, _pdf_bytes):
+    """Open a PDF once per file hash; the bytes are not hashed by Streamlit."""
+    return fitz.open(stream=_pdf_bytes, filetype="pdf")
+
+
+@st.cache_data(max_entries=8)
+def page_count(file_hash, _pdf_bytes):
+    try:
+        with PDF_RENDER_LOCK:
+            return len(open_pdf(file_hash, _pdf_bytes))
+    except Exception:
+        return 0
+
+
+@st.cache_data(max_entries=256)
+def render_page(file_hash, page_num, zoom, _pdf_bytes):
+    """Rasterize a single page to PNG; LRU cached by file hash, page and zoom."""
+    with PDF_RENDER_LOCK:
+        page = open_pdf(file_hash, _pdf_bytes)[page_num]
+        return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+
 
 class HelperFunction:
 
@@ -47,75 +100,138 @@ class HelperFunction:
             </style>
             """
 
+    def post_json(self, url, data=None, files=None, cache_key=None):
+        """
+        POST to the backend through the shared session and return the decoded JSON, or None on failure.
+        Responses of read-only calls are cached in the session state under `cache_key`
+        (which includes the document uid), so reruns do not hit the backend again.
+        """
+        cache = st.session_state.setdefault("api_cache", {})
+        if cache_key is not None and cache_key in cache:
+            return cache[cache_key]
+
+        try:
+            response = http_session().post(url, data=data, files=files, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+
+        payload = response.json()
+        if cache_key is not None:
+            cache[cache_key] = payload
+        return payload
+
+    def known_document(self, uploaded_file):
+        """Ask the backend whether a document with the same SHA-256 was already processed."""
+        if not EXTRACTOR_API_EXISTS_URL:
+            return None
+        response = self.post_json(EXTRACTOR_API_EXISTS_URL, data={
+            "file_hash": self.file_hash(uploaded_file)})
+        if response is not None and response.get("exists"):
+            return response
+        return None
+
     def process_file(self, uploaded_file):
+        # Hash locally first and skip the upload if the backend already knows the document
+        known = self.known_document(uploaded_file)
+        if known is not None:
+            st.session_state.document_uid = known["document_uid"]
+            st.success("PDF already processed.")
+            return True
+
         # Upload PDF to extractor API
         with st.spinner("Processing the PDF..."):
             uploaded_file.seek(0)  # Reset file pointer to the beginning
             files = {
                 "uploaded_file": (uploaded_file.name, uploaded_file, "application/pdf")
             }
-            response = requests.post(EXTRACTOR_API_URL, files=files)
+            response = self.post_json(EXTRACTOR_API_URL, files=files)
 
-        if response.status_code == 200:
-            st.session_state.document_uid = response.json().get("document_uid")
+        if response is not None:
+            st.session_state.document_uid = response.get("document_uid")
             st.success("PDF processed successfully.")
             return True
         else:
             st.error("Failed to process the PDF.")
             return False
 
-    def pdf_to_images(self, uploaded_file):
-        """Convert PDF pages to images."""
-        try:
-            uploaded_file.seek(0)
-            pdf_document = fitz.open(
-                stream=uploaded_file.read(), filetype="pdf")
-            pages = []
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                pix = page.get_pixmap()
-                img_data = pix.tobytes("png")
-                pages.append(img_data)
-            return pages
-        except Exception as e:
-            # Log error silently or handle it without displaying it to the user
-            return []
+    def file_hash(self, uploaded_file):
+        """Return the SHA-256 of the uploaded file, computed once per upload."""
+        cache_key = f"file_hash_{uploaded_file.file_id}"
+        if cache_key not in st.session_state:
+            st.session_state[cache_key] = hashlib.sha256(
+                uploaded_file.getvalue()).hexdigest()
+        return st.session_state[cache_key]
+
+    def change_page(self, delta):
+        st.session_state.current_page += delta
 
-    def pdf_viewer(self, uploaded_file):
-        """Display PDF with pagination."""
+    def go_to_page(self, page_num):
+        st.session_state.current_page = page_num
+
+    def thumbnail_strip(self, uploaded_file, file_hash, total_pages, key_prefix, window=6):
+        """Show low resolution thumbnails of the pages around the current one."""
+        first = max(0, min(st.session_state.current_page - window // 2, total_pages - window))
+        columns = st.columns(min(window, total_pages))
+        for column, page_num in zip(columns, range(first, total_pages)):
+            with column:
+                st.image(render_page(file_hash, page_num, THUMBNAIL_ZOOM, uploaded_file.getvalue()),
+                         use_container_width=True)
+                st.button(str(page_num + 1), key=f"{key_prefix}_thumb_{file_hash}_{page_num}",
+                          on_click=self.go_to_page, args=(page_num,),
+                          disabled=page_num == st.session_state.current_page)
+
+    def pdf_viewer(self, uploaded_file, key_prefix="viewer", zoom=1.0, prefetch=1):
+        """
+        Display PDF with pagination.
+
+        Only the current page is rasterized; rendered pages are cached by file hash, page and
+        zoom, so re-runs and the second viewer tab are cache hits. `prefetch` neighbouring
+        pages are rendered after the current page is shown so page turns are instant.
+        """
         try:
             # Ensure a file is uploaded
             if uploaded_file:
-                # Convert PDF to images
-                pages = self.pdf_to_images(uploaded_file)
-                if not pages:  # If conversion fails or no pages, display info
+                file_hash = self.file_hash(uploaded_file)
+                pdf_bytes = uploaded_file.getvalue()
+                total_pages = page_count(file_hash, pdf_bytes)
+                if not total_pages:  # If the PDF cannot be opened or has no pages, display info
                     st.info(
                         "There was an issue with the PDF file. Please try another.")
                     return
 
-                total_pages = len(pages)
-
                 # Initialize session state for page tracking
                 if "current_page" not in st.session_state:
                     st.session_state.current_page = 0
-
-                # Unique identifier for the component
-                unique_id = str(uploaded_file.name) + str(total_pages)
+                # A shorter PDF than the previous one: bring the stored page back in range
+                current_page = st.session_state.current_page = min(st.session_state.current_page, total_pages - 1)
 
                 # Display the current page
-                caption = f"Page {
-                    st.session_state.current_page + 1} of {total_pages}"
-                st.image(pages[st.session_state.current_page],
+                caption = f"Page {current_page + 1} of {total_pages}"
+                st.image(render_page(file_hash, current_page, zoom, pdf_bytes),
                          caption=caption, use_container_width=True)
 
-                # Navigation buttons with unique keys
+                # Navigation buttons change the page before the next run renders it
                 col1, col2, col3 = st.columns([1, 1, 1])
                 with col1:
-                    if st.button("< Previous", key=f"prev_button_{unique_id}_{st.session_state.current_page}", disabled=st.session_state.current_page == 0):
-                        st.session_state.current_page -= 1
+                    st.button("< Previous", key=f"{key_prefix}_prev_button_{file_hash}",
+                              on_click=self.change_page, args=(-1,), disabled=current_page == 0)
+                with col2:
+                    show_thumbnails = st.toggle(
+                        "Thumbnails", key=f"{key_prefix}_thumbnails_{file_hash}")
                 with col3:
-                    if st.button("Next >", key=f"next_button_{unique_id}_{st.session_state.current_page}", disabled=st.session_state.current_page == total_pages - 1):
-                        st.session_state.current_page += 1
+                    st.button("Next >", key=f"{key_prefix}_next_button_{file_hash}",
+                              on_click=self.change_page, args=(1,),
+                              disabled=current_page == total_pages - 1)
+
+                if show_thumbnails:
+                    self.thumbnail_strip(uploaded_file, file_hash, total_pages, key_prefix)
+
+                # Warm the cache for the neighbouring pages
+                for page_num in range(current_page - prefetch, current_page + prefetch + 1):
+                    if 0 <= page_num < total_pages and page_num != current_page:
+                        render_page(file_hash, page_num, zoom, pdf_bytes)
             else:
                 st.info("Upload a PDF file to view it here.")
         except Exception as e:
@@ -133,10 +249,10 @@ class HelperFunction:
             if question:
                 if st.session_state.document_uid:
                     with st.spinner("Fetching answer..."):
-                        qna_response = requests.post(
+                        qna_response = self.post_json(
                             QNA_API_URL, data={"document_uid": st.session_state.document_uid, "question": question})
-                    if qna_response.status_code == 200:
-                        answer = qna_response.json().get("output")["output"]
+                    if qna_response is not None:
+                        answer = qna_response.get("output")["output"]
                         st.session_state.chat_history.append(
                             ("User: " + question, "Bot: " + answer))
                         st.rerun()  # Refresh the app to display the new message
@@ -173,10 +289,10 @@ class HelperFunction:
             if question:
                 if st.session_state.document_uid:
                     with st.spinner("Fetching answer..."):
-                        qna_response = requests.post(
+                        qna_response = self.post_json(
                             QNA_API_URL, data={"document_uid": st.session_state.document_uid, "question": question})
-                    if qna_response.status_code == 200:
-                        answer = qna_response.json().get("output")["output"]
+                    if qna_response is not None:
+                        answer = qna_response.get("output")["output"]
                         st.session_state.chat_history.append(
                             ("User: " + question, "Bot: " + answer))
                         st.rerun()  # Refresh the app to display the new message
@@ -190,34 +306,49 @@ class HelperFunction:
     def title_summary(self):
         st.subheader("TitleWise Summary")
         if st.session_state.document_uid:
-            # Fetch headings first
-            heading_response = requests.post(SUMMARIZER_API_HEADING_URL, data={
-                "document_uid": st.session_state.document_uid})
-            if heading_response.status_code == 200:
-                summary = heading_response.json().get("output")
+            document_uid = st.session_state.document_uid
+            cache = st.session_state.setdefault("api_cache", {})
+            headings_key = ("headings", document_uid)
+            # Fetch headings first. Their inline summaries are filled in by the background
+            # precompute, so the response is only cached once every section has one
+            heading_response = cache.get(headings_key) or self.post_json(SUMMARIZER_API_HEADING_URL, data={
+                "document_uid": document_uid})
+            if heading_response is not None:
+                summary = heading_response.get("output")
+                if all(i.get("summary") for i in summary if i['length'] != 0):
+                    cache[headings_key] = heading_response
                 for i in summary:
-                    if len(i['value']) != 0:
+                    if i['length'] != 0:
                         with st.expander(i["key"]):
-                            # Use a button to trigger the title API call
-                            if st.button(f"Summarize {i['key']}", key=f"btn_{i['key']}"):
-                                title_summary = requests.post(SUMMARIZER_API_TITLE_URL, data={
-                                    "content": i["key"] + " " + i["value"]})
-                                if title_summary.status_code == 200:
+                            cache_key = ("title_summary", document_uid, i["key"])
+                            if i.get("summary"):
+                                # Precomputed by the backend after ingest
+                                st.write(f"**{i['summary']}**")
+                            # Use a button to trigger the title API call, unless it is already cached
+                            elif cache_key in cache or st.button(f"Summarize {i['key']}", key=f"btn_{i['key']}"):
+                                # The backend reads the section text itself
+                                title_summary = self.post_json(SUMMARIZER_API_TITLE_URL, data={
+                                    "key": i["key"], "document_uid": document_uid}, cache_key=cache_key)
+                                if title_summary is not None:
                                     st.write(
-                                        f"**{title_summary.json().get('output')['output']}**")
+                                        f"**{title_summary.get('output')['output']}**")
 
             # st.session_state.chat_history = []
 
     def document_summary(self):
         if st.session_state.document_uid:
             st.subheader("Generate Summary")
-            if st.button("Generate Summary"):
+            cache_key = ("document_summary", st.session_state.document_uid)
+            # Both tabs render on every rerun: only a click starts a new summary chat
+            clicked = st.button("Generate Summary")
+            if clicked or cache_key in st.session_state.get("api_cache", {}):
                 with st.spinner("Generating summary..."):
-                    summary_response = requests.post(SUMMARIZER_API_URL, data={
-                        "document_uid": st.session_state.document_uid})
-                if summary_response.status_code == 200:
-                    summary = summary_response.json().get("output")["output"]
-                    st.session_state.chat_history = []
+                    summary_response = self.post_json(SUMMARIZER_API_URL, data={
+                        "document_uid": st.session_state.document_uid}, cache_key=cache_key)
+                if summary_response is not None:
+                    summary = summary_response.get("output")["output"]
+                    if clicked:
+                        st.session_state.chat_history = []
 
                     self.display_summary_chat(summary)
                     # st.rerun()  # Refresh the app to display the new message